@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from .utils import clock
+
+__all__ = ["TTLCache", "CacheInfo", "SingleFlight"]
+
+
+# Statistics of a TTLCache, as returned by TTLCache.info()
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'size', 'maxsize'])
+
+# Default ttl argument of TTLCache.set, as None means no expiry
+DEFAULT_TTL = object()
+
+
+class TTLCache(object):
+    """
+    Thread-safe LRU cache whose entries expire after ttl seconds.
+
+    The cache holds at most maxsize entries: the least recently used entry is evicted when a new one is added to a
+    full cache, and expired entries are dropped when they are looked up. Entries cached with a ttl of None never
+    expire, but are still subject to eviction.
+
+    """
+    def __init__(self, maxsize=1024, ttl=60, clock=clock):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns the value cached for key. Raises KeyError if there is none or if it expired.
+
+        """
+        with self.lock:
+            try:
+                value, expires = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+            if expires is not None and expires <= self.clock():
+                self.misses += 1
+                raise KeyError(key)
+            self.entries[key] = value, expires
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        """
+        Caches value for key, for ttl seconds (defaults to the cache's ttl, None never expires).
+
+        """
+        if ttl is DEFAULT_TTL:
+            ttl = self.ttl
+        with self.lock:
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = value, (self.clock() + ttl if ttl is not None else None)
+
+    def delete(self, key):
+        """
+        Removes key from the cache, if present.
+
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        """
+        Returns the cache's statistics as a CacheInfo
+
+        """
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, len(self.entries), self.maxsize)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.done = False
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls sharing the same key.
+
+    The first caller for a key runs the function, while concurrent callers with the same key wait for it and get its
+    result (or its exception). When the first caller is interrupted (e.g. by KeyboardInterrupt or SystemExit), waiting
+    callers are not handed a result that was never produced: the next one in line calls the function instead.
+
+    """
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Calls func(*args, **kwargs), unless a call for key is already in flight, in which case its result is returned.
+
+        """
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.calls[key] = _Call()
+                else:
+                    call.waiters += 1
+            if leader:
+                break
+            call.event.wait()
+            if not call.done:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            call.done = True
+            return call.result
+        except Exception as e:
+            call.error = e
+            call.done = True
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
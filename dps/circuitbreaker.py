@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import weakref
+import threading
+from collections import deque
+
+from .exceptions import CircuitOpen
+from .utils import clock
+
+__all__ = ["CircuitBreaker"]
+
+
+try:
+    from weakref import WeakMethod
+except ImportError:  # pragma no cover
+    class WeakMethod(object):
+        """
+        Weak reference to a bound method (python 2)
+
+        """
+        def __init__(self, method):
+            self.instance = weakref.ref(method.__self__)
+            self.function = method.__func__
+
+        def __call__(self):
+            instance = self.instance()
+            return None if instance is None else self.function.__get__(instance, type(instance))
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker for calls to DPS endpoints.
+
+    While closed, the outcome of the last window_size calls is recorded. The circuit opens when, over at least
+    min_calls calls, the rate of failed calls reaches error_rate or the rate of calls slower than slow_call_duration
+    reaches slow_call_rate. While open, calls fail immediately with CircuitOpen. After reset_timeout seconds, the
+    circuit is half-open: up to probe_calls calls are let through, and the circuit closes if they all succeed, or
+    opens again otherwise.
+
+    Listeners are called with (breaker, old_state, new_state) on every state change. Listeners added with
+    add_listener as bound methods are weakly referenced, so that the breaker does not keep their instances (e.g.
+    clients sharing it) alive.
+
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_rate=0.5, slow_call_duration=None, slow_call_rate=0.5, window_size=50, min_calls=10,
+                 reset_timeout=30, probe_calls=1, clock=clock):
+        self.error_rate = error_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.probe_calls = probe_calls
+        self.clock = clock
+        self.outcomes = deque(maxlen=window_size)
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probes = 0
+        self.probe_successes = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def _transition(self, state):
+        old_state, self.state = self.state, state
+        if state == self.OPEN:
+            self.opened_at = self.clock()
+        elif state == self.HALF_OPEN:
+            self.probes = self.probe_successes = 0
+        elif state == self.CLOSED:
+            self.outcomes.clear()
+        return old_state, state
+
+    def add_listener(self, listener):
+        """
+        Adds a listener called on every state change. Bound methods are weakly referenced, and removed once their
+        instance is garbage collected.
+
+        """
+        try:
+            listener = WeakMethod(listener)
+        except (TypeError, AttributeError):
+            pass
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Removes a listener added with add_listener
+
+        """
+        with self.lock:
+            self.listeners = [entry for entry in self.listeners
+                              if (entry() if isinstance(entry, WeakMethod) else entry) not in (listener, None)]
+
+    def _notify(self, transition):
+        if transition is not None:
+            for listener in list(self.listeners):
+                if isinstance(listener, WeakMethod):
+                    listener = listener()
+                    if listener is None:
+                        # drops references to garbage collected instances
+                        self.remove_listener(None)
+                        continue
+                listener(self, *transition)
+
+    def check(self):
+        """
+        Raises CircuitOpen if a call would not be allowed now. Unlike allow, it does not take a half-open probe, so
+        that calls can fail fast before waiting for a rate limiter.
+
+        """
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at < self.reset_timeout:
+                state = self.state
+            elif self.state == self.HALF_OPEN and self.probes >= self.probe_calls:
+                state = self.state
+            else:
+                return
+        raise CircuitOpen("Circuit is {}".format(state))
+
+    def allow(self):
+        """
+        Checks that a call is allowed. Raises CircuitOpen otherwise.
+
+        """
+        transition = None
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                transition = self._transition(self.HALF_OPEN)
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN and self.probes >= self.probe_calls):
+                state = self.state
+            else:
+                state = None
+                if self.state == self.HALF_OPEN:
+                    self.probes += 1
+        self._notify(transition)
+        if state is not None:
+            raise CircuitOpen("Circuit is {}".format(state))
+
+    def record(self, success, duration):
+        """
+        Records the outcome of a call allowed by allow.
+
+        """
+        slow = self.slow_call_duration is not None and duration >= self.slow_call_duration
+        transition = None
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                if not success or slow:
+                    transition = self._transition(self.OPEN)
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.probe_calls:
+                        transition = self._transition(self.CLOSED)
+            elif self.state == self.CLOSED:
+                self.outcomes.append((success, slow))
+                calls = len(self.outcomes)
+                if calls >= self.min_calls:
+                    failures = sum(1 for s, _ in self.outcomes if not s)
+                    slow_calls = sum(1 for _, s in self.outcomes if s)
+                    if failures >= self.error_rate * calls or \
+                            (self.slow_call_duration is not None and slow_calls >= self.slow_call_rate * calls):
+                        transition = self._transition(self.OPEN)
+        self._notify(transition)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls func through the circuit breaker. Any exception raised by func counts as a failure, including
+        interruptions (e.g. KeyboardInterrupt), so that a half-open probe is always released.
+
+        """
+        self.allow()
+        start = self.clock()
+        success = False
+        try:
+            result = func(*args, **kwargs)
+            success = True
+            return result
+        finally:
+            self.record(success, self.clock() - start)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+__all__ = ["ResponseTooLarge", "RateLimited", "CircuitOpen"]
+
+
+class ResponseTooLarge(ValueError):
+    """
+    Raised when a response from DPS exceeds the client's maximum response size.
+
+    """
+
+
+class RateLimited(Exception):
+    """
+    Raised when a call would wait longer than allowed for the client's rate limit.
+
+    """
+
+
+class CircuitOpen(Exception):
+    """
+    Raised without calling DPS while the client's circuit breaker is open.
+
+    """
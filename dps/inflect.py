@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import re
+
+__all__ = ["camelize", "underscore"]
+
+
+# Patterns are compiled on first use, so importing this module does no work
+_patterns = {}
+
+
+def _pattern(regex):
+    try:
+        return _patterns[regex]
+    except KeyError:
+        pattern = _patterns[regex] = re.compile(regex)
+        return pattern
+
+
+def camelize(string, uppercase_first_letter=True):
+    """
+    Convert strings to CamelCase (or lowerCamelCase when uppercase_first_letter is False).
+
+    Same as dps.vendors.inflection.camelize.
+
+    Example:
+      camelize("device_type") returns "DeviceType", camelize("device_type", False) returns "deviceType"
+    """
+    result = _pattern(r"(?:^|_)(.)").sub(lambda m: m.group(1).upper(), string)
+    if uppercase_first_letter:
+        return result
+    return string[0].lower() + result[1:]
+
+
+def underscore(word):
+    """
+    Make an underscored, lowercase form from the expression in the string.
+
+    Same as dps.vendors.inflection.underscore.
+
+    Example:
+      underscore("DeviceType") returns "device_type"
+    """
+    word = _pattern(r"([A-Z]+)([A-Z][a-z])").sub(r'\1_\2', word)
+    word = _pattern(r"([a-z\d])([A-Z])").sub(r'\1_\2', word)
+    word = word.replace("-", "_")
+    return word.lower()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import io
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from .utils import fsync_directory
+
+__all__ = ["Journal", "recover"]
+
+
+class Journal(object):
+    """
+    Append-only journal of PxPost transactions, which tells after a crash whether a transaction may have been
+    processed by DPS without its response being recorded.
+
+    The intent to send a transaction (by txn_id and txn_type) is written before it is sent, and is durable (fsynced)
+    by the time intent returns. Its outcome is written once the response is received. Concurrent writers share
+    fsyncs: a writer waiting for an fsync in progress is covered by the next one, which syncs every record written
+    meanwhile.
+
+    Records are JSON lines. A record torn by a crash is the last line of the file: it is truncated when the journal is
+    opened again, so that new records are not appended to it.
+
+    """
+    def __init__(self, path, sync=True):
+        """
+        Opens (or creates) a journal.
+
+        Args:
+          path (str): path of the journal file.
+          sync (bool): fsyncs intents before they are sent. Disabling it trades durability for throughput.
+        """
+        self.path = path
+        self.sync = sync
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.written = 0
+        self.synced = 0
+        self.repair()
+        self.file = io.open(path, 'ab')
+
+    def repair(self):
+        """
+        Truncates a record torn by a crash at the end of the journal, if any
+
+        """
+        try:
+            fileobj = io.open(self.path, 'r+b')
+        except (IOError, OSError):
+            return
+        with fileobj:
+            end = position = fileobj.seek(0, os.SEEK_END)
+            # looks for the last newline, backwards
+            while position > 0:
+                size = min(4096, position)
+                position -= size
+                fileobj.seek(position)
+                chunk = fileobj.read(size)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    position += newline + 1
+                    break
+            if position != end:
+                fileobj.truncate(position)
+                fileobj.flush()
+                os.fsync(fileobj.fileno())
+
+    def _append(self, record, sync=False):
+        line = (json.dumps(record, sort_keys=True) + '\n').encode('utf-8')
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.written += 1
+            position = self.written
+        if sync and self.sync:
+            self._sync(position)
+
+    def _sync(self, position):
+        with self.sync_lock:
+            if self.synced >= position:
+                return
+            with self.lock:
+                target = self.written
+                fileno = self.file.fileno()
+            os.fsync(fileno)
+            self.synced = target
+
+    def intent(self, txn_id, txn_type):
+        """
+        Records that a transaction is about to be sent. The record is durable when intent returns.
+
+        """
+        self._append({'op': 'intent', 'txn_id': txn_id, 'txn_type': txn_type, 'time': time.time()}, sync=True)
+
+    def outcome(self, txn_id, txn_type, response=None, error=None):
+        """
+        Records the response (a PxPostResponse) received for a transaction, or the error that prevented it from being
+        sent.
+
+        """
+        record = {'op': 'outcome', 'txn_id': txn_id, 'txn_type': txn_type, 'time': time.time()}
+        if response is not None:
+            record.update({'success': response.success, 're_co': response.re_co, 'dps_txn_ref': response.dps_txn_ref})
+        if error is not None:
+            record['error'] = '{}: {}'.format(error.__class__.__name__, error)
+        self._append(record)
+
+    def records(self):
+        """
+        Generator over the records of the journal
+
+        """
+        with io.open(self.path, 'rb') as fileobj:
+            for line in fileobj:
+                try:
+                    yield json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+
+    def unresolved(self):
+        """
+        Returns the intent records that have no outcome, in the order they were written
+
+        """
+        pending = OrderedDict()
+        for record in self.records():
+            key = record['txn_id'], record['txn_type']
+            if record['op'] == 'intent':
+                pending[key] = record
+            else:
+                pending.pop(key, None)
+        return list(pending.values())
+
+    def compact(self):
+        """
+        Rewrites the journal with unresolved intents only, so that it does not grow forever.
+
+        Waits for fsyncs in progress, which use the file that compact replaces.
+
+        """
+        with self.sync_lock, self.lock:
+            unresolved = self.unresolved()
+            path = self.path + '.compact'
+            with io.open(path, 'wb') as fileobj:
+                for record in unresolved:
+                    fileobj.write((json.dumps(record, sort_keys=True) + '\n').encode('utf-8'))
+                fileobj.flush()
+                os.fsync(fileobj.fileno())
+            os.rename(path, self.path)
+            fsync_directory(self.path)
+            self.file.close()
+            self.file = io.open(self.path, 'ab')
+            # records written so far are either resolved or in the compacted journal, which is durable
+            self.synced = self.written
+
+    def close(self):
+        with self.sync_lock, self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def recover(journal, client, concurrency=8):
+    """
+    Reconciles unresolved journal entries with DPS, typically on startup.
+
+    The status of each unresolved transaction is requested with up to concurrency concurrent client.status() calls.
+    Outcomes are recorded in the journal, which is then compacted.
+
+    Returns a list of (intent record, PxPostResponse, error) for unresolved transactions. error is None when the status
+    was received: response.success tells whether the transaction was processed. Transactions whose status could not be
+    received remain unresolved.
+
+    """
+    def check(record):
+        try:
+            response = client.status(txn_id=record['txn_id'])
+        except Exception as e:
+            return record, None, e
+        journal.outcome(record['txn_id'], record['txn_type'], response)
+        return record, response, None
+
+    unresolved = journal.unresolved()
+    if not unresolved:
+        return []
+    pool = ThreadPool(min(concurrency, len(unresolved)))
+    try:
+        results = pool.map(check, unresolved)
+    finally:
+        pool.close()
+        pool.join()
+    journal.compact()
+    return results
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+Load generator driving PxPostClient and PxFusionClient against local stand-ins of the DPS services.
+
+Usage:
+  python -m dps.loadtest --requests 5000 --concurrency 16 --mix purchase=60,status=20,pxfusion_purchase=20
+
+"""
+from __future__ import unicode_literals
+
+import os
+import re
+import sys
+import time
+import bisect
+import random
+import decimal
+import argparse
+import threading
+import multiprocessing
+from collections import namedtuple, Counter
+from xml.sax.saxutils import escape
+
+from six.moves import BaseHTTPServer, socketserver
+from suds.cache import NoCache
+from suds.client import Client as SOAPClient
+
+from .utils import clock
+from .ratelimit import TokenBucket
+from .xmlbackend import get_backend
+from .manager import ProcessSessionTransport
+from .pxpost import PxPostClient, ProcessSession, PxPostCardTransaction, PxPostCompleteTransaction, \
+                    PxPostRefundTransaction, PxPostStatusTransaction
+from .pxfusion import PxFusionClient, PxFusionGetTransaction, PxFusionStatusTransaction
+
+__all__ = ["StandInConfig", "StandInServer", "TrafficGenerator", "LoadTest",
+           "LoadTestResult", "parse_mix", "format_report", "main"]
+
+
+# Operations of a traffic mix, mapped to the client and method they call
+OPERATIONS = {
+    'authorize': ('pxpost', 'authorize'),
+    'purchase': ('pxpost', 'purchase'),
+    'complete': ('pxpost', 'complete'),
+    'refund': ('pxpost', 'refund'),
+    'status': ('pxpost', 'status'),
+    'pxfusion_purchase': ('pxfusion', 'purchase'),
+    'pxfusion_status': ('pxfusion', 'status'),
+}
+
+DEFAULT_MIX = 'purchase=40,authorize=15,complete=10,refund=5,status=10,pxfusion_purchase=10,pxfusion_status=10'
+
+# Behaviour of stand-ins: latency (in seconds) of each request, and fractions of declined and failed requests
+StandInConfig = namedtuple('StandInConfig', ['latency', 'decline_rate', 'error_rate'])
+
+PXPOST_RESPONSE = (
+    '<Txn><Transaction success="{success}" reco="{re_co}" responseText="{text}">'
+    '<Authorized>{success}</Authorized><Amount>{amount}</Amount><TxnType>{txn_type}</TxnType><TxnId>{txn_id}</TxnId>'
+    '<DpsTxnRef>{ref}</DpsTxnRef></Transaction><ReCo>{re_co}</ReCo><ResponseText>{text}</ResponseText>'
+    '<Success>{success}</Success><DpsTxnRef>{ref}</DpsTxnRef></Txn>'
+)
+
+PXPOST_PATH = '/pxpost.aspx'
+PXFUSION_PATH = '/pxf/pxf.svc'
+
+# Minimal document/literal WSDL of the PxFusion operations used by the load generator. TransactionDetails elements
+# are generated from PxFusionGetTransaction, so that every field the client may send is known to suds.
+PXFUSION_WSDL = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"'
+    ' xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:tns="http://paymentexpress.com"'
+    ' targetNamespace="http://paymentexpress.com" name="PxFusion">'
+    '<wsdl:types><xs:schema elementFormDefault="qualified" targetNamespace="http://paymentexpress.com">'
+    '<xs:complexType name="TransactionDetails"><xs:sequence>{details}</xs:sequence></xs:complexType>'
+    '<xs:complexType name="TransactionIdResult"><xs:sequence>{id_result}</xs:sequence></xs:complexType>'
+    '<xs:complexType name="TransactionResult"><xs:sequence>{result}</xs:sequence></xs:complexType>'
+    '<xs:element name="GetTransactionId"><xs:complexType><xs:sequence>'
+    '<xs:element name="username" type="xs:string"/><xs:element name="password" type="xs:string"/>'
+    '<xs:element name="tranDetail" type="tns:TransactionDetails"/></xs:sequence></xs:complexType></xs:element>'
+    '<xs:element name="GetTransactionIdResponse"><xs:complexType><xs:sequence>'
+    '<xs:element name="GetTransactionIdResult" type="tns:TransactionIdResult"/></xs:sequence></xs:complexType>'
+    '</xs:element>'
+    '<xs:element name="GetTransaction"><xs:complexType><xs:sequence>'
+    '<xs:element name="username" type="xs:string"/><xs:element name="password" type="xs:string"/>'
+    '<xs:element name="transactionId" type="xs:string"/></xs:sequence></xs:complexType></xs:element>'
+    '<xs:element name="GetTransactionResponse"><xs:complexType><xs:sequence>'
+    '<xs:element name="GetTransactionResult" type="tns:TransactionResult"/></xs:sequence></xs:complexType>'
+    '</xs:element>'
+    '</xs:schema></wsdl:types>'
+    '<wsdl:message name="GetTransactionIdIn"><wsdl:part name="parameters" element="tns:GetTransactionId"/>'
+    '</wsdl:message>'
+    '<wsdl:message name="GetTransactionIdOut"><wsdl:part name="parameters" element="tns:GetTransactionIdResponse"/>'
+    '</wsdl:message>'
+    '<wsdl:message name="GetTransactionIn"><wsdl:part name="parameters" element="tns:GetTransaction"/></wsdl:message>'
+    '<wsdl:message name="GetTransactionOut"><wsdl:part name="parameters" element="tns:GetTransactionResponse"/>'
+    '</wsdl:message>'
+    '<wsdl:portType name="IPxFusion">'
+    '<wsdl:operation name="GetTransactionId"><wsdl:input message="tns:GetTransactionIdIn"/>'
+    '<wsdl:output message="tns:GetTransactionIdOut"/></wsdl:operation>'
+    '<wsdl:operation name="GetTransaction"><wsdl:input message="tns:GetTransactionIn"/>'
+    '<wsdl:output message="tns:GetTransactionOut"/></wsdl:operation>'
+    '</wsdl:portType>'
+    '<wsdl:binding name="PxFusionBinding" type="tns:IPxFusion">'
+    '<soap:binding transport="http://schemas.xmlsoap.org/soap/http" style="document"/>'
+    '<wsdl:operation name="GetTransactionId">'
+    '<soap:operation soapAction="http://paymentexpress.com/IPxFusion/GetTransactionId" style="document"/>'
+    '<wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>'
+    '</wsdl:operation>'
+    '<wsdl:operation name="GetTransaction">'
+    '<soap:operation soapAction="http://paymentexpress.com/IPxFusion/GetTransaction" style="document"/>'
+    '<wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>'
+    '</wsdl:operation>'
+    '</wsdl:binding>'
+    '<wsdl:service name="PxFusion"><wsdl:port name="PxFusion" binding="tns:PxFusionBinding">'
+    '<soap:address location="{address}"/></wsdl:port></wsdl:service>'
+    '</wsdl:definitions>'
+)
+
+SOAP_RESPONSE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+    '<{method}Response xmlns="http://paymentexpress.com"><{method}Result>{result}</{method}Result></{method}Response>'
+    '</s:Body></s:Envelope>'
+)
+
+SOAP_FAULT = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><s:Fault>'
+    '<faultcode>s:Server</faultcode><faultstring>Service Unavailable</faultstring>'
+    '</s:Fault></s:Body></s:Envelope>'
+)
+
+# Elements of GetTransactionId and GetTransaction results, as (name, XML schema type)
+PXFUSION_ID_RESULT = (('sessionId', 'string'), ('success', 'boolean'), ('transactionId', 'string'))
+PXFUSION_RESULT = (('amount', 'string'), ('currencyName', 'string'), ('dpsTxnRef', 'string'),
+                   ('responseCode', 'string'), ('responseText', 'string'), ('sessionId', 'string'),
+                   ('status', 'int'))
+
+
+def _schema_elements(elements):
+    return ''.join('<xs:element minOccurs="0" name="{}" type="xs:{}"/>'.format(name, type)
+                   for name, type in elements)
+
+
+def pxfusion_wsdl(address):
+    """
+    Returns the WSDL of the stand-in PxFusion service, at address
+
+    """
+    details = [(tag, 'string') for tag in sorted(PxFusionGetTransaction._meta._soap_tags.values())] + \
+        [('txnType', 'string')]
+    return PXFUSION_WSDL.format(details=_schema_elements(details), id_result=_schema_elements(PXFUSION_ID_RESULT),
+                                result=_schema_elements(PXFUSION_RESULT), address=escape(address))
+
+
+class _StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # keeps connections alive, as DPS does
+    protocol_version = 'HTTP/1.1'
+    # sends headers and body together, as delayed ACKs would otherwise stall every response
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def respond(self, status, content=b'', content_type='application/xml'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path == PXFUSION_PATH + '?wsdl':
+            address = 'http://{}:{}{}'.format(self.server.server_address[0], self.server.server_address[1],
+                                              PXFUSION_PATH)
+            self.respond(200, pxfusion_wsdl(address).encode('utf-8'), 'text/xml; charset=utf-8')
+        else:
+            self.respond(404)
+
+    def do_POST(self):
+        config = self.server.config
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if config.latency:
+            time.sleep(config.latency)
+        failed = random.random() < config.error_rate
+        approved = random.random() >= config.decline_rate
+        if self.path == PXPOST_PATH:
+            self.pxpost(body, failed, approved)
+        elif self.path == PXFUSION_PATH:
+            self.pxfusion(body, failed, approved)
+        else:
+            self.respond(404)
+
+    def pxpost(self, body, failed, approved):
+        if failed:
+            return self.respond(503)
+        request = get_backend().parse(body)['Txn']
+        content = PXPOST_RESPONSE.format(
+            success=int(approved), re_co='00' if approved else '05', text='APPROVED' if approved else 'DECLINED',
+            amount=escape(request.get('Amount') or ''), txn_type=escape(request.get('TxnType') or ''),
+            txn_id=escape(request.get('TxnId') or ''), ref='{:016x}'.format(random.getrandbits(64)))
+        self.respond(200, content.encode('utf-8'))
+
+    def pxfusion(self, body, failed, approved):
+        if failed:
+            return self.respond(500, SOAP_FAULT.encode('utf-8'), 'text/xml; charset=utf-8')
+        method = self.headers.get('SOAPAction', '').strip('"').rpartition('/')[2]
+        if method == 'GetTransactionId':
+            transaction_id = '{:016x}'.format(random.getrandbits(64))
+            result = {'success': 'true', 'transactionId': transaction_id, 'sessionId': transaction_id}
+        elif method == 'GetTransaction':
+            match = re.search(b'transactionId>([^<]*)<', body)
+            result = {'status': '0' if approved else '1', 'responseCode': '00' if approved else '05',
+                      'responseText': 'APPROVED' if approved else 'DECLINED', 'amount': '1.00',
+                      'currencyName': 'NZD', 'dpsTxnRef': '{:016x}'.format(random.getrandbits(64)),
+                      'sessionId': match.group(1).decode('utf-8') if match else ''}
+        else:
+            return self.respond(500, SOAP_FAULT.encode('utf-8'), 'text/xml; charset=utf-8')
+        content = SOAP_RESPONSE.format(method=method, result=''.join(
+            '<{0}>{1}</{0}>'.format(name, escape(value)) for name, value in sorted(result.items())))
+        self.respond(200, content.encode('utf-8'), 'text/xml; charset=utf-8')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def _serve(config, ports):
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.config = config
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StandInServer(object):
+    """
+    Local stand-in of the PxPost endpoint and of the PxFusion SOAP service, running in its own process so that it does
+    not skew client measurements.
+
+    PxFusion clients load the stand-in's WSDL (from wsdl_url) with a real SOAP client, so that SOAP envelopes are
+    built, sent over HTTP and parsed as they are with DPS.
+
+    Example:
+      with StandInServer(StandInConfig(0.01, 0.1, 0)) as server:
+          pxpost_client.URI = server.pxpost_url
+          pxfusion_client = PxFusionClient(username, password, soap_client=server.soap_client())
+
+    """
+    def __init__(self, config):
+        self.config = config
+        self.process = None
+        self.pxpost_url = None
+        self.wsdl_url = None
+
+    def start(self):
+        ports = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve, args=(self.config, ports))
+        self.process.daemon = True
+        self.process.start()
+        base_url = 'http://127.0.0.1:{}'.format(ports.get(timeout=10))
+        self.pxpost_url = base_url + PXPOST_PATH
+        self.wsdl_url = base_url + PXFUSION_PATH + '?wsdl'
+        return self
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+    def soap_client(self, pool=None):
+        """
+        Returns a SOAP client of the stand-in PxFusion service, sending requests through pool (a ProcessSession)
+
+        """
+        return SOAPClient(self.wsdl_url, transport=ProcessSessionTransport(pool or ProcessSession()), cache=NoCache())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def parse_mix(text):
+    """
+    Parses a traffic mix ("operation=weight,...") into a list of (operation, weight)
+
+    """
+    mix = []
+    for item in text.split(','):
+        operation, _, weight = item.strip().partition('=')
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown operation: {} (expects: {})".format(operation, ", ".join(sorted(OPERATIONS))))
+        try:
+            weight = float(weight or 1)
+        except ValueError:
+            raise ValueError("Invalid weight for {}: {}".format(operation, weight))
+        if weight < 0:
+            raise ValueError("Invalid weight for {}: {}".format(operation, weight))
+        if weight:
+            mix.append((operation, weight))
+    if not mix:
+        raise ValueError("Empty traffic mix")
+    return mix
+
+
+class TrafficGenerator(object):
+    """
+    Generates (operation, transaction) pairs following a traffic mix, with the real transaction classes.
+
+    """
+    def __init__(self, mix, seed=None):
+        self.operations = [operation for operation, weight in mix]
+        self.thresholds = []
+        total = 0
+        for operation, weight in mix:
+            total += weight
+            self.thresholds.append(total)
+        self.random = random.Random(seed)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def amount(self):
+        return decimal.Decimal(self.random.randint(100, 100000)) / 100
+
+    def reference(self):
+        return '{:016x}'.format(self.random.getrandbits(64))
+
+    def card_transaction(self, txn_id):
+        return PxPostCardTransaction(amount=self.amount(), input_currency='NZD', card_holder_name='Load Test',
+                                     card_number='4111111111111111', date_expiry='1230', cvc2='123', txn_id=txn_id)
+
+    def next(self):
+        with self.lock:
+            self.count += 1
+            operation = self.operations[bisect.bisect(self.thresholds, self.random.random() * self.thresholds[-1])]
+            txn_id = 'LT{:014d}'.format(self.count)
+            if operation in ('authorize', 'purchase'):
+                transaction = self.card_transaction(txn_id)
+            elif operation == 'complete':
+                transaction = PxPostCompleteTransaction(dps_txn_ref=self.reference(), amount=self.amount(),
+                                                        input_currency='NZD')
+            elif operation == 'refund':
+                transaction = PxPostRefundTransaction(amount=self.amount(), dps_txn_ref=self.reference(),
+                                                      merchant_reference='Load Test')
+            elif operation == 'status':
+                transaction = PxPostStatusTransaction(txn_id='LT{:014d}'.format(self.random.randint(1, self.count)))
+            elif operation == 'pxfusion_purchase':
+                transaction = PxFusionGetTransaction(amount=self.amount(), currency='NZD', txn_ref=txn_id,
+                                                     return_url='https://localhost/return')
+            else:
+                transaction = PxFusionStatusTransaction(transaction_id=self.reference())
+            return operation, transaction
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of sorted values
+
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+# Result of a load test. latencies maps operations to sorted lists of durations (in seconds) of successful requests,
+# errors counts failed requests by (operation, exception name), declines counts declined requests by operation, and
+# cpu is the CPU time (in seconds) used by the load-generating process.
+LoadTestResult = namedtuple('LoadTestResult', ['requests', 'elapsed', 'cpu', 'latencies', 'errors', 'declines'])
+
+
+class LoadTest(object):
+    """
+    Sends generated traffic through clients, from concurrency threads, until a number of requests were sent or for a
+    duration (in seconds), optionally at a target rate (in requests per second).
+
+    """
+    def __init__(self, clients, generator, requests=None, duration=None, rate=None, concurrency=8):
+        if requests is None and duration is None:
+            raise ValueError("Expects a number of requests or a duration")
+        self.clients = clients
+        self.generator = generator
+        self.requests = requests
+        self.duration = duration
+        self.bucket = TokenBucket(rate, burst=1) if rate else None
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+
+    def _take(self, deadline):
+        with self.lock:
+            if self.requests is not None and self.sent >= self.requests:
+                return False
+            if deadline is not None and clock() >= deadline:
+                return False
+            self.sent += 1
+            return True
+
+    def _run_worker(self, deadline, latencies, errors, declines):
+        while self._take(deadline):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            operation, transaction = self.generator.next()
+            client_name, method = OPERATIONS[operation]
+            started = clock()
+            try:
+                response = getattr(self.clients[client_name], method)(transaction)
+            except Exception as e:
+                with self.lock:
+                    errors[operation, e.__class__.__name__] += 1
+                continue
+            duration = clock() - started
+            with self.lock:
+                latencies.setdefault(operation, []).append(duration)
+                if getattr(response, 'authorized', None) is False or getattr(response, 'status', None) == 1:
+                    declines[operation] += 1
+
+    def run(self):
+        """
+        Runs the load test and returns a LoadTestResult
+
+        """
+        self.sent = 0
+        latencies, errors, declines = {}, Counter(), Counter()
+        cpu_started = sum(os.times()[:2])
+        started = clock()
+        deadline = started + self.duration if self.duration is not None else None
+        threads = [threading.Thread(target=self._run_worker, args=(deadline, latencies, errors, declines))
+                   for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = clock() - started
+        for values in latencies.values():
+            values.sort()
+        return LoadTestResult(self.sent, elapsed, sum(os.times()[:2]) - cpu_started, latencies, errors, declines)
+
+
+def format_report(result):
+    """
+    Returns a text report of a LoadTestResult
+
+    """
+    lines = [
+        "requests: {}  elapsed: {:.2f}s  throughput: {:.1f} req/s".format(
+            result.requests, result.elapsed, result.requests / result.elapsed if result.elapsed else 0),
+        "client CPU: {:.3f}ms per request".format(result.cpu / result.requests * 1000 if result.requests else 0),
+        "",
+        "{:<20} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "operation", "ok", "declined", "p50 (ms)", "p90 (ms)", "p99 (ms)", "max (ms)"),
+    ]
+    everything = sorted(value for values in result.latencies.values() for value in values)
+    rows = sorted(result.latencies.items()) + [('all', everything)]
+    for operation, values in rows:
+        declined = sum(result.declines.values()) if operation == 'all' else result.declines[operation]
+        lines.append("{:<20} {:>8} {:>9} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+            operation, len(values), declined,
+            *[(percentile(values, fraction) or 0) * 1000 for fraction in (0.5, 0.9, 0.99, 1)]))
+    if result.errors:
+        lines.extend(["", "errors:"])
+        for (operation, error), count in sorted(result.errors.items()):
+            lines.append("  {:<20} {:<24} {:>8}".format(operation, error, count))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None, stream=None):
+    parser = argparse.ArgumentParser(prog='python -m dps.loadtest',
+                                     description="Generates PxPost/PxFusion traffic against local stand-ins.")
+    parser.add_argument('--requests', type=int, help="number of requests to send (default: 1000 without --duration)")
+    parser.add_argument('--duration', type=float, help="duration of the test, in seconds")
+    parser.add_argument('--rate', type=float, help="target rate, in requests per second (default: unlimited)")
+    parser.add_argument('--concurrency', type=int, default=8, help="number of concurrent requests (default: 8)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="traffic mix, as operation=weight pairs (operations: {})"
+                        .format(", ".join(sorted(OPERATIONS))))
+    parser.add_argument('--latency', type=float, default=0, help="stand-in latency, in milliseconds (default: 0)")
+    parser.add_argument('--decline-rate', type=float, default=0.1, help="fraction of declined transactions")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of failed requests")
+    parser.add_argument('--seed', type=int, help="seed of the traffic generator")
+    args = parser.parse_args(argv)
+    stream = stream or sys.stdout
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    requests = args.requests if args.requests or args.duration else 1000
+    config = StandInConfig(args.latency / 1000, args.decline_rate, args.error_rate)
+
+    with StandInServer(config) as server:
+        pxpost = PxPostClient('loadtest', 'loadtest', pool=ProcessSession(args.concurrency))
+        pxpost.URI = server.pxpost_url
+        pxfusion = PxFusionClient('loadtest', 'loadtest',
+                                  soap_client=server.soap_client(ProcessSession(args.concurrency)))
+        load_test = LoadTest({'pxpost': pxpost, 'pxfusion': pxfusion}, TrafficGenerator(mix, args.seed),
+                             requests=requests, duration=args.duration, rate=args.rate, concurrency=args.concurrency)
+        result = load_test.run()
+    stream.write(format_report(result))
+    return 0
+
+
+if __name__ == '__main__':  # pragma no cover
+    sys.exit(main())
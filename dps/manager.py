@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import threading
+
+from suds.client import Client as SOAPClient
+
+from .vendors import suds_requests
+from .ratelimit import RateLimiter
+from .profiling import SamplingProfiler
+from .pxpost import PxPostClient, ProcessSession
+from .pxfusion import PxFusionClient
+
+__all__ = ["ClientManager"]
+
+
+class ProcessSessionTransport(suds_requests.RequestsTransport):
+    """
+    suds transport sending requests with the session of a ProcessSession, so that a SOAP client created before a fork
+    does not share its connections with child processes.
+
+    """
+    def __init__(self, pool):
+        suds_requests.transport.Transport.__init__(self)
+        self.pool = pool
+
+    @property
+    def _session(self):
+        return self.pool.get()
+
+
+class ClientManager(object):
+    """
+    Hands out clients for many merchants (sets of credentials) that share the same resources.
+
+    All PxPost clients share one connection pool, and all PxFusion clients share one SOAP client (sending requests
+    through the same per-process connection pool), so the WSDL is loaded once. Merchants still have their own rate
+    limit budget (rate limiters are keyed by username) and their own metrics (labelled by merchant).
+
+    Example:
+      manager = ClientManager(rate=10, metrics=MetricsRegistry())
+      manager.pxpost(merchant.username, merchant.password).purchase(transaction)
+
+    """
+    def __init__(self, rate=None, burst=None, pool_size=None, metrics=None, tracer=None, profiler=None):
+        """
+        Creates a client manager.
+
+        Args:
+          rate (float): optional rate limit, in requests per second per merchant.
+          burst (int): optional rate limit burst per merchant (see RateLimiter).
+          pool_size (int): maximum number of connections kept open by the shared connection pool.
+          metrics (MetricsRegistry): optional registry shared by all clients.
+          tracer: optional tracer shared by all clients.
+          profiler (SamplingProfiler): profiler shared by all clients (defaults to a disabled profiler).
+        """
+        self.rate_limiter = RateLimiter(rate, burst) if rate else None
+        self.pool = ProcessSession(pool_size)
+        self.metrics = metrics
+        self.tracer = tracer
+        self.profiler = profiler or SamplingProfiler()
+        self.clients = {}
+        self.lock = threading.Lock()
+        self._soap_client = None
+
+    @property
+    def soap_client(self):
+        """
+        Returns the SOAP client shared by PxFusion clients, loading the WSDL on first use
+
+        """
+        with self.lock:
+            if self._soap_client is None:
+                transport = ProcessSessionTransport(self.pool)
+                self._soap_client = SOAPClient(PxFusionClient.WSDL, transport=transport)
+            return self._soap_client
+
+    def client(self, client_class, username, password, **kwargs):
+        """
+        Returns the client_class client for a set of credentials, creating it on first use
+
+        """
+        key = client_class, username, password
+        try:
+            return self.clients[key]
+        except KeyError:
+            pass
+        client = client_class(username, password, rate_limiter=self.rate_limiter, metrics=self.metrics,
+                              tracer=self.tracer, profiler=self.profiler, **kwargs)
+        with self.lock:
+            return self.clients.setdefault(key, client)
+
+    def pxpost(self, username, password):
+        """
+        Returns the PxPost client for a merchant
+
+        """
+        return self.client(PxPostClient, username, password, pool=self.pool)
+
+    def pxfusion(self, username, password):
+        """
+        Returns the PxFusion client for a merchant
+
+        """
+        return self.client(PxFusionClient, username, password, soap_client=self.soap_client)
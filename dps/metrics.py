@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import bisect
+import weakref
+import threading
+
+import six
+
+from .utils import clock
+
+__all__ = ["MetricsRegistry", "Counter", "Histogram", "ClientMetrics"]
+
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return six.text_type(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append('{}="{}"'.format(*extra))
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else six.text_type(value)
+
+
+class _Shard(object):
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self, size):
+        self.values = [0] * size
+
+
+class _Sharded(object):
+    """
+    Per-thread shards of a list of values.
+
+    Each thread updates its own shard without locking, and shards are only summed when values are read. The shard of a
+    thread is folded into a base total when the thread exits, so that the number of shards stays bounded by the number
+    of live threads.
+
+    """
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.base = [0] * size
+        # values of live shards, keyed by weak references to the shards held by their thread
+        self.shards = {}
+        self.lock = threading.RLock()
+
+    def shard(self):
+        try:
+            return self.local.shard.values
+        except AttributeError:
+            shard = self.local.shard = _Shard(self.size)
+            with self.lock:
+                self.shards[weakref.ref(shard, self._retire)] = shard.values
+            return shard.values
+
+    def _retire(self, ref):
+        # called when the thread of a shard exits
+        with self.lock:
+            values = self.shards.pop(ref)
+            self.base = [total + value for total, value in zip(self.base, values)]
+
+    def values(self):
+        with self.lock:
+            shards = list(self.shards.values())
+            base = self.base
+        return [sum(values) for values in zip(base, *shards)]
+
+
+class _CounterChild(_Sharded):
+
+    def __init__(self):
+        super(_CounterChild, self).__init__(1)
+
+    def inc(self, amount=1):
+        self.shard()[0] += amount
+
+    @property
+    def value(self):
+        return self.values()[0]
+
+
+class _HistogramChild(_Sharded):
+
+    def __init__(self, buckets):
+        # one count per bucket, plus +Inf, plus the sum of observations
+        super(_HistogramChild, self).__init__(len(buckets) + 2)
+        self.buckets = buckets
+
+    def observe(self, value):
+        shard = self.shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    @property
+    def count(self):
+        return sum(self.values()[:-1])
+
+    @property
+    def sum(self):
+        return self.values()[-1]
+
+
+class _Metric(object):
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def _child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        Returns the child metric for label values (in the order of labelnames)
+
+        """
+        try:
+            return self.children[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError("{} expects labels {}".format(self.name, ', '.join(self.labelnames)))
+            with self.lock:
+                return self.children.setdefault(values, self._child())
+
+    def _samples(self, values, child):
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Returns the metric in Prometheus text format
+
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.documentation.replace('\\', '\\\\').replace('\n', '\\n')),
+                 '# TYPE {} {}'.format(self.name, self.type)]
+        with self.lock:
+            children = sorted(self.children.items(), key=lambda item: [six.text_type(value) for value in item[0]])
+        for values, child in children:
+            lines.extend(self._samples(values, child))
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter, with one value per combination of labels.
+
+    Example:
+      counter.labels('pxpost', 'Purchase').inc()
+
+    """
+    type = 'counter'
+
+    def _child(self):
+        return _CounterChild()
+
+    def _samples(self, values, child):
+        yield '{}{} {}'.format(self.name, _format_labels(self.labelnames, values), _format_value(child.value))
+
+
+class Histogram(_Metric):
+    """
+    Histogram with fixed buckets, with one set of buckets per combination of labels.
+
+    Example:
+      histogram.labels('pxpost', 'Purchase').observe(0.25)
+
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, values, child):
+        counts = child.values()
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            labels = _format_labels(self.labelnames, values, ('le', _format_value(bound)))
+            yield '{}_bucket{} {}'.format(self.name, labels, total)
+        labels = _format_labels(self.labelnames, values)
+        yield '{}_sum{} {}'.format(self.name, labels, _format_value(counts[-1]))
+        yield '{}_count{} {}'.format(self.name, labels, total)
+
+
+class MetricsRegistry(object):
+    """
+    Collection of metrics, rendered together in Prometheus text format.
+
+    Metrics are registered by name: registering a metric again returns the existing one, so several clients can share
+    a registry.
+
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric_class, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError("{} is already registered as a {}".format(name, metric.type))
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        Returns all metrics in Prometheus text format (e.g. to serve from a /metrics endpoint)
+
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        return ''.join(metric.render() for name, metric in metrics)
+
+
+class ClientMetrics(object):
+    """
+    Metrics recorded by clients in a registry.
+
+    dps_requests_total counts requests by client, merchant (username), txn_type, HTTP status and DPS response code,
+    and dps_request_duration_seconds observes their latency by client, merchant and txn_type. PxFusion requests use
+    the SOAP method as txn_type. Failed requests have an empty response code, and an http_status of "error" when no
+    HTTP response was received.
+
+    """
+    def __init__(self, registry, client, merchant):
+        self.client = client
+        self.merchant = merchant
+        self.requests = registry.counter('dps_requests_total', "Requests sent to DPS",
+                                         ('client', 'merchant', 'txn_type', 'http_status', 'response_code'))
+        self.duration = registry.histogram('dps_request_duration_seconds', "Duration of requests sent to DPS",
+                                           ('client', 'merchant', 'txn_type'))
+
+    def record(self, txn_type, started, http_status, response_code=None, clock=clock):
+        """
+        Records a request of txn_type started at started (as returned by clock)
+
+        """
+        self.duration.labels(self.client, self.merchant, txn_type or '').observe(clock() - started)
+        http_status = six.text_type(http_status) if http_status else 'error'
+        self.requests.labels(self.client, self.merchant, txn_type or '', http_status, response_code or '').inc()
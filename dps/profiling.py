@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import random
+import pstats
+import cProfile
+import threading
+
+import six
+
+from .utils import clock
+
+__all__ = ["SamplingProfiler"]
+
+
+# Held while a call is profiled: cProfile cannot run concurrently in several threads, nor in several profilers (python
+# 3.12+ refuses to enable a profiler while another one is active)
+profile_lock = threading.Lock()
+
+
+class _Unsampled(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+UNSAMPLED = _Unsampled()
+
+
+class _Sample(object):
+    """
+    Context manager timing (and possibly profiling) a sampled call.
+
+    """
+    __slots__ = ('profiler', 'name', 'profile', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.profile = None
+        self.start = None
+
+    def __enter__(self):
+        # a single call is profiled at a time. Calls sampled meanwhile, or while another profiler (e.g. the
+        # application's) is active, are only timed.
+        if self.profiler.mode == SamplingProfiler.CPROFILE and profile_lock.acquire(False):
+            try:
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            except Exception:
+                self.profile = None
+                profile_lock.release()
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = self.profiler.clock() - self.start
+        if self.profile is not None:
+            self.profile.disable()
+            profile_lock.release()
+        self.profiler.add(self.name, duration, self.profile)
+
+
+class SamplingProfiler(object):
+    """
+    Profiler sampling a fraction of client calls.
+
+    Every client has a profiler, disabled by default, which can be switched on and off at runtime:
+
+        client.profiler.enable(rate=0.05, mode=SamplingProfiler.CPROFILE)
+        ...
+        print(client.profiler.report())
+        client.profiler.disable()
+
+    In TIMER mode, sampled calls are timed. In CPROFILE mode, they are also run under cProfile, and per-function
+    costs are aggregated across samples. Calls that are not sampled only pay for a random number draw, and nothing at
+    all while the profiler is disabled.
+
+    """
+    TIMER = 'timer'
+    CPROFILE = 'cprofile'
+
+    def __init__(self, rate=0, mode=TIMER, clock=clock, random=random.random):
+        """
+        Creates a profiler.
+
+        Args:
+          rate (float): fraction of calls sampled, between 0 (disabled) and 1 (every call).
+          mode (str): TIMER or CPROFILE.
+        """
+        self.clock = clock
+        self.random = random
+        self.lock = threading.Lock()
+        self.enable(rate, mode)
+        self.reset()
+
+    def enable(self, rate=0.01, mode=TIMER):
+        """
+        Samples a fraction (rate) of calls from now on, in mode (TIMER or CPROFILE)
+
+        """
+        if mode not in (self.TIMER, self.CPROFILE):
+            raise ValueError("Unknown profiling mode: {}".format(mode))
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        self.mode = mode
+        self.rate = rate
+
+    def disable(self):
+        """
+        Stops sampling calls. Samples collected so far are kept.
+
+        """
+        self.rate = 0
+
+    def reset(self):
+        """
+        Discards samples collected so far.
+
+        """
+        with self.lock:
+            self.timings = {}
+            self.stats = None
+
+    def sample(self, *name):
+        """
+        Returns a context manager around a call, which samples the call at the configured rate.
+
+        Samples are aggregated by name, given as parts joined with dots (e.g. sample('pxpost', 'Purchase')).
+
+        """
+        if not self.rate or self.random() >= self.rate:
+            return UNSAMPLED
+        return _Sample(self, '.'.join(six.text_type(part) for part in name))
+
+    def add(self, name, duration, profile=None):
+        """
+        Aggregates a sampled call's duration and profile
+
+        """
+        with self.lock:
+            count, total, longest = self.timings.get(name, (0, 0.0, 0.0))
+            self.timings[name] = count + 1, total + duration, max(longest, duration)
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+    def report(self, sort='cumulative', limit=30):
+        """
+        Returns a text report of sampled calls: count, mean and max durations per call name, followed by the limit
+        most costly functions (sorted by sort, as in pstats) when samples were profiled.
+
+        """
+        stream = six.StringIO()
+        with self.lock:
+            stream.write("{:<32} {:>8} {:>12} {:>12}\n".format("call", "samples", "mean (ms)", "max (ms)"))
+            for name, (count, total, longest) in sorted(self.timings.items()):
+                stream.write("{:<32} {:>8} {:>12.3f} {:>12.3f}\n".format(name, count, total / count * 1000,
+                                                                       longest * 1000))
+            if self.stats is not None:
+                stream.write("\n")
+                self.stats.stream = stream
+                self.stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self, path):
+        """
+        Writes aggregated profiles to path, in the pstats format (e.g. for snakeviz or pstats.Stats(path))
+
+        """
+        with self.lock:
+            if self.stats is None:
+                raise ValueError("No profiled samples")
+            self.stats.dump_stats(path)
@@ -2,3 +2,4 @@
 
 from .client import *
 from .transactions import *
+from .responses import *
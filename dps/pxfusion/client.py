@@ -5,10 +5,16 @@ from __future__ import unicode_literals
 from suds.client import Client as SOAPClient
 
 from ..vendors import suds_requests
-from ..vendors.inflection import camelize
-from ..utils import underscore_keys
+from ..inflect import camelize
+from ..utils import dispatch_hook, clock
+from ..cache import TTLCache, SingleFlight
+from ..metrics import ClientMetrics
+from ..tracing import NOOP_TRACER
+from ..profiling import SamplingProfiler
 from ..transactions import accept_txn
 
+from .responses import PxFusionTransactionIdResponse, PxFusionTransactionResponse
+
 from .transactions import PxFusionGetTransaction, PxFusionStatusTransaction, PxFusionCancelTransaction
 
 
@@ -26,22 +32,105 @@ class PxFusionClient(object):
     AUTH = 'Auth'
     PURCHASE = 'Purchase'
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, rate_limiter=None, circuit_breaker=None, cache_size=None, pending_ttl=2,
+                 metrics=None, tracer=None, profiler=None, soap_client=None,
+                 hooks=None):
+        """
+        Creates a PxFusion client.
+
+        Args:
+          username (str): PxFusion username.
+          password (str): PxFusion password.
+          rate_limiter (RateLimiter): optional rate limiter, applied per username. Pass the same instance to several
+            clients to share their budget.
+          circuit_breaker (CircuitBreaker): optional circuit breaker around calls to the PxFusion service.
+          cache_size (int): enables caching of get_transaction responses, keeping up to cache_size responses (least
+            recently used responses are evicted first). Responses with a final status are cached until evicted.
+          pending_ttl (float): number of seconds other responses (e.g. NOT_READY) are cached for.
+          metrics (MetricsRegistry): optional registry in which SOAP calls are counted and timed (see ClientMetrics).
+          tracer: optional tracer (e.g. Tracer or OpenTelemetryTracer) recording spans around requests.
+          profiler (SamplingProfiler): profiler sampling requests (defaults to a disabled profiler, which can be
+            enabled at runtime with client.profiler.enable()).
+          soap_client (suds.client.Client): PxFusion SOAP client, which can be shared by several clients as
+            credentials are sent with every call (see ClientManager). Defaults to a new client loading the WSDL.
+          hooks (dict): instrumentation hooks, as a dictionary of event names to callables (or lists of callables).
+            Events:
+              circuit_state: called with (client, old_state, new_state) when the circuit breaker changes state.
+        """
         self.username = username
         self.password = password
-        self.soap_client = SOAPClient(self.WSDL, transport=suds_requests.RequestsTransport())
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.tracer = tracer or NOOP_TRACER
+        self.profiler = profiler or SamplingProfiler()
+        self.hooks = hooks or {}
+        self.pending_ttl = pending_ttl
+        self.inflight = SingleFlight()
+        self.metrics = ClientMetrics(metrics, 'pxfusion', username) if metrics is not None else None
+        self.transaction_cache = TTLCache(cache_size, pending_ttl) if cache_size else None
+        if circuit_breaker is not None:
+            circuit_breaker.add_listener(self.circuit_state_changed)
+        self.soap_client = soap_client or SOAPClient(self.WSDL, transport=suds_requests.RequestsTransport())
+
+    def circuit_state_changed(self, breaker, old_state, new_state):
+        """
+        Publishes circuit breaker state changes to the circuit_state hooks
 
-    def create_transaction_details(self, **kwargs):
         """
-        Hydrates a TransactionDetails SOAP object from kwargs
+        dispatch_hook(self.hooks, 'circuit_state', self, old_state, new_state)
 
+    def throttle(self):
         """
-        txn_details = self.soap_client.factory.create('TransactionDetails')
-        for k, v in kwargs.items():
-            txn_details[camelize(k, False)] = v
-        return txn_details
+        Waits for the rate limiter, if any. Fails fast with CircuitOpen beforehand while the circuit breaker is open,
+        so that calls that will not be sent do not wait for (nor spend) rate limit tokens.
 
-    def get_transaction_id(self, **kwargs):
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.check()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.username)
+
+    def call_service(self, method, *args):
+        """
+        Calls a PxFusion SOAP method with the client's credentials followed by args
+
+        """
+        self.throttle()
+        service = getattr(self.soap_client.service, method)
+        with self.profiler.sample('pxfusion', method), \
+                self.tracer.span('dps.pxfusion.request', txn_type=method) as request_span:
+            started = clock()
+            try:
+                if self.circuit_breaker is not None:
+                    result = self.circuit_breaker.call(service, self.username, self.password, *args)
+                else:
+                    result = service(self.username, self.password, *args)
+            except Exception as e:
+                if self.metrics is not None:
+                    # suds raises WebFault for SOAP faults, which DPS sends with a 500 status
+                    self.metrics.record(method, started, 500 if hasattr(e, 'fault') else None)
+                raise
+            response_code = getattr(result, 'responseCode', None)
+            request_span.set_attribute('response_code', response_code)
+        if self.metrics is not None:
+            self.metrics.record(method, started, 200, response_code)
+        return result
+
+    def create_transaction_details(self, transaction=None, **kwargs):
+        """
+        Hydrates a TransactionDetails SOAP object from a transaction and/or kwargs
+
+        """
+        with self.tracer.span('dps.serialize'):
+            txn_details = self.soap_client.factory.create('TransactionDetails')
+            if transaction is not None:
+                for k, v in transaction.to_soap_fields():
+                    txn_details[k] = v
+            for k, v in kwargs.items():
+                txn_details[camelize(k, False)] = v
+            return txn_details
+
+    def get_transaction_id(self, transaction=None, **kwargs):
         """
         The merchant will make a server-side SOAP HTTP POST to the
         web service. The data submitted will not include sensitive
@@ -107,9 +196,9 @@ class PxFusionClient(object):
           txn_data3 (str)
 
         """
-        trans_details = self.create_transaction_details(**kwargs)
-        response = self.soap_client.service.GetTransactionId(self.username, self.password, trans_details)
-        return underscore_keys(dict(response))
+        trans_details = self.create_transaction_details(transaction, **kwargs)
+        response = self.call_service('GetTransactionId', trans_details)
+        return PxFusionTransactionIdResponse(response)
 
     def get_transaction(self, transaction_id):
         """
@@ -121,9 +210,22 @@ class PxFusionClient(object):
         of the GetTransaction SOAP call with sessionId value contained
         within the query string.
 
+        Concurrent calls for the same transaction_id are coalesced into a single SOAP call. Responses are also cached
+        when the client has a cache_size (see transaction_cache.info() for hit/miss statistics).
+
         """
-        response = self.soap_client.service.GetTransaction(self.username, self.password, transaction_id)
-        return underscore_keys(dict(response))
+        if self.transaction_cache is not None:
+            try:
+                return self.transaction_cache.get(transaction_id)
+            except KeyError:
+                pass
+        return self.inflight.do(transaction_id, self._get_transaction, transaction_id)
+
+    def _get_transaction(self, transaction_id):
+        response = PxFusionTransactionResponse(self.call_service('GetTransaction', transaction_id))
+        if self.transaction_cache is not None:
+            self.transaction_cache.set(transaction_id, response, None if response.final else self.pending_ttl)
+        return response
 
     def cancel_transaction(self, transaction_id):
         """
@@ -132,30 +234,30 @@ class PxFusionClient(object):
         a given sessionId.
 
         """
-        return self.soap_client.service.CancelTransaction(self.username, self.password, transaction_id)
+        return self.call_service('CancelTransaction', transaction_id)
 
     @accept_txn(PxFusionGetTransaction)
-    def authorize(self, **kwargs):
+    def authorize(self, transaction):
         """
         Authorise - Amount is authorised, no funds transferred.
 
         Facade to get_transaction_id that takes a transaction as argument
 
         """
-        return self.get_transaction_id(txn_type=self.AUTH, **kwargs)
+        return self.get_transaction_id(transaction, txn_type=self.AUTH)
 
     @accept_txn(PxFusionGetTransaction)
-    def purchase(self, **kwargs):
+    def purchase(self, transaction):
         """
         Purchase - Funds are transferred immediately.
 
         Facade to get_transaction_id that takes a transaction as argument
 
         """
-        return self.get_transaction_id(txn_type=self.PURCHASE, **kwargs)
+        return self.get_transaction_id(transaction, txn_type=self.PURCHASE)
 
     @accept_txn(PxFusionStatusTransaction)
-    def status(self, **kwargs):
+    def status(self, transaction):
         """
         Status - requests transaction status after user
         is redirect back from dps
@@ -163,14 +265,14 @@ class PxFusionClient(object):
         Facade to get_transaction that takes a transaction as argument
 
         """
-        return self.get_transaction(**kwargs)
+        return self.get_transaction(transaction_id=transaction.transaction_id)
 
     @accept_txn(PxFusionCancelTransaction)
-    def cancel(self, **kwargs):
+    def cancel(self, transaction):
         """
         Cancel - cancel transaction for given session
 
         Facade to cancel_transaction that takes a transaction as argument
 
         """
-        return self.cancel_transaction(**kwargs)
+        return self.cancel_transaction(transaction_id=transaction.transaction_id)
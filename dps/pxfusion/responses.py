@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from .. import responses as res
+
+__all__ = ["PxFusionTransactionIdResponse", "PxFusionTransactionResponse"]
+
+
+class PxFusionTransactionIdResponse(res.BaseResponse):
+    """
+    Typed PxFusion GetTransactionId response
+
+    See https://www.paymentexpress.com/Technical_Resources/Ecommerce_NonHosted/PxFusion#GetTransactionId
+
+    """
+    __slots__ = ()
+
+    success = res.ResponseField('success', decode=res.boolean)
+    transaction_id = res.ResponseField('transactionId')
+    session_id = res.ResponseField('sessionId')
+
+
+class PxFusionTransactionResponse(res.BaseResponse):
+    """
+    Typed PxFusion GetTransaction response
+
+    See https://www.paymentexpress.com/Technical_Resources/Ecommerce_NonHosted/PxFusion#GetTransaction
+
+    """
+    __slots__ = ()
+
+    # Transaction status codes
+    APPROVED = 0
+    DECLINED = 1
+    DECLINED_RETRY = 2
+    INVALID_POST_DATA = 3
+    RESULT_NOT_FOUND = 4
+    NOT_READY = 5
+    ERROR = 6
+
+    # Statuses that never change once a session reaches them
+    FINAL_STATUSES = frozenset([APPROVED, DECLINED, DECLINED_RETRY])
+
+    status = res.ResponseField('status', decode=res.integer)
+    response_code = res.ResponseField('responseCode')
+    response_text = res.ResponseField('responseText')
+    session_id = res.ResponseField('sessionId')
+    dps_txn_ref = res.ResponseField('dpsTxnRef')
+    txn_ref = res.ResponseField('txnRef')
+    txn_type = res.ResponseField('txnType')
+    amount = res.ResponseField('amount', decode=res.amount)
+    currency_id = res.ResponseField('currencyId', decode=res.integer)
+    currency_name = res.ResponseField('currencyName')
+    auth_code = res.ResponseField('authCode')
+    merchant_reference = res.ResponseField('merchantReference')
+    card_name = res.ResponseField('cardName')
+    card_holder_name = res.ResponseField('cardHolderName')
+    card_number = res.ResponseField('cardNumber')
+    date_expiry = res.ResponseField('dateExpiry')
+    date_settlement = res.ResponseField('dateSettlement')
+    billing_id = res.ResponseField('billingId')
+    dps_billing_id = res.ResponseField('dpsBillingId')
+    cvc2_result_code = res.ResponseField('cvc2ResultCode')
+    test_mode = res.ResponseField('testMode', decode=res.boolean)
+    txn_data1 = res.ResponseField('txnData1')
+    txn_data2 = res.ResponseField('txnData2')
+    txn_data3 = res.ResponseField('txnData3')
+    txn_mac = res.ResponseField('txnMac')
+
+    @property
+    def approved(self):
+        return self.status == self.APPROVED
+
+    @property
+    def final(self):
+        return self.status in self.FINAL_STATUSES
@@ -2,3 +2,5 @@
 
 from .client import *
 from .transactions import *
+from .responses import *
+from .archive import *
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import re
+import six
+from xml.parsers import expat
+
+from ..vendors.xmltodict import _DictSAXHandler
+from .responses import PxPostResponse
+
+__all__ = ["read_responses"]
+
+
+# XML declarations of each archived response, which are not allowed once responses are wrapped in a single document
+XML_DECLARATION = re.compile(br'<\?xml[^>]*\?>')
+
+# Default size of chunks read from archives
+CHUNK_SIZE = 64 * 1024
+
+
+def _strip_declarations(chunks):
+    """
+    Removes XML declarations from a stream of byte chunks.
+
+    Incomplete tags at the end of a chunk are held back until the next chunk so declarations split across chunks are
+    removed too.
+
+    """
+    pending = b''
+    for chunk in chunks:
+        if isinstance(chunk, six.text_type):
+            chunk = chunk.encode('utf-8')
+        data = XML_DECLARATION.sub(b'', pending + chunk)
+        index = data.rfind(b'<')
+        if index != -1 and data.find(b'>', index) == -1:
+            data, pending = data[:index], data[index:]
+        else:
+            pending = b''
+        if data:
+            yield data
+    if pending:
+        yield XML_DECLARATION.sub(b'', pending)
+
+
+def _read_chunks(fileobj, chunk_size):
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_responses(source, chunk_size=CHUNK_SIZE):
+    """
+    Generator that reads archived PxPost responses and yields them one at a time as PxPostResponse objects.
+
+    The archive is a file of concatenated raw PxPost response documents (e.g. a log of response.content), optionally
+    each with its own XML declaration. It is read incrementally and fed to an expat parser, so memory use stays
+    constant whatever the size of the archive. Responses are expected to be utf-8 encoded.
+
+    Args:
+      source: path or binary file-like object (e.g. gzip.open(path)).
+      chunk_size (int): number of bytes read at a time.
+
+    """
+    if isinstance(source, six.string_types):
+        with open(source, 'rb') as fileobj:
+            for response in read_responses(fileobj, chunk_size):
+                yield response
+        return
+
+    items = []
+    handler = _DictSAXHandler(item_depth=2, item_callback=lambda path, item: items.append(item) or True)
+    parser = expat.ParserCreate('utf-8')
+    parser.ordered_attributes = True
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+    parser.buffer_text = True
+
+    parser.Parse(b'<Responses>', False)
+    for chunk in _strip_declarations(_read_chunks(source, chunk_size)):
+        parser.Parse(chunk, False)
+        for item in items:
+            yield PxPostResponse(item)
+        del items[:]
+    parser.Parse(b'</Responses>', True)
+    for item in items:
+        yield PxPostResponse(item)
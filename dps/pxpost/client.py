@@ -2,19 +2,25 @@
 
 from __future__ import unicode_literals
 
+import os
 import requests
-from xml.dom.minidom import Document
 
-from ..vendors import xmltodict
-from ..vendors.inflection import camelize
-from ..utils import underscore_keys_postproc
+from ..inflect import camelize
+from ..utils import underscore_keys, dispatch_hook, clock
+from ..exceptions import ResponseTooLarge, CircuitOpen
+from ..cache import TTLCache, SingleFlight
+from ..metrics import ClientMetrics
+from ..tracing import NOOP_TRACER
+from ..profiling import SamplingProfiler
+from ..xmlbackend import get_backend
 from ..transactions import accept_txn
 
+from .responses import PxPostResponse
 from .transactions import PxPostCardTransaction, PxPostDpsBillingTransaction, PxPostBillingTransaction, \
                           PxPostCompleteTransaction, PxPostRefundTransaction, PxPostStatusTransaction
 
 
-__all__ = ["PxPostClient"]
+__all__ = ["PxPostClient", "ProcessSession"]
 
 
 class PxRequest(object):
@@ -40,14 +46,7 @@ class PxRequest(object):
 
     def to_xml(self):
         """Returns request as an XML document fragment."""
-        doc = Document()
-        root = doc.createElement(self.root_tag)
-        for key, value in self.dict.items():
-            element = doc.createElement(camelize(key))
-            element.appendChild(doc.createTextNode(str(value)))
-            root.appendChild(element)
-        doc.appendChild(root)
-        return doc.toxml()
+        return get_backend().build(self.root_tag, ((camelize(key), value) for key, value in self.dict.items()))
 
 
 class PxResponse(object):
@@ -60,14 +59,52 @@ class PxResponse(object):
         Create a new PxResponse.
 
         Args:
-          xml (str): XML document fragment received from DPS.
+          xml (bytes): XML document fragment received from DPS. Bytes (or a memoryview) are parsed without being
+            decoded first, using the encoding declared by the document.
         """
         self.xml = xml
 
+    def parse(self):
+        """Returns response as a Python dictionary, with keys as sent by DPS."""
+        return list(get_backend().parse(self.xml).values()).pop()
+
     def to_dict(self):
         """Returns response as a Python dictionary."""
-        dictionary = dict(xmltodict.parse(self.xml, postprocessor=underscore_keys_postproc))
-        return list(dictionary.values()).pop()
+        return underscore_keys(self.parse(), inplace=True)
+
+
+class ProcessSession(object):
+    """
+    requests session (connection pool) that is never shared across processes: a new session is created when it is
+    used after a fork.
+
+    """
+    def __init__(self, pool_size=None):
+        """
+        Creates a per-process session.
+
+        Args:
+          pool_size (int): maximum number of connections kept open (defaults to the requests default).
+        """
+        self.pool_size = pool_size
+        self._session = None
+        self._session_pid = None
+
+    def get(self):
+        """
+        Returns the session of the current process
+
+        """
+        if self._session is None or self._session_pid != os.getpid():
+            session = requests.Session()
+            if self.pool_size:
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_size)
+                # http too, for local stand-ins (see dps.loadtest)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+            self._session = session
+            self._session_pid = os.getpid()
+        return self._session
 
 
 class PxPostClient(object):
@@ -81,6 +118,9 @@ class PxPostClient(object):
 
     URI = 'https://sec.paymentexpress.com/pxpost.aspx'
 
+    # Maximum size of responses accepted from DPS, in bytes
+    MAX_RESPONSE_SIZE = 256 * 1024
+
     AUTHORIZE = 'Auth'
     PURCHASE = 'Purchase'
     COMPLETE = 'Complete'
@@ -88,14 +128,118 @@ class PxPostClient(object):
     VALIDATE = 'Validate'
     STATUS = 'Status'
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, max_response_size=None, rate_limiter=None, circuit_breaker=None,
+                 dedupe_ttl=None, dedupe_size=1024, metrics=None, tracer=None, profiler=None, pool=None,
+                 journal=None, hooks=None):
+        """
+        Creates a PxPost client.
+
+        Args:
+          username (str): PxPost username.
+          password (str): PxPost password.
+          max_response_size (int): maximum size of responses, in bytes (defaults to MAX_RESPONSE_SIZE).
+          rate_limiter (RateLimiter): optional rate limiter, applied per username. Pass the same instance to several
+            clients to share their budget.
+          circuit_breaker (CircuitBreaker): optional circuit breaker around calls to the PxPost endpoint.
+          dedupe_ttl (float): enables deduplication of transactions by txn_id. Concurrent posts with the same txn_id
+            and txn_type are sent once, and definitive responses (neither StatusRequired nor Retry) are reused for
+            posts repeated within dedupe_ttl seconds.
+            Status transactions are never cached, as their response changes over time.
+          dedupe_size (int): maximum number of responses kept for deduplication.
+          metrics (MetricsRegistry): optional registry in which requests are counted and timed (see ClientMetrics).
+          tracer: optional tracer (e.g. Tracer or OpenTelemetryTracer) recording spans around requests.
+          profiler (SamplingProfiler): profiler sampling requests (defaults to a disabled profiler, which can be
+            enabled at runtime with client.profiler.enable()).
+          pool (ProcessSession): connection pool, which can be shared by several clients (see ClientManager).
+          journal (Journal): optional journal recording transactions with a txn_id before they are sent, and their
+            outcome once a response is received (see dps.journal.recover).
+          hooks (dict): instrumentation hooks, as a dictionary of event names to callables (or lists of callables).
+            Events:
+              circuit_state: called with (client, old_state, new_state) when the circuit breaker changes state.
+        """
         self.username = username
         self.password = password
+        self.max_response_size = max_response_size or self.MAX_RESPONSE_SIZE
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.tracer = tracer or NOOP_TRACER
+        self.profiler = profiler or SamplingProfiler()
+        self.pool = pool or ProcessSession()
+        self.journal = journal
+        self.hooks = hooks or {}
+        self.inflight = SingleFlight()
+        self.recent = TTLCache(dedupe_size, dedupe_ttl) if dedupe_ttl else None
+        self.metrics = ClientMetrics(metrics, 'pxpost', username) if metrics is not None else None
+        if circuit_breaker is not None:
+            circuit_breaker.add_listener(self.circuit_state_changed)
+
+    def circuit_state_changed(self, breaker, old_state, new_state):
+        """
+        Publishes circuit breaker state changes to the circuit_state hooks
+
+        """
+        dispatch_hook(self.hooks, 'circuit_state', self, old_state, new_state)
+
+    def throttle(self):
+        """
+        Waits for the rate limiter, if any. Fails fast with CircuitOpen beforehand while the circuit breaker is open,
+        so that calls that will not be sent do not wait for (nor spend) rate limit tokens.
 
-    def post(self, **kwargs):
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.check()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.username)
+
+    @property
+    def session(self):
+        """
+        Returns the requests session (connection pool) used by the client.
+
+        Sessions are not shared across processes: a new session is created when the client is used after a fork.
+
+        """
+        return self.pool.get()
+
+    def read_response(self, response):
+        """
+        Reads the body of a streamed response, up to max_response_size bytes.
+
+        Raises ResponseTooLarge as soon as the body is known to exceed max_response_size.
+
+        """
+        length = response.headers.get('Content-Length')
+        if length is not None and int(length) > self.max_response_size:
+            response.close()
+            raise ResponseTooLarge("Response is {} bytes (max is {})".format(length, self.max_response_size))
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            content.extend(chunk)
+            if len(content) > self.max_response_size:
+                response.close()
+                raise ResponseTooLarge("Response exceeds {} bytes".format(self.max_response_size))
+        return memoryview(content)
+
+    def send(self, data):
+        """
+        Sends an XML request to the pxpost endpoint and returns the response body.
+
+        """
+        return self._send(data)[1]
+
+    def _send(self, data):
+        response = self.session.post(self.URI, data=data, stream=True)
+        response.raise_for_status()
+        return response.status_code, self.read_response(response)
+
+    def post(self, transaction=None, **kwargs):
         """
         Performs a call to the pxpost endpoint.
 
+        Returns a PxPostResponse, which also behaves as the dictionary returned by PxResponse.to_dict().
+
+        When a transaction object is given, it is serialized directly to XML and kwargs are sent alongside its fields.
+
         Required kwargs:
           txn_type (str)
           amount (str)
@@ -135,48 +279,115 @@ class PxPostClient(object):
           txn_ref (str)
 
         """
+        key = self.dedupe_key(transaction, kwargs)
+        if key is None:
+            return self._post(transaction, **kwargs)
+        try:
+            return self.recent.get(key)
+        except KeyError:
+            return self.inflight.do(key, self._post_once, transaction, key, **kwargs)
+
+    def dedupe_key(self, transaction, kwargs):
+        """
+        Returns the key used to deduplicate a post, or None if it must not be deduplicated.
+
+        """
+        if self.recent is None or kwargs.get('txn_type') == self.STATUS:
+            return None
+        txn_id = kwargs.get('txn_id') or getattr(transaction, 'txn_id', None)
+        if not txn_id:
+            return None
+        return txn_id, kwargs.get('txn_type')
+
+    def _post_once(self, transaction, dedupe_key, **kwargs):
+        # a call that completed between the lookup in post and joining the in-flight map has already cached its response
+        try:
+            return self.recent.get(dedupe_key)
+        except KeyError:
+            return self._post(transaction, dedupe_key=dedupe_key, **kwargs)
+
+    def _post(self, transaction=None, dedupe_key=None, **kwargs):
+        self.throttle()
         kwargs.update({'post_username': self.username, 'post_password': self.password})
-        response = requests.post(self.URI, data=PxRequest('Txn', **kwargs).to_xml())
-        response.raise_for_status()
-        return PxResponse(response.content).to_dict()
+        txn_type = kwargs.get('txn_type')
+        with self.profiler.sample('pxpost', txn_type), \
+                self.tracer.span('dps.pxpost.request', txn_type=txn_type) as request_span:
+            with self.tracer.span('dps.serialize'):
+                if transaction is not None:
+                    data = transaction.to_xml('Txn', **kwargs)
+                else:
+                    data = PxRequest('Txn', **kwargs).to_xml()
+            txn_id = kwargs.get('txn_id') or getattr(transaction, 'txn_id', None)
+            journaled = self.journal is not None and txn_id and txn_type != self.STATUS
+            if journaled:
+                self.journal.intent(txn_id, txn_type)
+            started = clock()
+            try:
+                with self.tracer.span('dps.http') as http_span:
+                    if self.circuit_breaker is not None:
+                        status_code, content = self.circuit_breaker.call(self._send, data)
+                    else:
+                        status_code, content = self._send(data)
+                    http_span.set_attribute('http.status_code', status_code)
+                with self.tracer.span('dps.parse'):
+                    response = PxPostResponse(PxResponse(content).parse())
+            except Exception as e:
+                if self.metrics is not None:
+                    error_response = getattr(e, 'response', None)
+                    self.metrics.record(txn_type, started, getattr(error_response, 'status_code', None))
+                if journaled and isinstance(e, CircuitOpen):
+                    # the transaction was not sent, other errors leave its outcome unknown
+                    self.journal.outcome(txn_id, txn_type, error=e)
+                raise
+            request_span.set_attribute('response_code', response.re_co)
+            if journaled:
+                self.journal.outcome(txn_id, txn_type, response)
+        if self.metrics is not None:
+            self.metrics.record(txn_type, started, status_code, response.re_co)
+        if dedupe_key is not None and not response.status_required and not response.retry:
+            # only definitive responses are cached, as DPS expects indeterminate ones to be retried (or their status
+            # requested). They are cached before the call leaves the in-flight map, and _post_once looks them up again
+            # once in it, so that a post racing with the end of another one does not send a duplicate.
+            self.recent.set(dedupe_key, response)
+        return response
 
     @accept_txn(PxPostCardTransaction, PxPostDpsBillingTransaction, PxPostBillingTransaction)
-    def authorize(self, **kwargs):
+    def authorize(self, transaction):
         """
         Authorizes a transaction. Must be completed within 7 days
         using the "Complete" TxnType.
 
         """
-        return self.post(txn_type=self.AUTHORIZE, **kwargs)
+        return self.post(transaction, txn_type=self.AUTHORIZE)
 
     @accept_txn(PxPostCompleteTransaction)
-    def complete(self, **kwargs):
+    def complete(self, transaction):
         """
         Completes (settles) a pre-approved Auth Transaction. The
         DpsTxnRef value returned by the original approved Auth
         transaction must be supplied, as well as an amount.
 
         """
-        return self.post(txn_type=self.COMPLETE, **kwargs)
+        return self.post(transaction, txn_type=self.COMPLETE)
 
     @accept_txn(PxPostCardTransaction, PxPostDpsBillingTransaction, PxPostBillingTransaction)
-    def purchase(self, **kwargs):
+    def purchase(self, transaction):
         """
         Performs a transaction where funds are transferred immediately.
 
         """
-        return self.post(txn_type=self.PURCHASE, **kwargs)
+        return self.post(transaction, txn_type=self.PURCHASE)
 
     @accept_txn(PxPostRefundTransaction)
-    def refund(self, **kwargs):
+    def refund(self, transaction):
         """
         Performs a refund where funds are transferred immediately.
 
         """
-        return self.post(txn_type=self.REFUND, **kwargs)
+        return self.post(transaction, txn_type=self.REFUND)
 
     @accept_txn(PxPostCardTransaction)
-    def validate(self, **kwargs):
+    def validate(self, transaction):
 
         """
         Validation Transaction. Issues a $1.00 Auth to validate card
@@ -185,10 +396,10 @@ class PxPostClient(object):
         Billing Database if the transaction is approved.
 
         """
-        return self.post(txn_type=self.VALIDATE, **kwargs)
+        return self.post(transaction, txn_type=self.VALIDATE)
 
     @accept_txn(PxPostStatusTransaction)
-    def status(self, **kwargs):
+    def status(self, transaction):
         """
         If you didn't receive a response to your Post, or if StatusRequired
         was set to 1 in the response, then you must send another Post to
@@ -197,5 +408,7 @@ class PxPostClient(object):
         must be a unique value for each transaction. It can be up to 16
         characters long.
 
+        Concurrent status requests for the same TxnId are coalesced into a single post.
+
         """
-        return self.post(txn_type=self.STATUS, **kwargs)
+        return self.inflight.do((transaction.txn_id, self.STATUS), self.post, transaction, txn_type=self.STATUS)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from .. import responses as res
+
+__all__ = ["PxPostResponse"]
+
+
+class PxPostResponse(res.BaseResponse):
+    """
+    Typed PxPost response
+
+    See https://www.paymentexpress.com/Technical_Resources/Ecommerce_NonHosted/PxPost#XMLTxnOutput
+
+    """
+    __slots__ = ()
+
+    success = res.ResponseField('Success', decode=res.boolean)
+    re_co = res.ResponseField('ReCo')
+    response_text = res.ResponseField('ResponseText')
+    help_text = res.ResponseField('HelpText')
+    dps_txn_ref = res.ResponseField('DpsTxnRef')
+    txn_ref = res.ResponseField('TxnRef')
+
+    authorized = res.ResponseField('Transaction', 'Authorized', decode=res.boolean)
+    status_required = res.ResponseField('Transaction', 'StatusRequired', decode=res.boolean)
+    retry = res.ResponseField('Transaction', 'Retry', decode=res.boolean)
+    test_mode = res.ResponseField('Transaction', 'TestMode', decode=res.boolean)
+    amount = res.ResponseField('Transaction', 'Amount', decode=res.amount)
+    currency_name = res.ResponseField('Transaction', 'CurrencyName')
+    auth_code = res.ResponseField('Transaction', 'AuthCode')
+    txn_type = res.ResponseField('Transaction', 'TxnType')
+    txn_id = res.ResponseField('Transaction', 'TxnId')
+    merchant_reference = res.ResponseField('Transaction', 'MerchantReference')
+    card_name = res.ResponseField('Transaction', 'CardName')
+    card_holder_name = res.ResponseField('Transaction', 'CardHolderName')
+    card_number = res.ResponseField('Transaction', 'CardNumber')
+    date_expiry = res.ResponseField('Transaction', 'DateExpiry')
+    billing_id = res.ResponseField('Transaction', 'BillingId')
+    dps_billing_id = res.ResponseField('Transaction', 'DpsBillingId')
+    cvc2_result_code = res.ResponseField('Transaction', 'Cvc2ResultCode')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import time
+import threading
+
+from .exceptions import RateLimited
+from .utils import clock
+
+__all__ = ["TokenBucket", "RateLimiter"]
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket.
+
+    Tokens are reserved rather than polled: a caller that finds the bucket empty takes a token ahead of time and is
+    told how long to wait for it, so waiting callers never spin. Threaded callers use acquire, asyncio callers can
+    use reserve with asyncio.sleep:
+
+        yield from asyncio.sleep(bucket.reserve())
+
+    """
+    def __init__(self, rate, burst=None, clock=clock):
+        """
+        Creates a token bucket.
+
+        Args:
+          rate (float): tokens added per second.
+          burst (int): maximum number of tokens (defaults to rate, or 1 if rate is lower).
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1, timeout=None):
+        """
+        Takes tokens and returns the number of seconds to wait before using them.
+
+        Raises RateLimited (without taking tokens) if the wait would be longer than timeout.
+
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            delay = max(0.0, (tokens - self.tokens) / self.rate)
+            if timeout is not None and delay > timeout:
+                raise RateLimited("Rate limit exceeded (wait would be {:.3f}s)".format(delay))
+            self.tokens -= tokens
+            return delay
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Takes tokens, blocking until they are available.
+
+        """
+        delay = self.reserve(tokens, timeout)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RateLimiter(object):
+    """
+    Token buckets keyed by merchant (client username).
+
+    A rate limiter can be shared by several clients (e.g. PxPostClient and PxFusionClient) to share their budget
+    within the process.
+
+    """
+    def __init__(self, rate, burst=None, clock=clock):
+        """
+        Creates a rate limiter allowing rate requests per second, with bursts of up to burst requests, per key.
+
+        """
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, key):
+        """
+        Returns the token bucket for key
+
+        """
+        try:
+            return self.buckets[key]
+        except KeyError:
+            with self.lock:
+                if key not in self.buckets:
+                    self.buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+                return self.buckets[key]
+
+    def reserve(self, key, tokens=1, timeout=None):
+        """
+        Same as TokenBucket.reserve for key's bucket
+
+        """
+        return self.bucket(key).reserve(tokens, timeout)
+
+    def acquire(self, key, tokens=1, timeout=None):
+        """
+        Same as TokenBucket.acquire for key's bucket
+
+        """
+        return self.bucket(key).acquire(tokens, timeout)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import io
+import os
+import csv
+import json
+import decimal
+from collections import deque, namedtuple
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from .utils import fsync_directory
+from .pxfusion import PxFusionClient, PxFusionTransactionResponse
+
+__all__ = ["Reconciler", "ReconcileSummary"]
+
+
+# Outcomes of transactions, as expected in files and found in responses
+APPROVED = 'approved'
+DECLINED = 'declined'
+PENDING = 'pending'
+NOT_FOUND = 'not_found'
+ERROR = 'error'
+
+PXFUSION_OUTCOMES = {
+    PxFusionTransactionResponse.APPROVED: APPROVED,
+    PxFusionTransactionResponse.DECLINED: DECLINED,
+    PxFusionTransactionResponse.DECLINED_RETRY: DECLINED,
+    PxFusionTransactionResponse.NOT_READY: PENDING,
+    PxFusionTransactionResponse.RESULT_NOT_FOUND: NOT_FOUND,
+}
+
+# Response text of PxPost status responses for transactions unknown to DPS
+PXPOST_NOT_FOUND = 'TRANSACTION NOT FOUND'
+
+REPORT_COLUMNS = ['line', 'txn_id', 'field', 'expected', 'actual']
+
+# Counts of a reconciliation run. mismatched counts transactions with at least one difference, errors counts
+# transactions whose status could not be retrieved.
+ReconcileSummary = namedtuple('ReconcileSummary', ['checked', 'matched', 'mismatched', 'errors'])
+
+
+def _open_csv(path, mode):
+    if six.PY2:  # pragma no cover
+        return io.open(path, mode + 'b')
+    return io.open(path, mode, newline='', encoding='utf-8')
+
+
+class Reconciler(object):
+    """
+    Checks a file of expected transactions against DPS.
+
+    The expected transactions file is a CSV file with a header, and the columns:
+      txn_id: PxPost TxnId, or PxFusion transaction id.
+      amount (optional): expected amount.
+      outcome (optional): expected outcome (approved, declined, pending or not_found).
+
+    Each transaction is looked up with client.status (PxPostClient) or client.get_transaction (PxFusionClient), with up
+    to concurrency lookups in flight. Differences are streamed to a CSV report (see REPORT_COLUMNS) in file order, so
+    memory use does not depend on the size of the file.
+
+    When a checkpoint path is given, progress is saved every checkpoint_every transactions, and an interrupted run
+    resumes from the last checkpoint (the report is truncated to match it). The checkpoint is removed once the run
+    completes.
+
+    Example:
+      summary = Reconciler(client, concurrency=16).run('expected.csv', 'report.csv', checkpoint='reconcile.json')
+
+    """
+    def __init__(self, client, concurrency=8, checkpoint_every=100):
+        self.client = client
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+
+    def lookup(self, txn_id):
+        """
+        Returns the (outcome, amount) of a transaction at DPS
+
+        """
+        if isinstance(self.client, PxFusionClient):
+            response = self.client.get_transaction(txn_id)
+            return PXFUSION_OUTCOMES.get(response.status, ERROR), response.amount
+        response = self.client.status(txn_id=txn_id)
+        if not response.success and PXPOST_NOT_FOUND in (response.response_text or '').upper():
+            return NOT_FOUND, None
+        if response.status_required:
+            return PENDING, response.amount
+        return (APPROVED if response.authorized else DECLINED), response.amount
+
+    def check(self, row):
+        """
+        Returns the differences between an expected transaction and DPS, as a list of (field, expected, actual)
+
+        """
+        txn_id = row.get('txn_id')
+        if not txn_id:
+            return [('lookup', '', 'missing txn_id')]
+        try:
+            outcome, amount = self.lookup(txn_id)
+        except Exception as e:
+            return [('lookup', '', '{}: {}'.format(e.__class__.__name__, e))]
+        differences = []
+        if row.get('outcome') and row['outcome'].strip().lower() != outcome:
+            differences.append(('outcome', row['outcome'], outcome))
+        if row.get('amount'):
+            try:
+                matches = amount is not None and decimal.Decimal(row['amount']) == amount
+            except decimal.InvalidOperation:
+                matches = False
+            if not matches:
+                differences.append(('amount', row['amount'], amount))
+        return differences
+
+    def load_checkpoint(self, checkpoint):
+        if checkpoint is None or not os.path.exists(checkpoint):
+            return {'line': 0, 'report_offset': 0, 'summary': [0, 0, 0, 0]}
+        with io.open(checkpoint, 'r', encoding='utf-8') as fileobj:
+            return json.load(fileobj)
+
+    def save_checkpoint(self, checkpoint, line, report, summary):
+        # the report is durable before the checkpoint pointing past its data
+        report.flush()
+        os.fsync(report.fileno())
+        state = {'line': line, 'report_offset': report.tell(), 'summary': list(summary)}
+        path = checkpoint + '.tmp'
+        with io.open(path, 'w', encoding='utf-8') as fileobj:
+            fileobj.write(six.text_type(json.dumps(state)))
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        os.rename(path, checkpoint)
+        fsync_directory(checkpoint)
+
+    def run(self, expected, report, checkpoint=None):
+        """
+        Reconciles the expected transactions file with DPS, writes differences to the report file and returns a
+        ReconcileSummary (including transactions checked before resuming from a checkpoint).
+
+        """
+        state = self.load_checkpoint(checkpoint)
+        summary = state['summary']
+        resumed = state['line'] > 0
+        if resumed:
+            with io.open(report, 'r+b') as fileobj:
+                fileobj.truncate(state['report_offset'])
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            with _open_csv(expected, 'r') as source, _open_csv(report, 'a' if resumed else 'w') as output:
+                writer = csv.writer(output)
+                if not resumed:
+                    writer.writerow(REPORT_COLUMNS)
+                pending = deque()
+
+                def emit():
+                    line, row, result = pending.popleft()
+                    differences = result.get()
+                    summary[0] += 1
+                    if not differences:
+                        summary[1] += 1
+                    elif differences[0][0] == 'lookup':
+                        summary[3] += 1
+                    else:
+                        summary[2] += 1
+                    for field, expected_value, actual in differences:
+                        writer.writerow([line, row.get('txn_id'), field, expected_value, actual])
+                    if checkpoint is not None and line % self.checkpoint_every == 0:
+                        self.save_checkpoint(checkpoint, line, output, summary)
+
+                # lines are numbered from 1, after the header
+                skip = state['line']
+                for line, row in enumerate(csv.DictReader(source), 1):
+                    if line <= skip:
+                        continue
+                    pending.append((line, row, pool.apply_async(self.check, (row,))))
+                    # results are written in order, with a bounded number of lookups ahead of the oldest one
+                    if len(pending) >= 2 * self.concurrency:
+                        emit()
+                while pending:
+                    emit()
+        finally:
+            pool.close()
+            pool.join()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return ReconcileSummary(*summary)
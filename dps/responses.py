@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import six
+import copy
+import decimal
+
+try:  # pragma no cover
+    from collections.abc import Mapping
+except ImportError:  # pragma no cover
+    from collections import Mapping
+
+from .utils import underscore_keys, plain_data
+
+__all__ = ["BaseResponse", "ResponseField", "text", "boolean", "integer", "amount"]
+
+
+def text(value):
+    """
+    Decodes a text value.
+
+    """
+    return six.text_type(value)
+
+
+def boolean(value):
+    """
+    Decodes a boolean value ('1', '0', 'true', 'false').
+
+    """
+    if isinstance(value, bool):
+        return value
+    return six.text_type(value).strip().lower() in ('1', 'true')
+
+
+def integer(value):
+    """
+    Decodes an integer value.
+
+    """
+    return int(value)
+
+
+def amount(value):
+    """
+    Decodes an amount into a Decimal.
+
+    """
+    return decimal.Decimal(str(value))
+
+
+class ResponseField(object):
+    """
+    Descriptor for a typed response field.
+
+    The raw value found at path is decoded on first access and cached on the response.
+
+    """
+    def __init__(self, *path, **kwargs):
+        """
+        Creates a response field.
+
+        Args:
+          path (str): keys of the raw value, as sent by DPS.
+
+        Keyword Args:
+          decode (callable): decoder for the raw value (defaults to text).
+        """
+        self.path = path
+        self.decode = kwargs.get('decode', text)
+
+    def __get__(self, instance, owner):
+        """
+        Field descriptor __get__ method.
+
+        """
+        if instance is None:
+            return self
+        cache = instance._cache
+        if cache is None:
+            cache = instance._cache = {}
+        try:
+            return cache[self]
+        except KeyError:
+            value = instance.lookup(self.path)
+            value = cache[self] = None if value is None or value == '' else self.decode(value)
+            return value
+
+
+class BaseResponse(Mapping):
+    """
+    Base class for typed DPS responses.
+
+    Responses keep the raw payload received from DPS. Typed fields are decoded on first access, and the response can
+    be used as a read-only dictionary of underscored keys and raw values (as returned before typed responses).
+
+    """
+    __slots__ = ('raw', '_cache', '_dict')
+
+    def __init__(self, raw):
+        """
+        Creates a response from a raw payload (a dictionary or a suds object).
+
+        """
+        self.raw = raw
+        self._cache = None
+        self._dict = None
+
+    def lookup(self, path):
+        """
+        Returns the raw value found at path, or None
+
+        """
+        node = self.raw
+        for key in path:
+            if node is None:
+                return None
+            node = node.get(key) if isinstance(node, dict) else getattr(node, key, None)
+        return node
+
+    def _data(self):
+        if self._dict is None:
+            self._dict = underscore_keys(self.raw if self.raw is not None else {})
+        return self._dict
+
+    def to_dict(self):
+        """
+        Returns the response as a dictionary with underscored keys.
+
+        The dictionary is a copy, so that changing it does not change the response.
+
+        """
+        return copy.deepcopy(self._data())
+
+    def __getitem__(self, key):
+        return self._data()[key]
+
+    def __iter__(self):
+        return iter(self._data())
+
+    def __len__(self):
+        return len(self._data())
+
+    def __reduce__(self):
+        """
+        Pickles the raw payload (nested suds objects are reduced to dictionaries of their raw values)
+
+        """
+        return self.__class__, (plain_data(self.raw),)
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, repr(self._data()))
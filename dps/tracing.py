@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import threading
+
+from .utils import clock
+
+__all__ = ["Span", "Tracer", "NoopTracer", "NOOP_TRACER", "InMemoryExporter", "OpenTelemetryTracer"]
+
+
+class NoopSpan(object):
+    """
+    Span that records nothing, shared by all calls of a NoopTracer.
+
+    """
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class NoopTracer(object):
+    """
+    Default tracer of clients, which records nothing.
+
+    """
+    def span(self, name, **attributes):
+        return NOOP_SPAN
+
+
+NOOP_TRACER = NoopTracer()
+
+
+class Span(object):
+    """
+    Span recorded by a Tracer, used as a context manager around the traced operation.
+
+    error is the exception raised within the span, if any. Durations are in seconds.
+
+    """
+    __slots__ = ('tracer', 'name', 'attributes', 'parent', 'start', 'end', 'error')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.start = None
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end is not None else None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        stack = self.tracer.stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = self.tracer.clock()
+        self.error = exc_value
+        self.tracer.stack().pop()
+        self.tracer.exporter.export(self)
+
+    def __repr__(self):
+        return '<Span {} {}>'.format(self.name, self.attributes)
+
+
+class Tracer(object):
+    """
+    Tracer recording spans and passing them to an exporter as they end.
+
+    Exporters are objects with an export(span) method. Spans are nested per thread: a span started within another
+    span has it as parent.
+
+    """
+    def __init__(self, exporter, clock=clock):
+        self.exporter = exporter
+        self.clock = clock
+        self.local = threading.local()
+
+    def stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def span(self, name, **attributes):
+        """
+        Returns a new span, started when entered
+
+        """
+        return Span(self, name, attributes)
+
+
+class InMemoryExporter(object):
+    """
+    Exporter keeping ended spans in a list (e.g. for tests).
+
+    """
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def clear(self):
+        del self.spans[:]
+
+
+class _OpenTelemetrySpan(object):
+    """
+    Context manager adapting an OpenTelemetry span, which does not accept None attribute values.
+
+    """
+    __slots__ = ('context', 'span')
+
+    def __init__(self, context):
+        self.context = context
+        self.span = None
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.span.set_attribute(key, value)
+
+    def __enter__(self):
+        self.span = self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.context.__exit__(exc_type, exc_value, traceback)
+
+
+class OpenTelemetryTracer(object):
+    """
+    Tracer creating OpenTelemetry spans, which are nested within the application's current span.
+
+    Requires the opentelemetry-api package.
+
+    """
+    def __init__(self, tracer=None):
+        """
+        Creates an OpenTelemetry tracer adapter.
+
+        Args:
+          tracer: OpenTelemetry tracer (defaults to the tracer named "dps" from the global tracer provider).
+        """
+        if tracer is None:
+            # imported here rather than with the module, so that importing the clients does not pay for it
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                raise ImportError("opentelemetry-api is not installed")
+            tracer = trace.get_tracer('dps')
+        self.tracer = tracer
+
+    def span(self, name, **attributes):
+        attributes = {key: value for key, value in attributes.items() if value is not None}
+        return _OpenTelemetrySpan(self.tracer.start_as_current_span(name, attributes=attributes))
@@ -4,3 +4,4 @@ from .base import *
 from .fields import *
 from .constants import *
 from .decorators import *
+from .encoding import *
@@ -3,18 +3,41 @@
 from __future__ import unicode_literals
 
 import six
+import weakref
+from collections import namedtuple
+
+from ..inflect import camelize
+from ..xmlbackend import get_backend
 from .fields import BaseField
 
-__all__ = ["BaseTransaction"]
+__all__ = ["BaseTransaction", "FrozenTransaction", "ValidationResult", "RowError"]
+
+
+def transaction_class_key(transaction_class):
+    """
+    Returns the name identifying a transaction class in packed transactions: its module and qualified name (or name, on
+    python 2), e.g. "dps.pxpost.transactions.PxPostCardTransaction".
+
+    """
+    return '{}.{}'.format(transaction_class.__module__,
+                          getattr(transaction_class, '__qualname__', transaction_class.__name__))
 
 
 class MetaTransaction(type):
 
+    # transaction classes keyed by transaction_class_key, used to restore packed transactions. Classes are weakly
+    # referenced, so that classes created at runtime (e.g. in functions) can be garbage collected.
+    registry = weakref.WeakValueDictionary()
+
     def __new__(cls, name, bases, attrs):
 
         class Meta(object):
             _fields = {}
             _required = set()
+            _order = ()
+            _tags = {}
+            _soap_tags = {}
+            _positions = {}
 
         # merge fields from bases
         for fields in (base._meta._fields for base in bases if hasattr(base, '_meta')):
@@ -30,9 +53,74 @@ class MetaTransaction(type):
         # merge required fields from list defined in class' Meta.required
         Meta._required.update(attrs["Meta"].required if 'Meta' in attrs and hasattr(attrs['Meta'], 'required') else [])
 
+        # precompute serialization order and wire names
+        Meta._order = tuple(sorted(Meta._fields))
+        Meta._tags = {k: camelize(k) for k in Meta._order}
+        Meta._soap_tags = {k: camelize(k, False) for k in Meta._order}
+        Meta._positions = {k: i for i, k in enumerate(Meta._order)}
+
         attrs['_meta'] = Meta
 
-        return type.__new__(cls, name, bases, attrs)
+        new_class = type.__new__(cls, name, bases, attrs)
+        MetaTransaction.registry[transaction_class_key(new_class)] = new_class
+        return new_class
+
+
+def restore_transaction(transaction_class, values):
+    """
+    Unpickles a transaction without validating its values again.
+
+    """
+    return transaction_class.from_values(values)
+
+
+class ValidationResult(object):
+    """
+    Outcome of checking a transaction or a set of field values, without raising.
+
+    Attributes:
+      errors (dict): error messages keyed by field name (empty when valid).
+      transaction: the checked transaction, or the transaction built from valid values.
+
+    """
+    __slots__ = ('errors', 'transaction')
+
+    def __init__(self, errors, transaction=None):
+        self.errors = errors
+        self.transaction = transaction
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def __bool__(self):
+        return not self.errors
+
+    __nonzero__ = __bool__
+
+    def raise_for_errors(self):
+        """
+        Raises a ValueError listing all errors, if any
+
+        """
+        if self.errors:
+            raise ValueError("Invalid transaction: {}".format("; ".join(
+                "{}: {}".format(name, error) for name, error in sorted(self.errors.items()))))
+
+
+# Error record yielded by BaseTransaction.from_rows for rows that do not make a valid transaction
+RowError = namedtuple('RowError', ['index', 'row', 'errors'])
+
+
+def serialize_xml(meta, items, root_tag, extra):
+    """
+    Serializes (name, value) pairs of a transaction into an XML document (as utf-8 encoded bytes).
+
+    """
+    tags = meta._tags
+    elements = [(tags[name], value) for name, value in items]
+    elements.extend(((tags.get(key) or camelize(key)), value) for key, value in extra.items())
+    return get_backend().build(root_tag, elements).encode('utf-8')
 
 
 class BaseTransaction(six.with_metaclass(MetaTransaction)):
@@ -54,29 +142,294 @@ class BaseTransaction(six.with_metaclass(MetaTransaction)):
                 raise ValueError("{0} field does not exist".format(key))
             setattr(self, key, val)
 
+    def check(self):
+        """
+        Checks that all required fields are present and returns a ValidationResult
+
+        """
+        errors = {name: "missing required field" for name in self._meta._required if getattr(self, name) is None}
+        return ValidationResult(errors, self)
+
+    @classmethod
+    def check_values(cls, values):
+        """
+        Checks a mapping of field values and returns a ValidationResult listing all errors.
+
+        When values are valid, the result holds a transaction built from them without validating them again.
+
+        """
+        fields = cls._meta._fields
+        errors = {}
+        cleaned = {}
+        for name, value in values.items():
+            field = fields.get(name)
+            if field is None:
+                errors[name] = "field does not exist"
+                continue
+            value = field.clean(value)
+            error = field.check(value)
+            if error is not None:
+                errors[name] = error
+            else:
+                cleaned[name] = value
+        for name in cls._meta._required:
+            if name in errors:
+                continue
+            if (cleaned[name] if name in cleaned else fields[name].default) is None:
+                errors[name] = "missing required field"
+        if errors:
+            return ValidationResult(errors)
+        transaction = cls.__new__(cls)
+        for name, value in cleaned.items():
+            fields[name].data[transaction] = value
+        return ValidationResult(errors, transaction)
+
     def validate(self):
         """
         Checks that all required fields are present
 
         """
-        if not all(getattr(self, name) is not None for name in self._meta._required):
-            missing = filter(lambda name: getattr(self, name) is None, self._meta._required)
-            raise ValueError("Transaction is missing required fields: {}".format(", ".join(missing)))
+        self.check().raise_for_errors()
 
     def is_valid(self):
         """
         Checks that a transaction is valid
 
         """
+        return self.check().valid
+
+    def to_xml(self, root_tag, **extra):
+        """
+        Serializes the transaction into an XML document (as utf-8 encoded bytes) for DPS XML endpoints such as PxPost.
+
+        Extra keyword arguments (e.g. txn_type or credentials) are appended as camelized elements.
+
+        """
+        return serialize_xml(self._meta, self, root_tag, extra)
+
+    def to_soap_fields(self):
+        """
+        Returns a list of (name, value) pairs keyed by the lowerCamelCase names used in SOAP envelopes (PxFusion)
+
+        """
+        tags = self._meta._soap_tags
+        return [(tags[name], value) for name, value in self]
+
+    def _values(self):
+        """
+        Returns the values stored in the transaction's fields, ordered as in _meta._order (None for unset fields)
+
+        """
+        fields = self._meta._fields
+        return tuple(fields[name].data.get(self) for name in self._meta._order)
+
+    def freeze(self):
+        """
+        Validates the transaction and returns an immutable, hashable copy of it
+
+        """
+        self.validate()
+        return FrozenTransaction(self.__class__, self._values())
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Restores a transaction from values ordered as in _meta._order, without validating them again
+
+        Values are stored values (None for unset fields) from a transaction of the same class (e.g.
+        FrozenTransaction.values).
+
+        """
+        transaction = cls.__new__(cls)
+        fields = cls._meta._fields
+        for name, value in zip(cls._meta._order, values):
+            if value is not None:
+                fields[name].data[transaction] = value
+        return transaction
+
+    @classmethod
+    def from_rows(cls, rows, rename=None, ignore_unknown=False, skip_blank=True):
+        """
+        Generator that streams an iterable of mappings (e.g. csv.DictReader rows) into validated transactions.
+
+        Rows that do not make a valid transaction yield a RowError record instead of raising, so that one bad row does
+        not stop the stream. Rows are consumed one at a time and never held in memory. Text values are parsed by their
+        field (see BaseField.parse), so that CSV columns of integer and boolean fields are accepted.
+
+        Args:
+          rows (iterable): mappings of column names to values.
+          rename (dict): optional mapping of column names to field names.
+          ignore_unknown (bool): drop columns that are not fields instead of reporting an error.
+          skip_blank (bool): treat empty strings as missing values (as exported by CSV writers).
+
+        """
+        rename = rename or {}
+        fields = cls._meta._fields
+        for index, row in enumerate(rows):
+            values = {}
+            for column, value in row.items():
+                name = rename.get(column, column)
+                if name not in fields and ignore_unknown:
+                    continue
+                if skip_blank and value == '':
+                    continue
+                if name in fields and isinstance(value, six.string_types):
+                    value = fields[name].parse(value)
+                values[name] = value
+            result = cls.check_values(values)
+            if result:
+                yield result.transaction
+            else:
+                yield RowError(index, row, result.errors)
+
+    def __reduce__(self):
+        """
+        Pickles the transaction's values positionally
+
+        """
+        return restore_transaction, (self.__class__, self._values())
+
+    def __iter__(self):
+        """
+        Iterator over fields that are not None
+
+        """
+        values = ((key, getattr(self, key)) for key in self._meta._order)
+        return ((key, value) for key, value in values if value is not None)
+
+
+class FrozenTransaction(object):
+    """
+    Immutable snapshot of a validated transaction.
+
+    Frozen transactions hold the values stored in the transaction's fields, so that thawing them restores the original
+    transaction, and read them through the fields like transactions do. They are hashable and compare by class and
+    stored values, which makes them suitable for retry queues and dedupe checks. Serialized XML payloads are cached so
+    that retries do not serialize the transaction again.
+
+    """
+    __slots__ = ('transaction_class', 'values', '_hash', '_payloads')
+
+    def __init__(self, transaction_class, values):
+        """
+        Creates a new FrozenTransaction from a transaction class and its stored values ordered as in _meta._order.
+
+        Use BaseTransaction.freeze() rather than instantiating this class directly.
+
+        """
+        object.__setattr__(self, 'transaction_class', transaction_class)
+        object.__setattr__(self, 'values', values)
+        object.__setattr__(self, '_hash', hash((transaction_class, values)))
+        object.__setattr__(self, '_payloads', None)
+
+    @property
+    def _meta(self):
+        return self.transaction_class._meta
+
+    def check(self):
+        """
+        Frozen transactions are validated when frozen
+
+        """
+        return ValidationResult({}, self)
+
+    def validate(self):
+        """
+        Frozen transactions are validated when frozen
+
+        """
+
+    def is_valid(self):
+        """
+        Frozen transactions are always valid
+
+        """
+        return True
+
+    def freeze(self):
+        """
+        Returns self
+
+        """
+        return self
+
+    def thaw(self):
+        """
+        Returns a mutable transaction with the same values
+
+        """
+        return self.transaction_class.from_values(self.values)
+
+    def to_xml(self, root_tag, **extra):
+        """
+        Same as BaseTransaction.to_xml, but payloads are cached per root_tag and extra arguments
+
+        """
+        key = (root_tag, tuple(sorted(extra.items())))
+        if self._payloads is None:
+            object.__setattr__(self, '_payloads', {})
+        try:
+            return self._payloads[key]
+        except KeyError:
+            payload = self._payloads[key] = serialize_xml(self._meta, self, root_tag, extra)
+            return payload
+
+    def to_soap_fields(self):
+        """
+        Same as BaseTransaction.to_soap_fields
+
+        """
+        tags = self._meta._soap_tags
+        return [(tags[name], value) for name, value in self]
+
+    def _get(self, name, value):
+        field = self._meta._fields[name]
+        return field.to_python(field.default if value is None else value)
+
+    def __getattr__(self, name):
+        if name in FrozenTransaction.__slots__:
+            raise AttributeError(name)
         try:
-            self.validate()
-            return True
-        except ValueError:
-            return False
+            position = self.transaction_class._meta._positions[name]
+        except KeyError:
+            raise AttributeError(name)
+        return self._get(name, self.values[position])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is frozen".format(self.transaction_class.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is frozen".format(self.transaction_class.__name__))
 
     def __iter__(self):
         """
         Iterator over fields that are not None
 
         """
-        return ((key, getattr(self, key)) for key in self._meta._fields.keys() if getattr(self, key) is not None)
+        values = ((key, self._get(key, value)) for key, value in zip(self._meta._order, self.values))
+        return ((key, value) for key, value in values if value is not None)
+
+    def __reduce__(self):
+        """
+        Pickles the transaction's values positionally (cached payloads are not pickled)
+
+        """
+        return FrozenTransaction, (self.transaction_class, self.values)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenTransaction):
+            return NotImplemented
+        return self.transaction_class is other.transaction_class and self.values == other.values
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return self._hash
@@ -4,24 +4,81 @@ from __future__ import unicode_literals
 
 import functools
 
+from ..tracing import NOOP_TRACER
+
+
+# Upper bound of the memo table of each index, cleared when reached
+INDEX_CACHE_SIZE = 256
+
+
+class TransactionIndex(object):
+    """
+    Maps sets of provided field names to the transaction class they describe.
+
+    Candidates are ordered by specificity (most required fields first) so that, when several classes accept the same
+    keys, the one with the most constraints wins. Lookups are memoized per set of keys, in a table of at most
+    INDEX_CACHE_SIZE entries so that arbitrary caller-supplied keys cannot grow it forever.
+
+    """
+    def __init__(self, types):
+        self.types = types
+        self.candidates = sorted(((frozenset(cls._meta._required), frozenset(cls._meta._fields), cls) for cls in types),
+                                 key=lambda candidate: -len(candidate[0]))
+        self.cache = {}
+
+    def lookup(self, keys):
+        """
+        Returns the transaction class matching keys or None
+
+        """
+        keys = frozenset(keys)
+        try:
+            return self.cache[keys]
+        except KeyError:
+            pass
+        match = None
+        for required, fields, cls in self.candidates:
+            if required <= keys <= fields:
+                match = cls
+                break
+        if len(self.cache) >= INDEX_CACHE_SIZE:
+            self.cache.clear()
+        self.cache[keys] = match
+        return match
+
 
 def accept_txn(*types):
     """
     Checks first argument against a list of valid types. Use kwargs otherwise.
 
+    The decorated function is called with the validated transaction object. Validation is traced with the tracer of
+    the decorated method's instance, if any.
+
     """
     def decorator(f):
-        @functools.wraps(f)
-        def wrapper(self, transaction=None, **kwargs):
+        index = TransactionIndex(types)
+
+        def validate(transaction, kwargs):
             if transaction:
-                if isinstance(transaction, types):
-                    transaction.validate()
-                    return f(self, **dict(transaction))
+                if issubclass(getattr(transaction, 'transaction_class', transaction.__class__), types):
+                    result = transaction.check()
+                    result.raise_for_errors()
+                    return result.transaction
                 raise ValueError("Invalid transaction type. (got: {}, expects: {})".format(transaction.__class__.__name__, ", ".join((cls.__name__ for cls in types))))
             elif kwargs:
-                if any(txn_class(**kwargs).is_valid() for txn_class in types):
-                    return f(self, **kwargs)
+                txn_class = index.lookup(k for k, v in kwargs.items() if v is not None)
+                if txn_class is not None:
+                    result = txn_class.check_values(kwargs)
+                    result.raise_for_errors()
+                    return result.transaction
                 raise ValueError("Invalid kwargs for transaction types: {}".format(", ".join((cls.__name__ for cls in types))))
             raise ValueError("Expects either a transaction or kwargs")
+
+        @functools.wraps(f)
+        def wrapper(self, transaction=None, **kwargs):
+            with getattr(self, 'tracer', NOOP_TRACER).span('dps.validate'):
+                transaction = validate(transaction, kwargs)
+            return f(self, transaction)
+        wrapper.index = index
         return wrapper
     return decorator
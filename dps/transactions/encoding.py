@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import six
+import struct
+import decimal
+
+from .base import MetaTransaction, FrozenTransaction, transaction_class_key
+
+__all__ = ["pack_transaction", "unpack_transaction", "pack_transactions", "unpack_transactions"]
+
+
+# Value tags
+NONE = 0
+TEXT = 1
+INTEGER = 2
+DECIMAL = 3
+BOOLEAN = 4
+
+# Range of packed integers (signed 64 bits)
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def _pack_text(value):
+    data = value.encode('utf-8')
+    return struct.pack('>I', len(data)) + data
+
+
+def pack_transaction(transaction):
+    """
+    Packs a transaction (or frozen transaction) into compact bytes.
+
+    The transaction class is identified by name and stored values are packed positionally, in the class' field order.
+
+    """
+    transaction_class = getattr(transaction, 'transaction_class', transaction.__class__)
+    name = transaction_class_key(transaction_class).encode('utf-8')
+    order = transaction_class._meta._order
+    values = transaction.values if isinstance(transaction, FrozenTransaction) else transaction._values()
+    parts = [struct.pack('>H', len(name)), name, struct.pack('>H', len(order))]
+    for field, value in zip(order, values):
+        if value is None:
+            parts.append(struct.pack('>B', NONE))
+        elif isinstance(value, bool):
+            parts.append(struct.pack('>B?', BOOLEAN, value))
+        elif isinstance(value, six.string_types):
+            parts.append(struct.pack('>B', TEXT) + _pack_text(value))
+        elif isinstance(value, decimal.Decimal):
+            parts.append(struct.pack('>B', DECIMAL) + _pack_text(six.text_type(value)))
+        elif isinstance(value, six.integer_types):
+            if not MIN_INTEGER <= value <= MAX_INTEGER:
+                raise ValueError("Cannot pack {} value {} (out of 64 bit range)".format(field, value))
+            parts.append(struct.pack('>Bq', INTEGER, value))
+        else:
+            raise ValueError("Cannot pack {} value {}".format(field, repr(value)))
+    return b''.join(parts)
+
+
+def _unpack(data, offset, frozen):
+    (length,) = struct.unpack_from('>H', data, offset)
+    offset += 2
+    name = bytes(data[offset:offset + length]).decode('utf-8')
+    offset += length
+    try:
+        transaction_class = MetaTransaction.registry[name]
+    except KeyError:
+        raise ValueError("Unknown transaction class {}".format(name))
+    (count,) = struct.unpack_from('>H', data, offset)
+    offset += 2
+    if count != len(transaction_class._meta._order):
+        raise ValueError("{} expects {} values (got: {})".format(name, len(transaction_class._meta._order), count))
+    values = []
+    for _ in range(count):
+        (tag,) = struct.unpack_from('>B', data, offset)
+        offset += 1
+        if tag == NONE:
+            values.append(None)
+        elif tag == INTEGER:
+            values.append(struct.unpack_from('>q', data, offset)[0])
+            offset += 8
+        elif tag == BOOLEAN:
+            values.append(struct.unpack_from('>?', data, offset)[0])
+            offset += 1
+        elif tag in (TEXT, DECIMAL):
+            (length,) = struct.unpack_from('>I', data, offset)
+            offset += 4
+            text = bytes(data[offset:offset + length]).decode('utf-8')
+            offset += length
+            values.append(decimal.Decimal(text) if tag == DECIMAL else text)
+        else:
+            raise ValueError("Unknown value tag {}".format(tag))
+    values = tuple(values)
+    if frozen:
+        return FrozenTransaction(transaction_class, values), offset
+    return transaction_class.from_values(values), offset
+
+
+def unpack_transaction(data, frozen=False):
+    """
+    Restores a transaction packed with pack_transaction, without validating its values again.
+
+    Args:
+      data (bytes): packed transaction.
+      frozen (bool): return a FrozenTransaction instead of a mutable transaction.
+
+    """
+    return _unpack(data, 0, frozen)[0]
+
+
+def pack_transactions(transactions):
+    """
+    Packs an iterable of transactions into a single bytes payload (e.g. to send a batch to a worker process).
+
+    """
+    parts = [pack_transaction(transaction) for transaction in transactions]
+    return struct.pack('>I', len(parts)) + b''.join(parts)
+
+
+def unpack_transactions(data, frozen=False):
+    """
+    Generator that restores transactions packed with pack_transactions.
+
+    """
+    (count,) = struct.unpack_from('>I', data, 0)
+    offset = 4
+    for _ in range(count):
+        transaction, offset = _unpack(data, offset, frozen)
+        yield transaction
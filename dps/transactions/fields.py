@@ -24,28 +24,63 @@ class BaseField(object):
             self.validate(default)
         self.default = default
 
+    def clean(self, value):
+        """
+        Converts value to the type stored by the field.
+
+        """
+        return value
+
+    def parse(self, text):
+        """
+        Converts text (e.g. a CSV column) to a value accepted by the field.
+
+        Text that cannot be converted is returned as is, and reported by check.
+
+        """
+        return text
+
+    def check(self, value):
+        """
+        Default field checker.
+
+        Returns an error message if the field's value is not valid for the field type, None otherwise.
+
+        """
+        if isinstance(self.choices, (list, tuple)) and value not in self.choices and value is not None:
+            return "{} not a choice in {}".format(value, self.choices)
+
     def validate(self, value):
         """
         Default field validator.
 
-        Checks whether the field's value is valid for the field type
+        Raises a ValueError if the field's value is not valid for the field type
 
         """
-        if isinstance(self.choices, (list, tuple)) and value not in self.choices and value is not None:
-            raise ValueError("{} not a choice in {}".format(value, self.choices))
+        error = self.check(value)
+        if error is not None:
+            raise ValueError(error)
+
+    def to_python(self, value):
+        """
+        Converts a stored value to the value returned by the field.
+
+        """
+        return value
 
     def __get__(self, instance, owner):
         """
         Field descriptor __get__ method.
 
         """
-        return self.data.get(instance, self.default)
+        return self.to_python(self.data.get(instance, self.default))
 
     def __set__(self, instance, value):
         """
         Field descriptor __set__ method.
 
         """
+        value = self.clean(value)
         self.validate(value)
         self.data[instance] = value
 
@@ -72,24 +107,24 @@ class StringField(BaseField):
         self.pattern = pattern
         super(StringField, self).__init__(**kwargs)
 
-    def validate(self, value):
+    def check(self, value):
         """
-        String field validator.
+        String field checker.
 
         """
-        super(StringField, self).validate(value)
+        error = super(StringField, self).check(value)
 
-        if value is None:
-            return
+        if error is not None or value is None:
+            return error
 
         if not isinstance(value, six.string_types):
-            raise ValueError('{} is not a string'.format(repr(value)))
+            return '{} is not a string'.format(repr(value))
 
         if self.max_length and len(value) > self.max_length:
-            raise ValueError("{} is too long (max length is {})".format(value, self.max_length))
+            return "{} is too long (max length is {})".format(value, self.max_length)
 
         if self.pattern and not re.match(self.pattern, value):
-            raise ValueError("{} does not match pattern {}".format(value, self.pattern))
+            return "{} does not match pattern {}".format(value, self.pattern)
 
 
 class BooleanField(BaseField):
@@ -98,27 +133,43 @@ class BooleanField(BaseField):
 
     """
 
-    def validate(self, value):
+    # Text values parsed as True and False (case insensitive)
+    TRUE_VALUES = ('1', 'true', 'yes', 'y')
+    FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+    def parse(self, text):
         """
-        Boolean field validator.
+        Parses 1/0, true/false, yes/no and y/n
 
         """
-        super(BooleanField, self).validate(value)
+        value = text.strip().lower()
+        if value in self.TRUE_VALUES:
+            return True
+        if value in self.FALSE_VALUES:
+            return False
+        return text
 
-        if value is None:
-            return
+    def check(self, value):
+        """
+        Boolean field checker.
+
+        """
+        error = super(BooleanField, self).check(value)
+
+        if error is not None or value is None:
+            return error
 
         if not isinstance(value, bool):
-            raise ValueError('{} is not a boolean'.format(repr(value)))
+            return '{} is not a boolean'.format(repr(value))
 
-    def __get__(self, instance, owner):
+    def to_python(self, value):
         """
-        __get__ returns 0 or 1
+        Returns 0 or 1
 
         """
 
         try:
-            return int(super(BooleanField, self).__get__(instance, owner))
+            return int(value)
         except:
             return None
 
@@ -129,18 +180,28 @@ class IntegerField(BaseField):
 
     """
 
-    def validate(self, value):
+    def parse(self, text):
         """
-        Integer field validator.
+        Parses base 10 integers
 
         """
-        super(IntegerField, self).validate(value)
+        try:
+            return int(text)
+        except ValueError:
+            return text
 
-        if value is None:
-            return
+    def check(self, value):
+        """
+        Integer field checker.
+
+        """
+        error = super(IntegerField, self).check(value)
+
+        if error is not None or value is None:
+            return error
 
         if not isinstance(value, int):
-            raise ValueError('{} is not an integer'.format(repr(value)))
+            return '{} is not an integer'.format(repr(value))
 
 
 class AmountField(BaseField):
@@ -160,35 +221,34 @@ class AmountField(BaseField):
         self.decimal_context = decimal_context or decimal.Context()
         super(AmountField, self).__init__(**kwargs)
 
-    def validate(self, value):
+    def check(self, value):
         """
-        Amount field validator.
+        Amount field checker.
 
         """
-        super(AmountField, self).validate(value)
+        error = super(AmountField, self).check(value)
 
-        if value is None:
-            return
+        if error is not None or value is None:
+            return error
 
         if not isinstance(value, decimal.Decimal):
-            raise ValueError('{} is not a decimal'.format(repr(value)))
+            return '{} is not a decimal'.format(repr(value))
 
-    def __get__(self, instance, owner):
+    def to_python(self, value):
         """
-        __get__ returns a Decimal quantized to 2 decimal places
+        Returns a Decimal quantized to 2 decimal places
         """
         try:
-            return super(AmountField, self).__get__(instance, owner).quantize(self.TWOPLACES, context=self.decimal_context)
+            return value.quantize(self.TWOPLACES, context=self.decimal_context)
         except:
             return None
 
-    def __set__(self, instance, value):
+    def clean(self, value):
         """
-        __set__ ensures that the internal value is stored as a Decimal
+        clean ensures that the internal value is stored as a Decimal
 
         """
         try:
-            value = decimal.Decimal(str(value))  # Convert to str first to accommodate py26
+            return decimal.Decimal(str(value))  # Convert to str first to accommodate py26
         except:
-            pass
-        super(AmountField, self).__set__(instance, value)
+            return value
@@ -2,23 +2,97 @@
 
 from __future__ import unicode_literals
 
-from .vendors.inflection import underscore
+import os
+import six
+import time
 
+from .inflect import underscore
+
+
+# Monotonic clock when available (python 3.3+)
+clock = getattr(time, 'monotonic', time.time)
+
+
+# Memoized underscored keys (DPS responses only use a small, fixed set of element names)
+_underscored = {}
+
+# Upper bound of the memo table, cleared when reached
+UNDERSCORED_CACHE_SIZE = 2048
+
+
+def underscore_key(key):
+    """
+    Memoized version of underscore for dictionary keys.
 
-def underscore_keys(dictionary):
+    """
+    try:
+        return _underscored[key]
+    except KeyError:
+        if len(_underscored) >= UNDERSCORED_CACHE_SIZE:
+            _underscored.clear()
+        result = _underscored[key] = underscore(key) if isinstance(key, six.string_types) else key
+        return result
+
+
+def _is_suds_object(value):
+    return hasattr(value, '__keylist__')
+
+
+def underscore_keys(data, inplace=False):
     """
     Convert all keys in dictionary to their underscored form.
 
+    Nested dictionaries, lists and suds objects are converted in a single, non-recursive walk. Suds objects are always
+    converted into dictionaries. When inplace is True, dictionaries and lists are updated instead of being copied.
+
     Example:
       {'TestKeyA': 123, 'TestKeyB': 456} is transformed into {'test_key_a': 123, 'test_key_b': 456}
     """
-    result = {}
-    for k, v in dictionary.items():
-        if isinstance(v, dict):
-            result[underscore(k)] = underscore_keys(v)
+    root = [data]
+    stack = [(root, 0)]
+    while stack:
+        container, index = stack.pop()
+        value = container[index]
+        if isinstance(value, dict) or _is_suds_object(value):
+            if _is_suds_object(value):
+                items = [(k, getattr(value, k)) for k in value.__keylist__]
+                result = {}
+            elif inplace:
+                items = list(value.items())
+                value.clear()
+                result = value
+            else:
+                items = value.items()
+                result = {}
+            for k, v in items:
+                k = underscore_key(k)
+                result[k] = v
+                if isinstance(v, (dict, list)) or _is_suds_object(v):
+                    stack.append((result, k))
+        elif isinstance(value, list):
+            result = value if inplace else list(value)
+            for i, v in enumerate(result):
+                if isinstance(v, (dict, list)) or _is_suds_object(v):
+                    stack.append((result, i))
         else:
-            result[underscore(k)] = v
-    return result
+            continue
+        container[index] = result
+    return root[0]
+
+
+def plain_data(data):
+    """
+    Returns data with nested suds objects converted into dictionaries (keys are kept as is), e.g. so that it can be
+    pickled. Dictionaries and lists are copied.
+
+    """
+    if _is_suds_object(data):
+        return dict((k, plain_data(getattr(data, k))) for k in data.__keylist__)
+    if isinstance(data, dict):
+        return dict((k, plain_data(v)) for k, v in data.items())
+    if isinstance(data, list):
+        return [plain_data(v) for v in data]
+    return data
 
 
 def underscore_keys_postproc(_, key, value):
@@ -26,9 +100,39 @@ def underscore_keys_postproc(_, key, value):
     Convert a key/value pair into a tuple with the key in underscored form.
 
     Note:
-      If value is a dictionary, its keys will also be converted into underscored form.
+      If value is a dictionary or a list, its keys will also be converted into underscored form.
     """
-    if not isinstance(value, dict):
-        return underscore(key), value
+    if not isinstance(value, (dict, list)):
+        return underscore_key(key), value
     else:
-        return underscore(key), underscore_keys(value)
+        return underscore_key(key), underscore_keys(value, inplace=True)
+
+
+def fsync_directory(path):
+    """
+    Flushes the directory containing path to disk, so that a file created or renamed in it survives a crash (POSIX
+    only, a no-op elsewhere).
+
+    """
+    if os.name != 'posix':  # pragma no cover
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def dispatch_hook(hooks, event, *args):
+    """
+    Calls the hooks registered for event with args.
+
+    Hooks are given as a dictionary of event names to a callable or a list of callables (as in requests).
+    """
+    if not hooks or event not in hooks:
+        return
+    callbacks = hooks[event]
+    if callable(callbacks):
+        callbacks = [callbacks]
+    for callback in callbacks:
+        callback(*args)
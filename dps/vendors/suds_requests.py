@@ -41,12 +41,9 @@ import suds.transport as transport
 import traceback
 
 try:
-    import cStringIO as StringIO
+    from cStringIO import StringIO as BytesIO
 except ImportError:
-    try:
-        import StringIO
-    except ImportError:
-        from io import StringIO
+    from io import BytesIO
 
 
 __all__ = ['RequestsTransport']
@@ -78,7 +75,7 @@ class RequestsTransport(transport.Transport):
     @handle_errors
     def open(self, request):
         resp = self._session.get(request.url)
-        return StringIO.StringIO(resp.content)
+        return BytesIO(resp.content)
 
     @handle_errors
     def send(self, request):
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import pickle
+import signal
+import threading
+import multiprocessing
+from collections import deque, namedtuple
+
+from six.moves import queue
+
+from .utils import clock, plain_data
+from .responses import BaseResponse
+from .transactions import pack_transaction, unpack_transaction
+
+__all__ = ["WorkerPool", "WorkerResult"]
+
+
+# Result of a job processed by a worker. error is None on success, "ExceptionName: message" otherwise.
+WorkerResult = namedtuple('WorkerResult', ['job_id', 'response', 'error'])
+
+
+def _result(job_id, response, error):
+    """
+    Returns a pickled WorkerResult.
+
+    Results are pickled by the worker so that a response that cannot be pickled is reported as an error, rather than
+    being dropped by the queue. Responses are converted to plain data first (suds objects become dictionaries).
+
+    """
+    if isinstance(response, BaseResponse):
+        response = response.__class__(plain_data(response.raw))
+    else:
+        response = plain_data(response)
+    try:
+        return pickle.dumps(WorkerResult(job_id, response, error), pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return pickle.dumps(WorkerResult(job_id, None, '{}: {}'.format(e.__class__.__name__, e)),
+                            pickle.HIGHEST_PROTOCOL)
+
+
+def _consume(client, tasks, results, error=None):
+    """
+    Processes tasks with client until a sentinel (None) is received. When the client could not be created, every task
+    fails with error.
+
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job_id, method, payload, kwargs = task
+        if error is not None:
+            results.put(_result(job_id, None, error))
+            continue
+        try:
+            if payload is not None:
+                response = getattr(client, method)(unpack_transaction(payload, frozen=True), **kwargs)
+            else:
+                response = getattr(client, method)(**kwargs)
+            results.put(_result(job_id, response, None))
+        except Exception as e:
+            results.put(_result(job_id, None, '{}: {}'.format(e.__class__.__name__, e)))
+
+
+def _worker_main(client_factory, tasks, results, concurrency):
+    """
+    Entry point of worker processes.
+
+    The client is created in the worker process, so that connection pools are never shared across processes. Each
+    worker runs concurrency threads sharing its client.
+
+    """
+    # the parent process handles interrupts and drains workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        client = client_factory()
+    except Exception as e:
+        return _consume(None, tasks, results, '{}: {}'.format(e.__class__.__name__, e))
+    threads = [threading.Thread(target=_consume, args=(client, tasks, results)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class WorkerPool(object):
+    """
+    Pool of worker processes sending transactions to DPS.
+
+    Each worker process creates its own client (and connection pool) with client_factory and processes up to
+    concurrency jobs at a time. Transactions are sent to workers in their packed binary form, each job going to the
+    worker with the fewest jobs assigned.
+
+    Jobs assigned to a worker that dies (e.g. killed by the OOM killer) fail with a WorkerLost error instead of being
+    waited for forever.
+
+    Example:
+      pool = WorkerPool(functools.partial(PxPostClient, "username", "password"), processes=4, concurrency=8)
+      for result in pool.map('purchase', transactions):
+          ...
+      pool.close()
+
+    """
+    # Interval (in seconds) at which workers are checked while waiting for results
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, client_factory, processes=None, concurrency=1, queue_size=None):
+        """
+        Creates and starts a pool of workers.
+
+        Args:
+          client_factory (callable): returns a client (e.g. PxPostClient or PxFusionClient). Must be picklable on
+            platforms that do not fork.
+          processes (int): number of worker processes (defaults to the number of CPUs).
+          concurrency (int): number of jobs processed at a time by each worker.
+          queue_size (int): maximum number of pending jobs (defaults to twice the total concurrency). submit waits for
+            results while the queue is full.
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.concurrency = concurrency
+        self.worker_queue_size = max(1, (queue_size or 2 * self.processes * self.concurrency) // self.processes)
+        self.results = multiprocessing.Queue()
+        self.ready = deque()
+        self.pending = 0
+        self.next_job_id = 0
+        self.closed = False
+        # jobs assigned to each worker (by index), and the worker of each job
+        self.assigned = [set() for _ in range(self.processes)]
+        self.owners = {}
+        self.queues = [multiprocessing.Queue() for _ in range(self.processes)]
+        self.workers = [multiprocessing.Process(target=_worker_main,
+                                                args=(client_factory, tasks, self.results, concurrency))
+                        for tasks in self.queues]
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+
+    def _live_workers(self):
+        return [index for index, worker in enumerate(self.workers) if worker.is_alive()]
+
+    def _receive(self, timeout):
+        """
+        Moves a result from the results queue to ready results, waiting up to timeout. Returns False on timeout.
+
+        """
+        try:
+            result = pickle.loads(self.results.get(timeout=timeout))
+        except queue.Empty:
+            return False
+        index = self.owners.pop(result.job_id, None)
+        # results of jobs already failed with their worker are dropped
+        if index is not None:
+            self.assigned[index].discard(result.job_id)
+            self.ready.append(result)
+        return True
+
+    def check_workers(self):
+        """
+        Fails the jobs assigned to workers that died.
+
+        """
+        for index, worker in enumerate(self.workers):
+            if not self.assigned[index] or worker.is_alive():
+                continue
+            # collects results the worker sent before dying
+            while self.assigned[index] and self._receive(0.01):
+                pass
+            error = 'WorkerLost: worker process {} exited with code {}'.format(worker.pid, worker.exitcode)
+            for job_id in sorted(self.assigned[index]):
+                del self.owners[job_id]
+                self.ready.append(WorkerResult(job_id, None, error))
+            self.assigned[index].clear()
+
+    def submit(self, method, transaction=None, **kwargs):
+        """
+        Queues a call to a client method (e.g. 'purchase') with a transaction or kwargs, and returns its job id.
+
+        """
+        if self.closed:
+            raise ValueError("Pool is closed")
+        payload = pack_transaction(transaction) if transaction is not None else None
+        while True:
+            self.check_workers()
+            live = self._live_workers()
+            if not live:
+                raise RuntimeError("All worker processes died")
+            index = min(live, key=lambda i: len(self.assigned[i]))
+            if len(self.assigned[index]) < self.worker_queue_size + self.concurrency:
+                break
+            self._receive(self.POLL_INTERVAL)
+        job_id = self.next_job_id
+        self.next_job_id += 1
+        self.queues[index].put((job_id, method, payload, kwargs))
+        self.assigned[index].add(job_id)
+        self.owners[job_id] = index
+        self.pending += 1
+        return job_id
+
+    def get_result(self, timeout=None):
+        """
+        Returns the next available WorkerResult. Raises queue.Empty if none is available within timeout.
+
+        """
+        deadline = None if timeout is None else clock() + timeout
+        while not self.ready:
+            remaining = self.POLL_INTERVAL if deadline is None else min(self.POLL_INTERVAL, deadline - clock())
+            if not self._receive(max(remaining, 0)):
+                self.check_workers()
+                if not self.ready and deadline is not None and clock() >= deadline:
+                    raise queue.Empty
+        self.pending -= 1
+        return self.ready.popleft()
+
+    def results_ready(self):
+        """
+        Generator over results that are available without waiting.
+
+        """
+        while self.pending:
+            try:
+                yield self.get_result(timeout=0)
+            except queue.Empty:
+                return
+
+    def map(self, method, transactions):
+        """
+        Generator that submits transactions to a client method and yields WorkerResults in completion order.
+
+        Job ids are the positions of transactions in the iterable. Transactions are consumed lazily: about
+        queue_size transactions are pending at a time. Jobs queued with submit should be collected before calling map.
+
+        """
+        first_job_id = self.next_job_id
+        for transaction in transactions:
+            self.submit(method, transaction)
+            for result in self.results_ready():
+                yield result._replace(job_id=result.job_id - first_job_id)
+        while self.pending:
+            result = self.get_result()
+            yield result._replace(job_id=result.job_id - first_job_id)
+
+    def close(self, timeout=None):
+        """
+        Drains the pool: stops accepting jobs, lets workers finish pending jobs and waits for them to exit.
+
+        Returns results that were not collected yet.
+
+        """
+        if not self.closed:
+            self.closed = True
+            for tasks in self.queues:
+                for _ in range(self.concurrency):
+                    tasks.put(None)
+        results = []
+        while self.pending:
+            results.append(self.get_result(timeout=timeout))
+        for worker in self.workers:
+            worker.join(timeout)
+        return results
+
+    def terminate(self):
+        """
+        Stops workers immediately, dropping pending jobs.
+
+        """
+        self.closed = True
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
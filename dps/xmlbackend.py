@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import six
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+from .vendors.xmltodict import OrderedDict, _DictSAXHandler
+
+try:  # pragma no cover
+    from lxml import etree
+except ImportError:  # pragma no cover
+    etree = None
+
+__all__ = ["StdlibBackend", "LxmlBackend", "get_backend", "set_backend"]
+
+
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+
+class StdlibBackend(object):
+    """
+    XML backend relying on the standard library (expat, through the vendored xmltodict).
+
+    """
+    name = 'stdlib'
+
+    def build(self, root_tag, items):
+        """
+        Returns an XML document containing an element per (tag, value) pair inside root_tag.
+
+        """
+        parts = [XML_DECLARATION, '<', root_tag, '>']
+        for tag, value in items:
+            parts.extend(('<', tag, '>', escape(six.text_type(value)), '</', tag, '>'))
+        parts.extend(('</', root_tag, '>'))
+        return ''.join(parts)
+
+    def parse(self, xml):
+        """
+        Returns an XML document as a dictionary, in xmltodict's format.
+
+        Bytes (or memoryviews) are fed to expat as is, which detects the encoding from the XML declaration.
+
+        """
+        if isinstance(xml, six.text_type):
+            xml, encoding = xml.encode('utf-8'), 'utf-8'
+        else:
+            encoding = None
+            if six.PY2 and isinstance(xml, memoryview):  # pragma no cover
+                xml = xml.tobytes()
+        handler = _DictSAXHandler()
+        parser = expat.ParserCreate(encoding)
+        parser.ordered_attributes = True
+        parser.StartElementHandler = handler.startElement
+        parser.EndElementHandler = handler.endElement
+        parser.CharacterDataHandler = handler.characters
+        parser.buffer_text = True
+        parser.Parse(xml, True)
+        return handler.item
+
+
+class LxmlBackend(StdlibBackend):
+    """
+    XML backend relying on lxml for parsing.
+
+    Produces the same dictionaries as StdlibBackend: internal entities are expanded (external ones are skipped, as expat
+    does), and namespace declarations are kept as "@xmlns" attributes. Requests are still built by StdlibBackend.build,
+    which is faster than building an lxml tree for the few flat elements sent to DPS.
+
+    """
+    name = 'lxml'
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError("lxml is not installed")
+        self.parser = etree.XMLParser(resolve_entities=False, no_network=True, remove_comments=True,
+                                      remove_pis=True)
+
+    def parse(self, xml):
+        """
+        Returns an XML document as a dictionary, in xmltodict's format.
+
+        Bytes (or memoryviews) are fed to lxml as is, which detects the encoding from the XML declaration.
+
+        """
+        if isinstance(xml, six.text_type):
+            xml = xml.encode('utf-8')
+        root = etree.fromstring(xml, self.parser)
+        dtd = root.getroottree().docinfo.internalDTD
+        entities = {entity.name: entity.content for entity in dtd.iterentities()} if dtd is not None else {}
+        return OrderedDict([(self._name(root), self._convert(root, {}, entities))])
+
+    def _name(self, element):
+        name = etree.QName(element).localname
+        return '{}:{}'.format(element.prefix, name) if element.prefix else name
+
+    def _attribute_name(self, key, nsmap):
+        if not key.startswith('{'):
+            return key
+        name = etree.QName(key)
+        if name.namespace == XML_NAMESPACE:
+            return 'xml:' + name.localname
+        for prefix, uri in nsmap.items():
+            if prefix is not None and uri == name.namespace:
+                return '{}:{}'.format(prefix, name.localname)
+        return name.localname
+
+    def _convert(self, element, parent_nsmap, entities):
+        nsmap = element.nsmap
+        item = OrderedDict(('@xmlns:' + prefix if prefix else '@xmlns', uri) for prefix, uri in nsmap.items()
+                           if parent_nsmap.get(prefix) != uri)
+        item.update(('@' + self._attribute_name(k, nsmap), v) for k, v in element.attrib.items())
+        data = [element.text or '']
+        for child in element:
+            if child.tag is etree.Entity:
+                data.append(entities.get(child.name) or '')
+                data.append(child.tail or '')
+                continue
+            data.append(child.tail or '')
+            key = self._name(child)
+            value = self._convert(child, nsmap, entities)
+            if key not in item:
+                item[key] = value
+            elif isinstance(item[key], list):
+                item[key].append(value)
+            else:
+                item[key] = [item[key], value]
+        data = ''.join(data).strip() or None
+        if not item:
+            return data
+        if data is not None:
+            item['#text'] = data
+        return item
+
+
+BACKENDS = {'stdlib': StdlibBackend, 'lxml': LxmlBackend}
+
+_backend = None
+
+
+def get_backend():
+    """
+    Returns the XML backend in use: lxml when installed, the standard library otherwise.
+
+    """
+    global _backend
+    if _backend is None:
+        _backend = LxmlBackend() if etree is not None else StdlibBackend()
+    return _backend
+
+
+def set_backend(name=None):
+    """
+    Selects the XML backend by name ('lxml' or 'stdlib'). Resets to automatic selection when name is None.
+
+    """
+    global _backend
+    if name is not None and name not in BACKENDS:
+        raise ValueError("Unknown XML backend {} (expects: {})".format(name, ", ".join(sorted(BACKENDS))))
+    _backend = BACKENDS[name]() if name is not None else None
+    return get_backend()
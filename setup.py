@@ -49,6 +49,7 @@ setup(
     packages=find_packages(),
     package_dir={'dps': 'dps'},
     install_requires=[str(ir.req) for ir in parse_requirements("requirements.txt", session=uuid.uuid1())],
+    extras_require={"lxml": ["lxml"], "opentelemetry": ["opentelemetry-api"]},
     tests_require=["tox"],
     cmdclass={"test": Tox},
     license="MIT",
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+
+class Clock(object):
+    """
+    Fake monotonic clock for tests: returns now, which tests advance by hand.
+
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
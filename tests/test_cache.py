@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import time
+import threading
+import unittest
+from mock import Mock, patch
+
+from dps.cache import TTLCache, CacheInfo, SingleFlight
+from dps.pxpost import PxPostClient, PxPostCardTransaction
+from dps.pxfusion import PxFusionClient
+
+from .helpers import Clock
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TTLCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get(self):
+        with self.assertRaises(KeyError):
+            self.cache.get('a')
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+
+    def test_expiry(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.clock.now = 10
+        with self.assertRaises(KeyError):
+            self.cache.get('a')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+        with self.assertRaises(KeyError):
+            self.cache.get('b')
+
+    def test_entry_ttl(self):
+        self.cache.set('a', 1, ttl=None)
+        self.cache.set('b', 2, ttl=1)
+        self.clock.now = 1
+        with self.assertRaises(KeyError):
+            self.cache.get('b')
+        self.clock.now = 10 ** 6
+        self.assertEqual(self.cache.get('a'), 1)
+
+    def test_info(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.assertRaises(KeyError, self.cache.get, 'b')
+        self.cache.set('b', 2)
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.info(), CacheInfo(hits=1, misses=1, evictions=1, size=2, maxsize=2))
+
+    def test_delete(self):
+        self.cache.set('a', 1)
+        self.cache.delete('a')
+        self.cache.delete('a')
+        with self.assertRaises(KeyError):
+            self.cache.get('a')
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def slow(self, value):
+        self.calls.append(value)
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def run_concurrently(self, value, count=4):
+        results = []
+
+        def target():
+            try:
+                results.append(self.flight.do('key', self.slow, value))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        threads[0].start()
+        self.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while self.flight.calls['key'].waiters < count - 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_coalesces(self):
+        self.assertEqual(self.run_concurrently('result'), ['result'] * 4)
+        self.assertEqual(self.calls, ['result'])
+        self.assertEqual(self.flight.calls, {})
+
+    def test_error(self):
+        error = ValueError('failed')
+        self.assertEqual(self.run_concurrently(error), [error] * 4)
+        self.assertEqual(self.flight.calls, {})
+
+    def test_interrupted_leader(self):
+        results = []
+
+        def interrupted():
+            self.started.set()
+            self.release.wait(5)
+            raise KeyboardInterrupt()
+
+        def leader():
+            try:
+                self.flight.do('key', interrupted)
+            except KeyboardInterrupt as e:
+                results.append(e)
+
+        def waiter():
+            results.append(self.flight.do('key', self.slow, 'retried'))
+
+        threads = [threading.Thread(target=leader), threading.Thread(target=waiter)]
+        threads[0].start()
+        self.started.wait(5)
+        self.started.clear()
+        threads[1].start()
+        while self.flight.calls['key'].waiters < 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertIsInstance(results[0], KeyboardInterrupt)
+        self.assertEqual(results[1:], ['retried'])
+        self.assertEqual(self.calls, ['retried'])
+        self.assertEqual(self.flight.calls, {})
+
+    def test_sequential(self):
+        self.release.set()
+        self.assertEqual(self.flight.do('key', self.slow, 1), 1)
+        self.assertEqual(self.flight.do('key', self.slow, 2), 2)
+        self.assertEqual(self.calls, [1, 2])
+
+
+class DedupeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = PxPostClient('username', 'password', dedupe_ttl=60)
+
+    @patch('dps.pxpost.client.requests')
+    def test_repeated_post(self, mock_requests):
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><Authorized>1</Authorized></Txn>']
+        first = self.client.post(txn_type='Purchase', txn_id='TXNID', amount='1.00')
+        self.assertIs(self.client.post(txn_type='Purchase', txn_id='TXNID', amount='1.00'), first)
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 1)
+        self.client.post(txn_type='Refund', txn_id='TXNID', amount='1.00')
+        self.client.post(txn_type='Purchase', txn_id='OTHER', amount='1.00')
+        self.client.post(txn_type='Purchase', amount='1.00')
+        self.client.post(txn_type='Status', txn_id='TXNID')
+        self.client.post(txn_type='Status', txn_id='TXNID')
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 6)
+
+    @patch('dps.pxpost.client.requests')
+    def test_repeated_transaction(self, mock_requests):
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><Authorized>1</Authorized></Txn>']
+        transaction = PxPostCardTransaction(amount='1.00', input_currency='NZD', card_number='4111111111111111',
+                                            card_holder_name='Holder Name', date_expiry='1114', cvc2='123', txn_id='TXNID')
+        self.client.purchase(transaction)
+        self.client.purchase(transaction.freeze())
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 1)
+
+    @patch('dps.pxpost.client.requests')
+    def test_post_completed_after_lookup(self, mock_requests):
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><Authorized>1</Authorized></Txn>']
+        lookup = self.client.recent.get
+        responses = []
+
+        def racing_lookup(key):
+            # another post completes after this one missed the cache but before it joined the in-flight map
+            self.client.recent.get = lookup
+            responses.append(self.client.post(txn_type='Purchase', txn_id='TXNID', amount='1.00'))
+            raise KeyError(key)
+
+        self.client.recent.get = racing_lookup
+        self.assertIs(self.client.post(txn_type='Purchase', txn_id='TXNID', amount='1.00'), responses[0])
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 1)
+
+    @patch('dps.pxpost.client.requests')
+    def test_indeterminate_responses_not_cached(self, mock_requests):
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.headers = {}
+        for body in (b'<Txn><Transaction><StatusRequired>1</StatusRequired></Transaction></Txn>',
+                     b'<Txn><Transaction><Retry>1</Retry></Transaction></Txn>'):
+            mock_response.iter_content.return_value = [body]
+            self.client.post(txn_type='Purchase', txn_id='TXNID')
+            self.client.post(txn_type='Purchase', txn_id='TXNID')
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 4)
+
+    @patch('dps.pxpost.client.requests')
+    def test_errors_not_cached(self, mock_requests):
+        mock_requests.Session.return_value.post.side_effect = IOError('timeout')
+        for _ in range(2):
+            with self.assertRaises(IOError):
+                self.client.post(txn_type='Purchase', txn_id='TXNID')
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 2)
+
+    def test_disabled(self):
+        client = PxPostClient('username', 'password')
+        self.assertIsNone(client.dedupe_key(None, {'txn_type': 'Purchase', 'txn_id': 'TXNID'}))
+        self.assertEqual(self.client.dedupe_key(None, {'txn_type': 'Purchase', 'txn_id': 'TXNID'}),
+                         ('TXNID', 'Purchase'))
+
+
+class CoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+
+    def run_concurrently(self, inflight, func, count=4):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(func())) for _ in range(count)]
+        threads[0].start()
+        while not inflight.calls:
+            time.sleep(0.001)
+        for thread in threads[1:]:
+            thread.start()
+        while list(inflight.calls.values())[0].waiters < count - 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_pxpost_status(self):
+        client = PxPostClient('username', 'password')
+        client.post = Mock(side_effect=lambda *args, **kwargs: self.release.wait(5) and 'response')
+        results = self.run_concurrently(client.inflight, lambda: client.status(txn_id='TXNID'))
+        self.assertEqual(results, ['response'] * 4)
+        self.assertEqual(client.post.call_count, 1)
+
+    @patch('dps.pxfusion.client.SOAPClient')
+    def test_pxfusion_get_transaction(self, mock_soap):
+        client = PxFusionClient('username', 'password')
+        mock_get = client.soap_client.service.GetTransaction
+        mock_get.side_effect = lambda *args: self.release.wait(5) and {'status': '0'}
+        results = self.run_concurrently(client.inflight, lambda: client.get_transaction('session'))
+        self.assertEqual([result.status for result in results], [0] * 4)
+        self.assertEqual(mock_get.call_count, 1)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import gc
+import unittest
+from mock import Mock, patch
+
+from dps.circuitbreaker import CircuitBreaker
+from dps.exceptions import CircuitOpen
+from dps.pxpost import PxPostClient
+
+from .helpers import Clock
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(error_rate=0.5, window_size=4, min_calls=4, reset_timeout=10, probe_calls=2,
+                                      clock=self.clock)
+        self.transitions = []
+        self.breaker.listeners.append(lambda breaker, old, new: self.transitions.append((old, new)))
+
+    def fail(self):
+        def raise_error():
+            raise IOError("timeout")
+        with self.assertRaises(IOError):
+            self.breaker.call(raise_error)
+
+    def open(self):
+        for _ in range(2):
+            self.breaker.call(lambda: None)
+        for _ in range(2):
+            self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_opens_on_error_rate(self):
+        self.breaker.call(lambda: None)
+        self.fail()
+        self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.call(lambda: None)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.transitions, [(CircuitBreaker.CLOSED, CircuitBreaker.OPEN)])
+
+    def test_fails_fast_while_open(self):
+        self.open()
+        func = Mock()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.call(func)
+        self.assertFalse(func.called)
+
+    def test_half_open_probes_close_circuit(self):
+        self.open()
+        self.clock.now = 10
+        self.breaker.allow()
+        self.breaker.allow()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.record(True, 0)
+        self.breaker.record(True, 0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.transitions[1:], [(CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN),
+                                                (CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED)])
+
+    def test_half_open_failure_reopens_circuit(self):
+        self.open()
+        self.clock.now = 10
+        self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.opened_at, 10)
+
+    def test_interrupted_probe_reopens_circuit(self):
+        self.open()
+        self.clock.now = 10
+        with self.assertRaises(KeyboardInterrupt):
+            self.breaker.call(Mock(side_effect=KeyboardInterrupt))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now = 20
+        self.breaker.call(lambda: None)
+        self.breaker.call(lambda: None)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_check_does_not_take_probes(self):
+        for _ in range(4):
+            with self.assertRaises(ValueError):
+                self.breaker.call(Mock(side_effect=ValueError))
+        with self.assertRaises(CircuitOpen):
+            self.breaker.check()
+        self.clock.now += 10
+        self.breaker.check()
+        self.breaker.check()
+        self.breaker.call(lambda: None)
+        self.breaker.call(lambda: None)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_remove_listener(self):
+        listener = Mock()
+        self.breaker.add_listener(listener)
+        self.breaker.remove_listener(listener)
+        self.assertEqual(len(self.breaker.listeners), 1)
+
+    def test_opens_on_slow_calls(self):
+        breaker = CircuitBreaker(slow_call_duration=1, slow_call_rate=0.5, window_size=2, min_calls=2, clock=self.clock)
+
+        def slow_call():
+            self.clock.now += 2
+        breaker.call(slow_call)
+        breaker.call(lambda: None)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class ClientCircuitBreakerTest(unittest.TestCase):
+
+    @patch('dps.pxpost.client.requests')
+    def test_client_publishes_state_changes(self, mock_requests):
+        hook = Mock()
+        breaker = CircuitBreaker(window_size=1, min_calls=1)
+        client = PxPostClient('username', 'password', circuit_breaker=breaker, hooks={'circuit_state': hook})
+        mock_requests.Session.return_value.post.side_effect = IOError("timeout")
+        with self.assertRaises(IOError):
+            client.post(txn_type='Status', txn_id='TXNID')
+        hook.assert_called_once_with(client, CircuitBreaker.CLOSED, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            client.post(txn_type='Status', txn_id='TXNID')
+        self.assertEqual(mock_requests.Session.return_value.post.call_count, 1)
+
+    @patch('dps.pxpost.client.requests')
+    def test_open_circuit_fails_before_rate_limiter(self, mock_requests):
+        breaker = CircuitBreaker(window_size=1, min_calls=1)
+        rate_limiter = Mock()
+        client = PxPostClient('username', 'password', circuit_breaker=breaker, rate_limiter=rate_limiter)
+        mock_requests.Session.return_value.post.side_effect = IOError("timeout")
+        with self.assertRaises(IOError):
+            client.post(txn_type='Status', txn_id='TXNID')
+        with self.assertRaises(CircuitOpen):
+            client.post(txn_type='Status', txn_id='TXNID')
+        self.assertEqual(rate_limiter.acquire.call_count, 1)
+
+    def test_clients_are_not_kept_alive_by_listeners(self):
+        breaker = CircuitBreaker(window_size=1, min_calls=1)
+        hook = Mock()
+        client = PxPostClient('username', 'password', circuit_breaker=breaker, hooks={'circuit_state': hook})
+        del client
+        gc.collect()
+        with self.assertRaises(ValueError):
+            breaker.call(Mock(side_effect=ValueError))
+        self.assertFalse(hook.called)
+        self.assertEqual(breaker.listeners, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import Mock, patch
+
+from dps.journal import Journal, recover
+from dps.exceptions import CircuitOpen
+from dps.pxpost import PxPostClient, PxPostResponse
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'pxpost.journal')
+        self.journal = Journal(self.path)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def pending(self):
+        return [(record['txn_id'], record['txn_type']) for record in self.journal.unresolved()]
+
+    def test_unresolved(self):
+        self.journal.intent('TXN1', 'Purchase')
+        self.journal.intent('TXN2', 'Purchase')
+        self.journal.intent('TXN2', 'Refund')
+        self.journal.outcome('TXN2', 'Purchase', PxPostResponse({'Success': '1', 'ReCo': '00', 'DpsTxnRef': 'REF'}))
+        self.assertEqual(self.pending(), [('TXN1', 'Purchase'), ('TXN2', 'Refund')])
+        outcome = [record for record in self.journal.records() if record['op'] == 'outcome'][0]
+        self.assertEqual((outcome['success'], outcome['re_co'], outcome['dps_txn_ref']), (True, '00', 'REF'))
+
+    def test_torn_record(self):
+        self.journal.intent('TXN1', 'Purchase')
+        self.journal.file.write(b'{"op": "outcome", "txn_id": "TX')
+        self.journal.file.flush()
+        self.assertEqual(self.pending(), [('TXN1', 'Purchase')])
+
+    def test_reopen(self):
+        self.journal.intent('TXN1', 'Purchase')
+        self.journal.close()
+        self.journal = Journal(self.path)
+        self.journal.intent('TXN2', 'Purchase')
+        self.assertEqual(self.pending(), [('TXN1', 'Purchase'), ('TXN2', 'Purchase')])
+
+    def test_reopen_after_torn_record(self):
+        self.journal.intent('TXN1', 'Purchase')
+        self.journal.file.write(b'{"op": "outcome", "txn_id": "TX')
+        self.journal.close()
+        self.journal = Journal(self.path)
+        self.journal.intent('TXN2', 'Purchase')
+        self.assertEqual(self.pending(), [('TXN1', 'Purchase'), ('TXN2', 'Purchase')])
+
+    def test_repair_without_newline(self):
+        self.journal.file.write(b'{"op": "intent", "txn_id": "TX' * 1000)
+        self.journal.close()
+        self.journal = Journal(self.path)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    @patch('dps.journal.fsync_directory')
+    def test_compact_syncs_directory(self, mock_fsync_directory):
+        self.journal.compact()
+        mock_fsync_directory.assert_called_once_with(self.path)
+
+    def test_compact(self):
+        for txn_id in ('TXN1', 'TXN2', 'TXN3'):
+            self.journal.intent(txn_id, 'Purchase')
+        self.journal.outcome('TXN2', 'Purchase', error=ValueError('failed'))
+        self.journal.compact()
+        self.assertEqual([record['txn_id'] for record in self.journal.records()], ['TXN1', 'TXN3'])
+        self.journal.outcome('TXN1', 'Purchase')
+        self.assertEqual(self.pending(), [('TXN3', 'Purchase')])
+
+    @patch('dps.journal.os.fsync')
+    def test_group_commit(self, mock_fsync):
+        self.journal.intent('TXN1', 'Purchase')
+        self.assertEqual(mock_fsync.call_count, 1)
+        self.journal.outcome('TXN1', 'Purchase')
+        self.assertEqual(mock_fsync.call_count, 1)
+
+        # writers arriving during an fsync are covered by a single fsync
+        release = threading.Event()
+        mock_fsync.side_effect = lambda fileno: release.wait(5)
+        threads = [threading.Thread(target=self.journal.intent, args=('TXN{}'.format(i), 'Purchase'))
+                   for i in range(2, 6)]
+        threads[0].start()
+        while mock_fsync.call_count < 2:
+            time.sleep(0.001)
+        for thread in threads[1:]:
+            thread.start()
+        while self.journal.written < 6:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(mock_fsync.call_count, 3)
+        self.assertEqual(self.journal.synced, 6)
+
+    @patch('dps.journal.os.fsync')
+    def test_compact_waits_for_sync(self, mock_fsync):
+        original = self.journal.file
+        release = threading.Event()
+        closed = []
+
+        def fsync(fileno):
+            if mock_fsync.call_count == 1:
+                release.wait(5)
+                closed.append(original.closed)
+        mock_fsync.side_effect = fsync
+        writer = threading.Thread(target=self.journal.intent, args=('TXN1', 'Purchase'))
+        writer.start()
+        while mock_fsync.call_count < 1:
+            time.sleep(0.001)
+        compactor = threading.Thread(target=self.journal.compact)
+        compactor.start()
+        compactor.join(0.1)
+        self.assertTrue(compactor.is_alive())
+        release.set()
+        writer.join(5)
+        compactor.join(5)
+        self.assertEqual(closed, [False])
+        self.assertTrue(original.closed)
+        self.assertEqual(self.pending(), [('TXN1', 'Purchase')])
+        self.assertEqual(self.journal.synced, self.journal.written)
+
+    @patch('dps.journal.os.fsync')
+    def test_no_sync(self, mock_fsync):
+        journal = Journal(self.path, sync=False)
+        journal.intent('TXN1', 'Purchase')
+        self.assertFalse(mock_fsync.called)
+        journal.close()
+
+    def test_recover(self):
+        for txn_id in ('TXN1', 'TXN2', 'TXN3'):
+            self.journal.intent(txn_id, 'Purchase')
+        client = Mock()
+        responses = {'TXN1': PxPostResponse({'Success': '1', 'ReCo': '00'}),
+                     'TXN2': PxPostResponse({'Success': '0', 'ReCo': 'ZZ'})}
+
+        def status(txn_id):
+            if txn_id not in responses:
+                raise IOError('timeout')
+            return responses[txn_id]
+
+        client.status.side_effect = status
+        results = recover(self.journal, client, concurrency=3)
+        self.assertEqual([(record['txn_id'], response, type(error)) for record, response, error in results],
+                         [('TXN1', responses['TXN1'], type(None)), ('TXN2', responses['TXN2'], type(None)),
+                          ('TXN3', None, IOError)])
+        self.assertEqual([record['txn_id'] for record in self.journal.records()], ['TXN3'])
+        self.assertEqual(recover(Journal(os.path.join(self.directory, 'empty')), client), [])
+
+
+class ClientJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.journal = Mock()
+        self.client = PxPostClient('username', 'password', journal=self.journal)
+
+    @patch('dps.pxpost.client.requests')
+    def test_post(self, mock_requests):
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><ReCo>00</ReCo></Txn>']
+        response = self.client.post(txn_type='Purchase', txn_id='TXN1')
+        self.journal.intent.assert_called_once_with('TXN1', 'Purchase')
+        self.journal.outcome.assert_called_once_with('TXN1', 'Purchase', response)
+        self.client.post(txn_type='Purchase')
+        self.client.post(txn_type='Status', txn_id='TXN1')
+        self.assertEqual(self.journal.intent.call_count, 1)
+
+    @patch('dps.pxpost.client.requests')
+    def test_unknown_outcome(self, mock_requests):
+        mock_requests.Session.return_value.post.side_effect = IOError('timeout')
+        with self.assertRaises(IOError):
+            self.client.post(txn_type='Purchase', txn_id='TXN1')
+        self.assertTrue(self.journal.intent.called)
+        self.assertFalse(self.journal.outcome.called)
+
+    def test_circuit_open(self):
+        self.client.circuit_breaker = Mock()
+        self.client.circuit_breaker.call.side_effect = error = CircuitOpen('open')
+        with self.assertRaises(CircuitOpen):
+            self.client.post(txn_type='Purchase', txn_id='TXN1')
+        self.journal.outcome.assert_called_once_with('TXN1', 'Purchase', error=error)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import decimal
+import unittest
+from collections import Counter
+
+import six
+from mock import Mock
+from suds import WebFault
+
+from dps.loadtest import parse_mix, percentile, TrafficGenerator, LoadTest, LoadTestResult, StandInConfig, \
+                         StandInServer, format_report, main, OPERATIONS
+from dps.pxpost import PxPostClient, PxPostResponse
+from dps.pxfusion import PxFusionClient
+
+
+class LoadTestTest(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('purchase=3, status=1.5,refund,complete=0'),
+                         [('purchase', 3), ('status', 1.5), ('refund', 1)])
+        for mix in ('purchase=3,void=1', 'purchase=x', 'purchase=-1', 'purchase=0'):
+            with self.assertRaises(ValueError):
+                parse_mix(mix)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, fraction) for fraction in (0, 0.5, 0.9, 0.99, 1)], [1, 50, 90, 99, 100])
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_generator(self):
+        generator = TrafficGenerator(parse_mix(','.join(OPERATIONS)), seed=1)
+        seen = Counter()
+        for _ in range(200):
+            operation, transaction = generator.next()
+            seen[operation] += 1
+            self.assertTrue(transaction.is_valid())
+        self.assertEqual(set(seen), set(OPERATIONS))
+        first, second = (TrafficGenerator(parse_mix(','.join(OPERATIONS)), seed=2) for _ in range(2))
+        self.assertEqual([first.next()[0] for _ in range(20)], [second.next()[0] for _ in range(20)])
+
+    def test_run(self):
+        pxpost = Mock()
+        pxpost.purchase.side_effect = [PxPostResponse({'Transaction': {'Authorized': '0'}})] + \
+            [IOError('timeout')] + [PxPostResponse({'Transaction': {'Authorized': '1'}})] * 8
+        load_test = LoadTest({'pxpost': pxpost}, TrafficGenerator(parse_mix('purchase')), requests=10, concurrency=2)
+        result = load_test.run()
+        self.assertEqual(result.requests, 10)
+        self.assertEqual(len(result.latencies['purchase']), 9)
+        self.assertEqual(result.latencies['purchase'], sorted(result.latencies['purchase']))
+        self.assertEqual(result.errors, {('purchase', 'IOError' if six.PY2 else 'OSError'): 1})
+        self.assertEqual(result.declines, {'purchase': 1})
+        with self.assertRaises(ValueError):
+            LoadTest({}, None)
+
+    def test_report(self):
+        result = LoadTestResult(4, 2.0, 0.004, {'purchase': [0.01, 0.02, 0.03]}, Counter({('status', 'HTTPError'): 1}),
+                                Counter({'purchase': 1}))
+        report = format_report(result)
+        self.assertIn('throughput: 2.0 req/s', report)
+        self.assertIn('client CPU: 1.000ms per request', report)
+        self.assertIn('HTTPError', report)
+        self.assertEqual(report.splitlines()[4].split(), ['purchase', '3', '1', '20.00', '30.00', '30.00', '30.00'])
+
+    def test_stand_ins(self):
+        config = StandInConfig(latency=0, decline_rate=0, error_rate=0)
+        generator = TrafficGenerator(parse_mix('purchase'))
+        with StandInServer(config) as server:
+            client = PxPostClient('username', 'password')
+            client.URI = server.pxpost_url
+            response = client.purchase(generator.card_transaction('TXNID'))
+            self.assertTrue(response.authorized)
+            self.assertEqual((response.re_co, response.txn_id), ('00', 'TXNID'))
+            client = PxFusionClient('username', 'password', soap_client=server.soap_client())
+            response = client.purchase(amount='1.00', currency='NZD', txn_ref='TXNREF',
+                                       return_url='https://localhost/return')
+            self.assertTrue(response.success)
+            response = client.get_transaction(response.transaction_id)
+            self.assertTrue(response.approved)
+            self.assertEqual(response.amount, decimal.Decimal('1.00'))
+        self.assertFalse(server.process.is_alive())
+
+    def test_stand_in_errors(self):
+        config = StandInConfig(latency=0, decline_rate=1, error_rate=1)
+        with StandInServer(config) as server:
+            client = PxFusionClient('username', 'password', soap_client=server.soap_client())
+            with self.assertRaises(WebFault):
+                client.get_transaction('session')
+
+    def test_main(self):
+        stream = six.StringIO()
+        self.assertEqual(main(['--requests', '20', '--concurrency', '2', '--seed', '1'], stream), 0)
+        self.assertIn('requests: 20', stream.getvalue())
+        self.assertIn('all', stream.getvalue())
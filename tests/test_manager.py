@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import unittest
+from mock import Mock, patch
+
+from dps.manager import ClientManager, ProcessSessionTransport
+from dps.metrics import MetricsRegistry
+from dps.pxpost import PxPostClient, ProcessSession
+from dps.pxfusion import PxFusionClient
+
+
+class ClientManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ClientManager(rate=5, burst=10, pool_size=32, metrics=MetricsRegistry())
+
+    @patch('dps.pxpost.client.requests')
+    def test_pxpost(self, mock_requests):
+        client = self.manager.pxpost('merchant1', 'password1')
+        self.assertIsInstance(client, PxPostClient)
+        self.assertIs(self.manager.pxpost('merchant1', 'password1'), client)
+        other = self.manager.pxpost('merchant2', 'password2')
+        self.assertIsNot(other, client)
+        self.assertEqual((other.username, other.password), ('merchant2', 'password2'))
+        self.assertIs(other.session, client.session)
+        self.assertEqual(mock_requests.Session.call_count, 1)
+        mock_requests.adapters.HTTPAdapter.assert_called_with(pool_maxsize=32)
+        self.assertIs(other.rate_limiter, client.rate_limiter)
+        self.assertIs(other.profiler, client.profiler)
+        self.assertEqual((client.metrics.merchant, other.metrics.merchant), ('merchant1', 'merchant2'))
+
+    def test_rate_limits(self):
+        self.assertIsNot(self.manager.rate_limiter.bucket('merchant1'), self.manager.rate_limiter.bucket('merchant2'))
+        self.assertIsNone(ClientManager().pxpost('merchant1', 'password1').rate_limiter)
+
+    @patch('dps.manager.SOAPClient')
+    @patch('dps.pxfusion.client.SOAPClient')
+    def test_pxfusion(self, mock_client_soap, mock_manager_soap):
+        client = self.manager.pxfusion('merchant1', 'password1')
+        other = self.manager.pxfusion('merchant2', 'password2')
+        self.assertIsInstance(client, PxFusionClient)
+        self.assertIs(client.soap_client, mock_manager_soap.return_value)
+        self.assertIs(other.soap_client, client.soap_client)
+        self.assertEqual(mock_manager_soap.call_count, 1)
+        self.assertFalse(mock_client_soap.called)
+        other.get_transaction('session')
+        mock_manager_soap.return_value.service.GetTransaction.assert_called_with('merchant2', 'password2', 'session')
+
+    @patch('dps.manager.SOAPClient')
+    @patch('dps.pxpost.client.os')
+    @patch('dps.pxpost.client.requests')
+    def test_soap_transport_session_per_process(self, mock_requests, mock_os, mock_soap):
+        mock_requests.Session.side_effect = lambda: Mock()
+        mock_os.getpid.return_value = 1
+        self.manager.soap_client
+        transport = mock_soap.call_args[1]['transport']
+        self.assertIsInstance(transport, ProcessSessionTransport)
+        session = transport._session
+        self.assertIs(transport._session, session)
+        self.assertIs(self.manager.pool.get(), session)
+        # after a fork
+        mock_os.getpid.return_value = 2
+        transport.send(Mock(url='https://sec.paymentexpress.com/pxf', message=b'<xml/>', headers={}))
+        self.assertIsNot(transport._session, session)
+        self.assertFalse(session.post.called)
+        self.assertTrue(transport._session.post.called)
+
+
+class ProcessSessionTest(unittest.TestCase):
+
+    @patch('dps.pxpost.client.requests')
+    def test_pool_size(self, mock_requests):
+        ProcessSession().get()
+        self.assertFalse(mock_requests.Session.return_value.mount.called)
+        ProcessSession(pool_size=4).get()
+        mock_requests.Session.return_value.mount.assert_called_with('https://', mock_requests.adapters.HTTPAdapter.return_value)
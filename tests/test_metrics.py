@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import gc
+import threading
+import unittest
+from mock import Mock, patch
+
+from dps.metrics import MetricsRegistry
+from dps.pxpost import PxPostClient
+from dps.pxfusion import PxFusionClient
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter('requests_total', "Requests", ('client', 'code'))
+        counter.labels('pxpost', '00').inc()
+        counter.labels('pxpost', '00').inc(2)
+        counter.labels('pxpost', 'say "hi"\n').inc()
+        self.assertEqual(counter.labels('pxpost', '00').value, 3)
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP requests_total Requests',
+            '# TYPE requests_total counter',
+            'requests_total{client="pxpost",code="00"} 3',
+            'requests_total{client="pxpost",code="say \\"hi\\"\\n"} 1',
+        ]) + '\n')
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('duration_seconds', "Duration", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.labels().observe(value)
+        self.assertEqual(histogram.labels().count, 4)
+        self.assertAlmostEqual(histogram.labels().sum, 2.65)
+        self.assertEqual(self.registry.render().splitlines()[2:5], [
+            'duration_seconds_bucket{le="0.1"} 2',
+            'duration_seconds_bucket{le="1.0"} 3',
+            'duration_seconds_bucket{le="+Inf"} 4',
+        ])
+        self.assertEqual(self.registry.render().splitlines()[-1], 'duration_seconds_count 4')
+
+    def test_labels(self):
+        counter = self.registry.counter('requests_total', "Requests", ('client',))
+        with self.assertRaises(ValueError):
+            counter.labels('pxpost', 'Purchase')
+
+    def test_register(self):
+        counter = self.registry.counter('requests_total', "Requests")
+        self.assertIs(self.registry.counter('requests_total', "Requests"), counter)
+        with self.assertRaises(ValueError):
+            self.registry.histogram('requests_total', "Requests")
+
+    def test_threads(self):
+        counter = self.registry.counter('requests_total', "Requests")
+
+        def target():
+            for _ in range(1000):
+                counter.labels().inc()
+
+        threads = [threading.Thread(target=target) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.labels().value, 8000)
+        # shards of finished threads are folded into the base total
+        gc.collect()
+        self.assertEqual(len(counter.labels().shards), 0)
+        self.assertEqual(counter.labels().value, 8000)
+
+    def test_threads_histogram(self):
+        histogram = self.registry.histogram('duration_seconds', "Duration", buckets=(1,))
+        histogram.labels().observe(0.5)
+        threads = [threading.Thread(target=histogram.labels().observe, args=(2,)) for _ in range(100)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        gc.collect()
+        self.assertEqual(len(histogram.labels().shards), 1)
+        self.assertEqual(histogram.labels().values(), [1, 100, 200.5])
+
+
+class ClientMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def requests(self, *labels):
+        return self.registry.metrics['dps_requests_total'].labels(*labels).value
+
+    @patch('dps.pxpost.client.requests')
+    def test_pxpost(self, mock_requests):
+        client = PxPostClient('username', 'password', metrics=self.registry)
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><ReCo>00</ReCo></Txn>']
+        client.post(txn_type='Purchase')
+        client.post(txn_type='Purchase')
+        self.assertEqual(self.requests('pxpost', 'username', 'Purchase', '200', '00'), 2)
+        self.assertEqual(self.registry.metrics['dps_request_duration_seconds'].labels('pxpost', 'username', 'Purchase').count, 2)
+
+        mock_response.raise_for_status.side_effect = error = IOError('Service Unavailable')
+        error.response = Mock(status_code=503)
+        with self.assertRaises(IOError):
+            client.post(txn_type='Purchase')
+        self.assertEqual(self.requests('pxpost', 'username', 'Purchase', '503', ''), 1)
+        self.assertIn('dps_requests_total{client="pxpost",merchant="username",txn_type="Purchase",http_status="503",response_code=""} 1',
+                      self.registry.render())
+
+    @patch('dps.pxfusion.client.SOAPClient')
+    def test_pxfusion(self, mock_soap):
+        client = PxFusionClient('username', 'password', metrics=self.registry)
+        client.soap_client.service.GetTransaction.return_value = Mock(responseCode='00', status='0')
+        client.get_transaction('session')
+        self.assertEqual(self.requests('pxfusion', 'username', 'GetTransaction', '200', '00'), 1)
+        client.soap_client.service.GetTransaction.side_effect = IOError('Connection refused')
+        with self.assertRaises(IOError):
+            client.get_transaction('session')
+        self.assertEqual(self.requests('pxfusion', 'username', 'GetTransaction', 'error', ''), 1)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import pstats
+import tempfile
+import unittest
+from mock import Mock, patch
+
+from dps.profiling import SamplingProfiler, UNSAMPLED, profile_lock
+from dps.pxpost import PxPostClient
+
+
+def work():
+    return sum(range(1000))
+
+
+class SamplingProfilerTest(unittest.TestCase):
+
+    def test_disabled(self):
+        profiler = SamplingProfiler(random=Mock())
+        self.assertIs(profiler.sample('pxpost', 'Purchase'), UNSAMPLED)
+        self.assertFalse(profiler.random.called)
+
+    def test_rate(self):
+        profiler = SamplingProfiler(rate=0.5, random=Mock(side_effect=[0.2, 0.7]))
+        self.assertIsNot(profiler.sample('pxpost', 'Purchase'), UNSAMPLED)
+        self.assertIs(profiler.sample('pxpost', 'Purchase'), UNSAMPLED)
+
+    def test_enable(self):
+        profiler = SamplingProfiler()
+        with self.assertRaises(ValueError):
+            profiler.enable(rate=2)
+        with self.assertRaises(ValueError):
+            profiler.enable(mode='sampling')
+        profiler.enable(rate=1)
+        self.assertIsNot(profiler.sample('pxpost', 'Purchase'), UNSAMPLED)
+        profiler.disable()
+        self.assertIs(profiler.sample('pxpost', 'Purchase'), UNSAMPLED)
+
+    def test_timer(self):
+        profiler = SamplingProfiler(rate=1, clock=Mock(side_effect=[0, 0.002, 1, 1.004]))
+        for _ in range(2):
+            with profiler.sample('pxpost', 'Purchase'):
+                work()
+        count, total, longest = profiler.timings['pxpost.Purchase']
+        self.assertEqual(count, 2)
+        self.assertAlmostEqual(total, 0.006)
+        self.assertAlmostEqual(longest, 0.004)
+        self.assertIsNone(profiler.stats)
+        report = profiler.report()
+        self.assertIn('pxpost.Purchase', report)
+        self.assertIn('3.000', report)
+        profiler.reset()
+        self.assertEqual(profiler.timings, {})
+
+    def test_cprofile(self):
+        profiler = SamplingProfiler(rate=1, mode=SamplingProfiler.CPROFILE)
+        for _ in range(3):
+            with profiler.sample('pxpost', 'Purchase'):
+                work()
+        self.assertIn('work', profiler.report())
+        self.assertFalse(profile_lock.locked())
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            profiler.dump(path)
+            self.assertTrue(any(func[2] == 'work' and stat[0] == 3 for func, stat in pstats.Stats(path).stats.items()))
+        finally:
+            os.remove(path)
+
+    def test_cprofile_concurrent(self):
+        profiler = SamplingProfiler(rate=1, mode=SamplingProfiler.CPROFILE)
+        with profiler.sample('outer') as outer:
+            with profiler.sample('inner') as inner:
+                pass
+        self.assertIsNotNone(outer.profile)
+        self.assertIsNone(inner.profile)
+        self.assertEqual(sorted(profiler.timings), ['inner', 'outer'])
+
+    def test_cprofile_across_profilers(self):
+        outer_profiler = SamplingProfiler(rate=1, mode=SamplingProfiler.CPROFILE)
+        inner_profiler = SamplingProfiler(rate=1, mode=SamplingProfiler.CPROFILE)
+        with outer_profiler.sample('outer') as outer:
+            with inner_profiler.sample('inner') as inner:
+                pass
+        self.assertIsNotNone(outer.profile)
+        self.assertIsNone(inner.profile)
+
+    @patch('dps.profiling.cProfile.Profile')
+    def test_cprofile_enable_error(self, mock_profile):
+        # python 3.12+ raises when another profiler (e.g. the application's) is active
+        mock_profile.return_value.enable.side_effect = ValueError("Another profiling tool is already active")
+        profiler = SamplingProfiler(rate=1, mode=SamplingProfiler.CPROFILE)
+        with profiler.sample('pxpost', 'Purchase') as sample:
+            work()
+        self.assertIsNone(sample.profile)
+        self.assertFalse(profile_lock.locked())
+        self.assertEqual(profiler.timings['pxpost.Purchase'][0], 1)
+        self.assertIsNone(profiler.stats)
+
+    def test_dump_without_samples(self):
+        with self.assertRaises(ValueError):
+            SamplingProfiler().dump(os.devnull)
+
+    @patch('dps.pxpost.client.requests')
+    def test_client(self, mock_requests):
+        client = PxPostClient('username', 'password')
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><ReCo>00</ReCo></Txn>']
+        client.post(txn_type='Purchase')
+        self.assertEqual(client.profiler.timings, {})
+        client.profiler.enable(rate=1, mode=SamplingProfiler.CPROFILE)
+        client.post(txn_type='Purchase')
+        self.assertEqual(client.profiler.timings['pxpost.Purchase'][0], 1)
+        self.assertIn('parse', client.profiler.report())
@@ -5,7 +5,8 @@ from __future__ import unicode_literals
 import unittest
 import decimal
 from mock import Mock, patch, call
-from dps.pxfusion import PxFusionClient, PxFusionGetTransaction, PxFusionStatusTransaction, PxFusionCancelTransaction
+from dps.pxfusion import PxFusionClient, PxFusionGetTransaction, PxFusionStatusTransaction, PxFusionCancelTransaction, \
+                        PxFusionTransactionResponse
 
 
 class PxFusionTest(unittest.TestCase):
@@ -17,6 +18,11 @@ class PxFusionTest(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def assertRequested(self, txn_type, **fields):
+        args, kwargs = self.client.get_transaction_id.call_args
+        self.assertEqual(kwargs, {'txn_type': txn_type})
+        self.assertEqual(dict(args[0]), fields)
+
     def test_credentials(self):
         self.assertEqual(self.client.username, 'username')
         self.assertEqual(self.client.password, 'password')
@@ -31,6 +37,14 @@ class PxFusionTest(unittest.TestCase):
         self.assertEqual(mock_create.call_count, 1)
         self.assertEqual(mock_create.call_args, call('TransactionDetails'))
 
+    def test_create_transaction_details_from_transaction(self):
+        mock_create = self.client.soap_client.factory.create
+        mock_create.return_value = dict()
+        transaction = PxFusionGetTransaction(amount='10.01', currency='NZD', return_url='https://example.org', txn_ref='ref', pax_carrier_2='NZ')
+        result = self.client.create_transaction_details(transaction, txn_type='Purchase')
+        expected = {'amount': decimal.Decimal('10.01'), 'currency': 'NZD', 'returnUrl': 'https://example.org', 'txnRef': 'ref', 'paxCarrier2': 'NZ', 'txnType': 'Purchase'}
+        self.assertEqual(result, expected)
+
     def test_get_transaction_id(self):
         expected = {'success': True, 'transaction_id': 'txnid', 'session_id': 'txnid'}
         mock_get_id = self.client.soap_client.service.GetTransactionId
@@ -53,6 +67,43 @@ class PxFusionTest(unittest.TestCase):
         self.assertEqual(mock_get.call_count, 1)
         self.assertEqual(mock_get.call_args, call('username', 'password', 'txnid'))
 
+    def test_typed_transaction_response(self):
+        class SudsObject(object):
+            def __init__(self, **kwargs):
+                self.__keylist__ = list(kwargs)
+                for k, v in kwargs.items():
+                    setattr(self, k, v)
+
+        self.client.soap_client.service.GetTransaction.return_value = SudsObject(
+            status='0', responseText='APPROVED', amount='10.01', testMode=True, currencyId='554', dpsTxnRef='REF')
+        result = self.client.get_transaction(transaction_id='txnid')
+        self.assertIsInstance(result, PxFusionTransactionResponse)
+        self.assertEqual(result.status, PxFusionTransactionResponse.APPROVED)
+        self.assertTrue(result.approved)
+        self.assertEqual(result.amount, decimal.Decimal('10.01'))
+        self.assertIs(result.test_mode, True)
+        self.assertEqual(result.currency_id, 554)
+        self.assertIsNone(result.auth_code)
+        self.assertEqual(result.to_dict(), {'status': '0', 'response_text': 'APPROVED', 'amount': '10.01', 'test_mode': True,
+                                            'currency_id': '554', 'dps_txn_ref': 'REF'})
+
+    @patch('dps.pxfusion.client.SOAPClient')
+    def test_get_transaction_cache(self, mock_soap):
+        client = PxFusionClient('username', 'password', cache_size=10, pending_ttl=2)
+        client.transaction_cache.clock = clock = Mock(return_value=0)
+        mock_get = client.soap_client.service.GetTransaction
+        mock_get.return_value = {'status': '5'}
+        self.assertFalse(client.get_transaction(transaction_id='txnid').final)
+        client.get_transaction(transaction_id='txnid')
+        self.assertEqual(mock_get.call_count, 1)
+        clock.return_value = 2
+        mock_get.return_value = {'status': '0'}
+        self.assertTrue(client.get_transaction(transaction_id='txnid').final)
+        clock.return_value = 10 ** 6
+        self.assertTrue(client.get_transaction(transaction_id='txnid').approved)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(client.transaction_cache.info()[:3], (2, 2, 0))
+
     def test_cancel_transaction(self):
         expected = {'response_text': 'success', 'txn_id': 'txnid'}
         mock_cancel = self.client.soap_client.service.CancelTransaction
@@ -67,14 +118,14 @@ class PxFusionTest(unittest.TestCase):
         self.client.get_transaction_id = Mock()
         self.client.authorize(PxFusionGetTransaction(amount='10.01', currency='NZD', return_url='https://example.org', txn_ref='ref'))
         self.assertTrue(self.client.get_transaction_id.called)
-        self.assertEqual(self.client.get_transaction_id.call_args, call(txn_type='Auth', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org'))
+        self.assertRequested('Auth', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org')
         self.assertEqual(self.client.get_transaction_id.call_count, 1)
 
     def test_purchase(self):
         self.client.get_transaction_id = Mock()
         self.client.purchase(amount=decimal.Decimal('10.01'), currency='NZD', return_url='https://example.org', txn_ref='ref')
         self.assertTrue(self.client.get_transaction_id.called)
-        self.assertEqual(self.client.get_transaction_id.call_args, call(txn_type='Purchase', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org'))
+        self.assertRequested('Purchase', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org')
         self.assertEqual(self.client.get_transaction_id.call_count, 1)
 
     def test_status(self):
@@ -94,12 +145,12 @@ class PxFusionTest(unittest.TestCase):
     def test_authorize_with_kwargs(self):
         self.client.get_transaction_id = Mock()
         self.client.authorize(amount=decimal.Decimal('10.01'), currency='NZD', return_url='https://example.org', txn_ref='ref')
-        self.assertEqual(self.client.get_transaction_id.call_args, call(txn_type='Auth', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org'))
+        self.assertRequested('Auth', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org')
 
     def test_purchase_with_kwargs(self):
         self.client.get_transaction_id = Mock()
         self.client.purchase(amount=decimal.Decimal('10.01'), currency='NZD', return_url='https://example.org', txn_ref='ref')
-        self.assertEqual(self.client.get_transaction_id.call_args, call(txn_type='Purchase', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org'))
+        self.assertRequested('Purchase', currency='NZD', amount=decimal.Decimal('10.01'), txn_ref='ref', return_url='https://example.org')
 
     def test_status_with_kwargs(self):
         self.client.get_transaction = Mock()
@@ -2,11 +2,15 @@
 
 from __future__ import unicode_literals
 
+import io
+import os
+import tempfile
 import unittest
 import decimal
 from mock import Mock, patch, call
 from dps.pxpost import PxPostClient, PxPostCardTransaction, PxPostBillingTransaction, PxPostDpsBillingTransaction, PxPostCompleteTransaction, PxPostStatusTransaction, PxPostRefundTransaction
 from dps.pxpost.client import PxRequest, PxResponse
+from dps.pxpost import PxPostResponse, read_responses
 
 
 class PxPostTest(unittest.TestCase):
@@ -17,6 +21,11 @@ class PxPostTest(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def assertPosted(self, txn_type, **fields):
+        args, kwargs = self.client.post.call_args
+        self.assertEqual(kwargs, {'txn_type': txn_type})
+        self.assertEqual(dict(args[0]), fields)
+
     def test_request(self):
         req = PxRequest('RootTag', test_key='value')
         expected = '<?xml version="1.0" ?><RootTag><TestKey>value</TestKey></RootTag>'
@@ -27,115 +36,208 @@ class PxPostTest(unittest.TestCase):
         expected = {'test_key': 'value'}
         self.assertEquals(res.to_dict(), expected)
 
+    @patch('dps.pxpost.client.os')
+    @patch('dps.pxpost.client.requests')
+    def test_session(self, mock_requests, mock_os):
+        mock_requests.Session.side_effect = lambda: Mock()
+        mock_os.getpid.return_value = 1
+        session = self.client.session
+        self.assertIs(self.client.session, session)
+        mock_os.getpid.return_value = 2
+        self.assertIsNot(self.client.session, session)
+        self.assertEqual(mock_requests.Session.call_count, 2)
+
+    def test_typed_response(self):
+        xml = ('<Txn><Transaction success="1"><Authorized>1</Authorized><StatusRequired>0</StatusRequired>'
+               '<Amount>10.01</Amount><TxnId>TXNID</TxnId></Transaction><ReCo>00</ReCo><ResponseText>APPROVED</ResponseText>'
+               '<Success>1</Success><DpsTxnRef>000000060495729b</DpsTxnRef><TxnRef/></Txn>')
+        res = PxPostResponse(PxResponse(xml).parse())
+        self.assertIs(res.success, True)
+        self.assertIs(res.authorized, True)
+        self.assertIs(res.status_required, False)
+        self.assertEqual(res.amount, decimal.Decimal('10.01'))
+        self.assertEqual(res.dps_txn_ref, '000000060495729b')
+        self.assertEqual(res.response_text, 'APPROVED')
+        self.assertIsNone(res.txn_ref)
+        self.assertIsNone(res.card_number)
+        self.assertEqual(res.to_dict(), PxResponse(xml).to_dict())
+        self.assertEqual(res['transaction']['txn_id'], 'TXNID')
+        self.assertEqual(dict(res), res.to_dict())
+        copied = res.to_dict()
+        copied['response_text'] = 'CHANGED'
+        copied['transaction']['txn_id'] = 'CHANGED'
+        self.assertEqual(res.to_dict()['response_text'], 'APPROVED')
+        self.assertEqual(res['transaction']['txn_id'], 'TXNID')
+
+    def test_read_responses(self):
+        documents = [
+            '<?xml version="1.0" encoding="utf-8"?>\n<Txn><Transaction success="1"><Amount>10.01</Amount></Transaction><Success>1</Success><DpsTxnRef>REF1</DpsTxnRef></Txn>\n',
+            '<Txn><Success>0</Success><ResponseText>DECLINED</ResponseText><Item>1</Item><Item>2</Item></Txn>',
+            '<?xml version="1.0" ?><Txn><ResponseText>Café</ResponseText></Txn>\n',
+        ]
+        archive = ''.join(documents).encode('utf-8')
+        for chunk_size in (1, 7, 64 * 1024):
+            responses = list(read_responses(io.BytesIO(archive), chunk_size=chunk_size))
+            self.assertEqual([r.to_dict() for r in responses], [PxResponse(d.encode('utf-8')).to_dict() for d in documents])
+            self.assertIs(responses[0].success, True)
+            self.assertEqual(responses[0].amount, decimal.Decimal('10.01'))
+            self.assertEqual(responses[2].response_text, 'Café')
+
+    def test_read_responses_from_path(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b'<Txn><DpsTxnRef>REF1</DpsTxnRef></Txn><Txn><DpsTxnRef>REF2</DpsTxnRef></Txn>')
+            self.assertEqual([r.dps_txn_ref for r in read_responses(path)], ['REF1', 'REF2'])
+        finally:
+            os.remove(path)
+
     def test_credentials(self):
         self.assertEquals(self.client.username, 'username')
         self.assertEquals(self.client.password, 'password')
 
     @patch('dps.pxpost.client.requests')
     def test_post(self, mock_requests):
-        mock_requests.post.return_value = mock_response = Mock()
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<?xml version="1.0" ?><Txn>', b'<TestKey>value</TestKey></Txn>']
+        response = self.client.post(txn_type='authorize', test_key='value')
+        self.assertIsInstance(response, PxPostResponse)
+        self.assertEqual(response, {'test_key': 'value'})
+
+    @patch('dps.pxpost.client.requests')
+    def test_post_with_transaction(self, mock_requests):
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<?xml version="1.0" ?><Txn>', b'<TestKey>value</TestKey></Txn>']
+        transaction = PxPostDpsBillingTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLING&ID')
+        self.assertEqual(self.client.post(transaction, txn_type='Auth'), {'test_key': 'value'})
+        data = mock_requests.Session.return_value.post.call_args[1]['data']
+        self.assertTrue(data.startswith(b'<?xml version="1.0" ?><Txn><Amount>10.01</Amount><DpsBillingId>BILLING&amp;ID</DpsBillingId>'))
+        for element in (b'<InputCurrency>NZD</InputCurrency>', b'<TxnType>Auth</TxnType>',
+                        b'<PostUsername>username</PostUsername>', b'<PostPassword>password</PostPassword>'):
+            self.assertIn(element, data)
+
+    @patch('dps.pxpost.client.requests')
+    def test_post_response_too_large(self, mock_requests):
+        from dps.exceptions import ResponseTooLarge
+        client = PxPostClient('username', 'password', max_response_size=32)
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.content = '<?xml version="1.0" ?><Txn><TestKey>value</TestKey></Txn>'
-        self.assertEqual(self.client.post(txn_type='authorize', test_key='value'), {'test_key': 'value'})
+        mock_response.headers = {'Content-Length': '33'}
+        with self.assertRaises(ResponseTooLarge):
+            client.post(txn_type='Status', txn_id='TXNID')
+        self.assertTrue(mock_response.close.called)
+        self.assertFalse(mock_response.iter_content.called)
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn>', b'<TestKey>value</TestKey>' * 2, b'</Txn>']
+        with self.assertRaises(ResponseTooLarge):
+            client.post(txn_type='Status', txn_id='TXNID')
+
+    def test_response_encoding(self):
+        xml = '<?xml version="1.0" encoding="iso-8859-1"?><Txn><CardHolderName>José</CardHolderName></Txn>'.encode('iso-8859-1')
+        self.assertEqual(PxResponse(memoryview(xml)).to_dict(), {'card_holder_name': 'José'})
 
     def test_authorize_with_card(self):
         self.client.post = Mock()
         self.client.authorize(PxPostCardTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Auth', amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123'))
+        self.assertPosted('Auth', amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_authorize_with_dps_billing_token(self):
         self.client.post = Mock()
         self.client.authorize(PxPostDpsBillingTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Auth', amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID'))
+        self.assertPosted('Auth', amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_authorize_with_custom_billing_token(self):
         self.client.post = Mock()
         self.client.authorize(PxPostBillingTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', billing_id='BILLINGID'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Auth', amount=decimal.Decimal('10.01'), input_currency='NZD', billing_id='BILLINGID'))
+        self.assertPosted('Auth', amount=decimal.Decimal('10.01'), input_currency='NZD', billing_id='BILLINGID')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_purchase_with_card(self):
         self.client.post = Mock()
         self.client.purchase(PxPostCardTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Purchase', amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123'))
+        self.assertPosted('Purchase', amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_purchase_with_dps_billing_token(self):
         self.client.post = Mock()
         self.client.purchase(PxPostDpsBillingTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Purchase', amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID'))
+        self.assertPosted('Purchase', amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_purchase_with_billing_token(self):
         self.client.post = Mock()
         self.client.purchase(PxPostBillingTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', billing_id='BILLINGID'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Purchase', amount=decimal.Decimal('10.01'), input_currency='NZD', billing_id='BILLINGID'))
+        self.assertPosted('Purchase', amount=decimal.Decimal('10.01'), input_currency='NZD', billing_id='BILLINGID')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_complete(self):
         self.client.post = Mock()
         self.client.complete(PxPostCompleteTransaction(dps_txn_ref='REFERENCE', amount=decimal.Decimal('10.01')))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Complete', dps_txn_ref='REFERENCE', amount=decimal.Decimal('10.01')))
+        self.assertPosted('Complete', dps_txn_ref='REFERENCE', amount=decimal.Decimal('10.01'))
         self.assertEquals(self.client.post.call_count, 1)
 #
     def test_refund(self):
         self.client.post = Mock()
         self.client.refund(PxPostRefundTransaction(dps_txn_ref='REFERENCE', amount=decimal.Decimal('10.01')))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Refund', dps_txn_ref='REFERENCE', amount=decimal.Decimal('10.01')))
+        self.assertPosted('Refund', dps_txn_ref='REFERENCE', amount=decimal.Decimal('10.01'))
 
     def test_validate(self):
         self.client.post = Mock()
         self.client.validate(PxPostCardTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Validate', amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123'))
+        self.assertPosted('Validate', amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1114', cvc2='123')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_status(self):
         self.client.post = Mock()
         self.client.status(PxPostStatusTransaction(txn_id='TXNID'))
         self.assertTrue(self.client.post.called)
-        self.assertEquals(self.client.post.call_args, call(txn_type='Status', txn_id='TXNID'))
+        self.assertPosted('Status', txn_id='TXNID')
         self.assertEquals(self.client.post.call_count, 1)
 
     def test_authorize_with_kwargs(self):
         self.client.post = Mock()
         self.client.authorize(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID')
-        self.assertEquals(self.client.post.call_args, call(txn_type='Auth', input_currency='NZD', amount=decimal.Decimal('10.01'), dps_billing_id='BILLINGID'))
+        self.assertPosted('Auth', input_currency='NZD', amount=decimal.Decimal('10.01'), dps_billing_id='BILLINGID')
 
     def test_complete_with_kwargs(self):
         self.client.post = Mock()
         self.client.complete(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_txn_ref='TXNREF')
-        self.assertEquals(self.client.post.call_args, call(txn_type='Complete', input_currency='NZD', amount=decimal.Decimal('10.01'), dps_txn_ref='TXNREF'))
+        self.assertPosted('Complete', input_currency='NZD', amount=decimal.Decimal('10.01'), dps_txn_ref='TXNREF')
 
     def test_purchase_with_kwargs(self):
         self.client.post = Mock()
         self.client.purchase(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id='BILLINGID')
-        self.assertEquals(self.client.post.call_args, call(txn_type='Purchase', input_currency='NZD', amount=decimal.Decimal('10.01'), dps_billing_id='BILLINGID'))
+        self.assertPosted('Purchase', input_currency='NZD', amount=decimal.Decimal('10.01'), dps_billing_id='BILLINGID')
 
     def test_refund_with_kwargs(self):
         self.client.post = Mock()
         self.client.refund(amount=decimal.Decimal('10.01'), dps_txn_ref='TXNREF')
-        self.assertEquals(self.client.post.call_args, call(txn_type='Refund', amount=decimal.Decimal('10.01'), dps_txn_ref='TXNREF'))
+        self.assertPosted('Refund', amount=decimal.Decimal('10.01'), dps_txn_ref='TXNREF')
 
     def test_validate_with_kwargs(self):
         self.client.post = Mock()
         self.client.validate(amount=decimal.Decimal('10.01'), input_currency='NZD', card_number='4111111111111111', card_holder_name='Holder Name', date_expiry='1214', cvc2='123')
-        self.assertEquals(self.client.post.call_args, call(txn_type='Validate', cvc2='123', date_expiry='1214', input_currency='NZD', amount=decimal.Decimal('10.01'), card_number='4111111111111111', card_holder_name='Holder Name'))
+        self.assertPosted('Validate', cvc2='123', date_expiry='1214', input_currency='NZD', amount=decimal.Decimal('10.01'), card_number='4111111111111111', card_holder_name='Holder Name')
 
     def test_status_with_kwargs(self):
         self.client.post = Mock()
         self.client.status(txn_id='TXNID')
-        self.assertEquals(self.client.post.call_args, call(txn_type='Status', txn_id='TXNID'))
+        self.assertPosted('Status', txn_id='TXNID')
 
 
 if __name__ == "__main__":
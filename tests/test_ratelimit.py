@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import unittest
+from mock import patch
+
+from dps.ratelimit import TokenBucket, RateLimiter
+from dps.exceptions import RateLimited
+from dps.pxpost import PxPostClient
+
+from .helpers import Clock
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.bucket = TokenBucket(rate=2, burst=3, clock=self.clock)
+
+    def test_burst(self):
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+        self.assertAlmostEqual(self.bucket.reserve(), 1.0)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        self.clock.now = 1.0
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+        self.clock.now = 100.0
+        self.assertAlmostEqual(self.bucket.tokens, -1)
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0, 0, 0])
+
+    def test_timeout(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        with self.assertRaises(RateLimited):
+            self.bucket.reserve(timeout=0.1)
+        self.assertAlmostEqual(self.bucket.reserve(timeout=0.5), 0.5)
+
+    @patch('dps.ratelimit.time')
+    def test_acquire_sleeps(self, mock_time):
+        for _ in range(3):
+            self.bucket.acquire()
+        self.assertFalse(mock_time.sleep.called)
+        self.bucket.acquire()
+        mock_time.sleep.assert_called_once_with(0.5)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_buckets_per_key(self):
+        limiter = RateLimiter(rate=1, burst=1, clock=Clock())
+        self.assertEqual(limiter.reserve('merchant1'), 0)
+        self.assertEqual(limiter.reserve('merchant2'), 0)
+        self.assertEqual(limiter.reserve('merchant1'), 1)
+        self.assertIs(limiter.bucket('merchant1'), limiter.bucket('merchant1'))
+
+    def test_shared_by_clients(self):
+        limiter = RateLimiter(rate=1, burst=1, clock=Clock())
+        clients = [PxPostClient('username', 'password', rate_limiter=limiter) for _ in range(2)]
+        with patch('dps.ratelimit.time') as mock_time:
+            for client in clients:
+                client.throttle()
+            mock_time.sleep.assert_called_once_with(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import io
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+from mock import Mock, patch, call
+
+from dps.reconcile import Reconciler, ReconcileSummary
+from dps.pxpost import PxPostClient, PxPostResponse
+from dps.pxfusion import PxFusionClient, PxFusionTransactionResponse
+
+
+def pxpost_response(authorized, amount, status_required=False):
+    return PxPostResponse({'Transaction': {'Authorized': '1' if authorized else '0', 'Amount': amount,
+                                           'StatusRequired': '1' if status_required else '0'}})
+
+
+class ReconcilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.expected = os.path.join(self.directory, 'expected.csv')
+        self.report = os.path.join(self.directory, 'report.csv')
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        self.client = PxPostClient('username', 'password')
+        self.responses = {}
+        self.client.status = Mock(side_effect=lambda txn_id: self.responses[txn_id])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_expected(self, rows):
+        with io.open(self.expected, 'w', newline='', encoding='utf-8') as fileobj:
+            writer = csv.writer(fileobj)
+            writer.writerow(['txn_id', 'amount', 'outcome'])
+            writer.writerows(rows)
+
+    def read_report(self):
+        with io.open(self.report, newline='', encoding='utf-8') as fileobj:
+            return list(csv.reader(fileobj))
+
+    def test_pxpost(self):
+        self.write_expected([('TXN1', '10.00', 'approved'), ('TXN2', '5.00', 'approved'), ('TXN3', '', 'declined'),
+                             ('TXN4', '1.00', ''), ('TXN5', 'abc', 'pending'), ('TXN6', '', '')])
+        self.responses.update({'TXN1': pxpost_response(True, '10.00'), 'TXN2': pxpost_response(False, '4.00'),
+                               'TXN3': pxpost_response(False, '1.00'), 'TXN4': pxpost_response(True, '1.0'),
+                               'TXN5': pxpost_response(False, '1.00', status_required=True)})
+        summary = Reconciler(self.client, concurrency=2).run(self.expected, self.report)
+        self.assertEqual(summary, ReconcileSummary(checked=6, matched=3, mismatched=2, errors=1))
+        self.assertEqual(self.read_report(), [
+            ['line', 'txn_id', 'field', 'expected', 'actual'],
+            ['2', 'TXN2', 'outcome', 'approved', 'declined'],
+            ['2', 'TXN2', 'amount', '5.00', '4.00'],
+            ['5', 'TXN5', 'amount', 'abc', '1.00'],
+            ['6', 'TXN6', 'lookup', '', "KeyError: 'TXN6'"],
+        ])
+
+    def test_pxpost_not_found(self):
+        self.write_expected([('TXN1', '', 'not_found'), ('TXN2', '1.00', 'approved')])
+        not_found = PxPostResponse({'Success': '0', 'ResponseText': 'Transaction Not Found',
+                                    'Transaction': {'Authorized': '0'}})
+        self.responses.update({'TXN1': not_found, 'TXN2': not_found})
+        summary = Reconciler(self.client).run(self.expected, self.report)
+        self.assertEqual(summary, ReconcileSummary(checked=2, matched=1, mismatched=1, errors=0))
+        self.assertEqual(self.read_report()[1:], [['2', 'TXN2', 'outcome', 'approved', 'not_found'],
+                                                  ['2', 'TXN2', 'amount', '1.00', '']])
+
+    def test_malformed_rows(self):
+        with io.open(self.expected, 'w', newline='', encoding='utf-8') as fileobj:
+            fileobj.write('amount,outcome\n1.00,approved\n')
+        summary = Reconciler(self.client).run(self.expected, self.report)
+        self.assertEqual(summary, ReconcileSummary(checked=1, matched=0, mismatched=0, errors=1))
+        self.assertEqual(self.read_report()[1:], [['1', '', 'lookup', '', 'missing txn_id']])
+        self.write_expected([('TXN1', '1.00', 'approved'), ('',)])
+        self.responses['TXN1'] = pxpost_response(True, '1.00')
+        summary = Reconciler(self.client).run(self.expected, self.report)
+        self.assertEqual(summary, ReconcileSummary(checked=2, matched=1, mismatched=0, errors=1))
+        self.assertEqual(self.read_report()[1:], [['2', '', 'lookup', '', 'missing txn_id']])
+
+    @patch('dps.reconcile.fsync_directory')
+    @patch('dps.reconcile.os.fsync')
+    def test_checkpoint_is_durable(self, mock_fsync, mock_fsync_directory):
+        self.write_expected([('TXN1', '1.00', 'approved')])
+        self.responses['TXN1'] = pxpost_response(True, '1.00')
+        with io.open(self.report, 'w+b') as report:
+            Reconciler(self.client).save_checkpoint(self.checkpoint, 1, report, [1, 1, 0, 0])
+            self.assertEqual(mock_fsync.call_args_list[0], call(report.fileno()))
+        self.assertEqual(mock_fsync.call_count, 2)
+        mock_fsync_directory.assert_called_once_with(self.checkpoint)
+
+    @patch('dps.pxfusion.client.SOAPClient')
+    def test_pxfusion(self, mock_soap):
+        client = PxFusionClient('username', 'password')
+        client.get_transaction = Mock(side_effect=lambda txn_id: PxFusionTransactionResponse(
+            {'status': {'S1': '0', 'S2': '5', 'S3': '4'}[txn_id], 'amount': '1.00'}))
+        self.write_expected([('S1', '1.00', 'approved'), ('S2', '1.00', 'approved'), ('S3', '', 'not_found')])
+        summary = Reconciler(client).run(self.expected, self.report)
+        self.assertEqual(summary, ReconcileSummary(checked=3, matched=2, mismatched=1, errors=0))
+        self.assertEqual(self.read_report()[1:], [['2', 'S2', 'outcome', 'approved', 'pending']])
+
+    def test_bounded_window(self):
+        self.write_expected([('TXN{}'.format(i), '1.00', 'approved') for i in range(100)])
+        self.client.status.side_effect = lambda txn_id: pxpost_response(True, '1.00')
+        counts = {'submitted': 0, 'collected': 0, 'outstanding': 0}
+
+        def get(func, args):
+            counts['collected'] += 1
+            return func(*args)
+
+        def apply_async(func, args):
+            counts['submitted'] += 1
+            counts['outstanding'] = max(counts['outstanding'], counts['submitted'] - counts['collected'])
+            return Mock(get=lambda: get(func, args))
+
+        with patch('dps.reconcile.ThreadPool') as mock_pool:
+            mock_pool.return_value.apply_async.side_effect = apply_async
+            self.assertEqual(Reconciler(self.client, concurrency=4).run(self.expected, self.report).matched, 100)
+        mock_pool.assert_called_with(4)
+        self.assertEqual(counts['outstanding'], 8)
+
+    def test_checkpoint(self):
+        self.write_expected([('TXN{}'.format(i), '1.00', 'approved') for i in range(1, 8)])
+        self.responses.update({'TXN{}'.format(i): pxpost_response(i % 2, '1.00') for i in range(1, 5)})
+        reconciler = Reconciler(self.client, concurrency=1, checkpoint_every=2)
+        with self.assertRaises(KeyError):
+            # simulates an interruption after line 4
+            reconciler.check = lambda row: original_check(row) if row['txn_id'] != 'TXN5' else {}['interrupted']
+            original_check = Reconciler.check.__get__(reconciler)
+            reconciler.run(self.expected, self.report, checkpoint=self.checkpoint)
+        with io.open(self.checkpoint, encoding='utf-8') as fileobj:
+            self.assertEqual(json.load(fileobj)['line'], 4)
+
+        self.responses.update({'TXN{}'.format(i): pxpost_response(True, '1.00') for i in range(5, 8)})
+        self.client.status.reset_mock()
+        summary = Reconciler(self.client, checkpoint_every=2).run(self.expected, self.report, checkpoint=self.checkpoint)
+        self.assertEqual(summary, ReconcileSummary(checked=7, matched=5, mismatched=2, errors=0))
+        self.assertEqual([call[1]['txn_id'] for call in self.client.status.call_args_list], ['TXN5', 'TXN6', 'TXN7'])
+        self.assertEqual([row[1] for row in self.read_report()[1:]], ['TXN2', 'TXN4'])
+        self.assertFalse(os.path.exists(self.checkpoint))
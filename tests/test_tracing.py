@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import sys
+import unittest
+from mock import Mock, MagicMock, patch
+
+from dps.tracing import Tracer, InMemoryExporter, NOOP_TRACER, OpenTelemetryTracer
+from dps.pxpost import PxPostClient
+from dps.pxfusion import PxFusionClient
+
+
+class TracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        self.tracer = Tracer(self.exporter, clock=Mock(side_effect=[0, 1, 3, 6]))
+
+    def test_nesting(self):
+        with self.tracer.span('outer', key='value') as outer:
+            with self.tracer.span('inner') as inner:
+                inner.set_attribute('code', '00')
+        self.assertEqual(self.exporter.spans, [inner, outer])
+        self.assertIs(inner.parent, outer)
+        self.assertIsNone(outer.parent)
+        self.assertEqual((outer.duration, inner.duration), (6, 2))
+        self.assertEqual(outer.attributes, {'key': 'value'})
+        self.assertEqual(inner.attributes, {'code': '00'})
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span('failing') as span:
+                raise ValueError('failed')
+        self.assertIsInstance(span.error, ValueError)
+        self.assertEqual(self.tracer.stack(), [])
+
+    def test_noop(self):
+        with NOOP_TRACER.span('noop', key='value') as span:
+            span.set_attribute('code', '00')
+        self.assertIs(NOOP_TRACER.span('other'), span)
+
+    def test_opentelemetry(self):
+        mock_opentelemetry = Mock()
+        mock_trace = mock_opentelemetry.trace
+        with patch.dict(sys.modules, {'opentelemetry': mock_opentelemetry, 'opentelemetry.trace': mock_trace}):
+            tracer = OpenTelemetryTracer()
+        otel_tracer = mock_trace.get_tracer.return_value
+        otel_tracer.start_as_current_span.return_value = context = MagicMock()
+        with tracer.span('dps.http', txn_type='Purchase', missing=None) as span:
+            span.set_attribute('response_code', '00')
+            span.set_attribute('http.status_code', None)
+        mock_trace.get_tracer.assert_called_with('dps')
+        otel_tracer.start_as_current_span.assert_called_with('dps.http', attributes={'txn_type': 'Purchase'})
+        context.__enter__.return_value.set_attribute.assert_called_once_with('response_code', '00')
+        self.assertTrue(context.__exit__.called)
+
+    def test_opentelemetry_missing(self):
+        with patch.dict(sys.modules, {'opentelemetry': None}):
+            with self.assertRaises(ImportError):
+                OpenTelemetryTracer()
+
+
+class ClientTracingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+
+    def names(self):
+        return [span.name for span in self.exporter.spans]
+
+    @patch('dps.pxpost.client.requests')
+    def test_pxpost(self, mock_requests):
+        client = PxPostClient('username', 'password', tracer=Tracer(self.exporter))
+        mock_requests.Session.return_value.post.return_value = mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<Txn><ReCo>00</ReCo></Txn>']
+        client.status(txn_id='TXNID')
+        self.assertEqual(self.names(), ['dps.validate', 'dps.serialize', 'dps.http', 'dps.parse', 'dps.pxpost.request'])
+        validate, serialize, http, parse, request = self.exporter.spans
+        self.assertIsNone(validate.parent)
+        self.assertEqual({serialize.parent, http.parent, parse.parent}, {request})
+        self.assertEqual(request.attributes, {'txn_type': 'Status', 'response_code': '00'})
+        self.assertEqual(http.attributes, {'http.status_code': 200})
+
+    def test_pxpost_invalid(self):
+        client = PxPostClient('username', 'password', tracer=Tracer(self.exporter))
+        with self.assertRaises(ValueError):
+            client.status(amount='1.00')
+        self.assertEqual(self.names(), ['dps.validate'])
+        self.assertIsInstance(self.exporter.spans[0].error, ValueError)
+
+    @patch('dps.pxfusion.client.SOAPClient')
+    def test_pxfusion(self, mock_soap):
+        client = PxFusionClient('username', 'password', tracer=Tracer(self.exporter))
+        client.soap_client.service.GetTransaction.return_value = Mock(responseCode='00')
+        client.get_transaction('session')
+        self.assertEqual(self.names(), ['dps.pxfusion.request'])
+        self.assertEqual(self.exporter.spans[0].attributes, {'txn_type': 'GetTransaction', 'response_code': '00'})
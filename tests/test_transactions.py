@@ -2,6 +2,9 @@
 
 from __future__ import unicode_literals
 
+import csv
+import copy
+import pickle
 import unittest
 import decimal
 
@@ -36,6 +39,14 @@ class FieldsTest(unittest.TestCase):
 
         o.field = None
 
+    def test_check(self):
+        field = txn.StringField(max_length=5, choices=['short', 'toolong'])
+        self.assertIsNone(field.check('short'))
+        self.assertIsNone(field.check(None))
+        self.assertIsNotNone(field.check('other'))
+        self.assertIsNotNone(field.check('toolong'))
+        self.assertEqual(txn.AmountField().clean('1.10'), decimal.Decimal('1.10'))
+
     def test_default(self):
 
         class MockObject(object):
@@ -188,10 +199,130 @@ class TransactionTest(unittest.TestCase):
         txn = MockTransaction(amount='10.123', currency='NZD')
         self.assertTrue(txn.is_valid())
 
+    def test_check(self):
+        result = MockTransaction(amount='10.123').check()
+        self.assertFalse(result)
+        self.assertEqual(result.errors, {'currency': 'missing required field'})
+        result = MockTransaction(amount='10.123', currency='NZD').check()
+        self.assertTrue(result)
+        self.assertEqual(result.errors, {})
+
+    def test_check_values(self):
+        result = MockTransaction.check_values({'amount': 'invalid', 'enable_avs_data': 'invalid', 'unknown': 1})
+        self.assertFalse(result.valid)
+        self.assertIsNone(result.transaction)
+        self.assertEqual(sorted(result.errors), ['amount', 'currency', 'enable_avs_data', 'unknown'])
+        with self.assertRaises(ValueError):
+            result.raise_for_errors()
+
+        result = MockTransaction.check_values({'amount': '10.123', 'currency': 'NZD'})
+        self.assertTrue(result.valid)
+        self.assertDictEqual(dict(result.transaction), {'amount': decimal.Decimal('10.12'), 'currency': 'NZD', 'enable_avs_data': False})
+
+    def test_check_values_default_overridden_by_none(self):
+        result = MockSubTransaction.check_values({'amount': '10.123', 'currency': 'NZD', 'enable_avs_data': None})
+        self.assertEqual(result.errors, {'enable_avs_data': 'missing required field'})
+
     def test_iterable(self):
         txn = MockTransaction(amount='10.123', currency='NZD')
         self.assertDictEqual(dict(txn), {'amount': decimal.Decimal('10.12'), 'currency': 'NZD', 'enable_avs_data': False})
 
+    def test_to_xml(self):
+        txn = MockTransaction(amount='10.123', currency='NZD')
+        self.assertEqual(txn.to_xml('Txn', txn_type='Auth'),
+                         b'<?xml version="1.0" ?><Txn><Amount>10.12</Amount><Currency>NZD</Currency><EnableAvsData>0</EnableAvsData><TxnType>Auth</TxnType></Txn>')
+
+    def test_to_soap_fields(self):
+        txn = MockTransaction(amount='10.123', currency='NZD')
+        self.assertEqual(txn.to_soap_fields(), [('amount', decimal.Decimal('10.12')), ('currency', 'NZD'), ('enableAvsData', 0)])
+
+    def test_freeze(self):
+        frozen = MockTransaction(amount='10.123', currency='NZD').freeze()
+        self.assertEqual(frozen.amount, decimal.Decimal('10.12'))
+        self.assertEqual(frozen.currency, 'NZD')
+        self.assertDictEqual(dict(frozen), {'amount': decimal.Decimal('10.12'), 'currency': 'NZD', 'enable_avs_data': False})
+        self.assertTrue(frozen.is_valid())
+        with self.assertRaises(AttributeError):
+            frozen.amount = decimal.Decimal('1.00')
+        with self.assertRaises(AttributeError):
+            frozen.invalid
+
+    def test_freeze_invalid(self):
+        with self.assertRaises(ValueError):
+            MockTransaction(amount='10.123').freeze()
+
+    def test_frozen_hash_and_equality(self):
+        a = MockTransaction(amount='10.12', currency='NZD').freeze()
+        b = MockTransaction(amount='10.12', currency='NZD').freeze()
+        c = MockSubTransaction(amount='10.12', currency='NZD', enable_avs_data=False).freeze()
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertNotEqual(a, c)
+        self.assertEqual(len({a, b, c}), 2)
+
+    def test_frozen_payload_cache(self):
+        frozen = MockTransaction(amount='10.123', currency='NZD').freeze()
+        payload = frozen.to_xml('Txn', txn_type='Auth')
+        self.assertEqual(payload, MockTransaction(amount='10.123', currency='NZD').to_xml('Txn', txn_type='Auth'))
+        self.assertIs(frozen.to_xml('Txn', txn_type='Auth'), payload)
+        self.assertIsNot(frozen.to_xml('Txn', txn_type='Purchase'), payload)
+
+    def test_thaw(self):
+        thawed = MockTransaction(amount='10.123', currency='NZD', enable_avs_data=True).freeze().thaw()
+        self.assertIsInstance(thawed, MockTransaction)
+        self.assertDictEqual(dict(thawed), {'amount': decimal.Decimal('10.12'), 'currency': 'NZD', 'enable_avs_data': True})
+        thawed.currency = 'AUD'
+        self.assertEqual(thawed.currency, 'AUD')
+
+    def test_thaw_restores_stored_values(self):
+        transaction = MockTransaction(amount='10.123', currency='NZD')
+        thawed = transaction.freeze().thaw()
+        self.assertEqual(thawed._values(), transaction._values())
+        self.assertNotIn(thawed, MockTransaction._meta._fields['enable_avs_data'].data)
+        thawed = MockTransaction(amount='1', currency='NZD', enable_avs_data=True).freeze().thaw()
+        self.assertIs(MockTransaction._meta._fields['enable_avs_data'].data[thawed], True)
+
+    def test_frozen_copy(self):
+        frozen = MockTransaction(amount='10.123', currency='NZD', enable_avs_data=True).freeze()
+        self.assertEqual(copy.copy(frozen), frozen)
+        self.assertEqual(copy.deepcopy(frozen), frozen)
+        self.assertEqual(copy.deepcopy([frozen])[0].enable_avs_data, 1)
+
+    def test_from_rows(self):
+        rows = iter([
+            {'amount': '10.123', 'cur': 'NZD', 'note': 'first'},
+            {'amount': '10.123', 'cur': 'XXX', 'note': 'invalid currency'},
+            {'amount': '', 'cur': 'NZD', 'note': 'missing amount'},
+            {'amount': '5', 'cur': 'AUD', 'note': 'last'},
+        ])
+        results = list(MockTransaction.from_rows(rows, rename={'cur': 'currency'}, ignore_unknown=True))
+        self.assertEqual(len(results), 4)
+        self.assertIsInstance(results[0], MockTransaction)
+        self.assertEqual(results[0].currency, 'NZD')
+        self.assertIsInstance(results[1], txn.RowError)
+        self.assertEqual(results[1].index, 1)
+        self.assertEqual(results[1].row['note'], 'invalid currency')
+        self.assertIsInstance(results[2], txn.RowError)
+        self.assertEqual(results[2].errors, {'amount': 'missing required field'})
+        self.assertEqual(results[3].amount, decimal.Decimal('5.00'))
+
+    def test_from_rows_csv(self):
+        class MockCsvTransaction(MockTransaction):
+            quantity = txn.IntegerField()
+
+        # native strings, as the csv module expects bytes on python 2
+        data = [str(line) for line in ("amount,currency,enable_avs_data,quantity\r\n", "10.12,NZD,1,3\r\n",
+                                       "5,AUD,false,\r\n", "5,AUD,maybe,x\r\n")]
+        results = list(MockCsvTransaction.from_rows(csv.DictReader(data)))
+        self.assertEqual(results[0]._values(), (decimal.Decimal('10.12'), 'NZD', True, 3))
+        self.assertEqual(results[1]._values(), (decimal.Decimal('5'), 'AUD', False, None))
+        self.assertIsInstance(results[2], txn.RowError)
+        self.assertEqual(sorted(results[2].errors), ['enable_avs_data', 'quantity'])
+
+    def test_from_rows_unknown_columns(self):
+        results = list(MockTransaction.from_rows([{'amount': '1', 'currency': 'NZD', 'note': 'unknown'}]))
+        self.assertIsInstance(results[0], txn.RowError)
+
     def test_transactions_subclasses_inherit_fields(self):
         txn = MockSubTransaction(amount='10.123', currency='NZD', enable_avs_data=True)
         self.assertEqual(txn.amount, decimal.Decimal('10.12'))
@@ -204,19 +335,84 @@ class TransactionTest(unittest.TestCase):
             txn.validate()
 
 
+class EncodingTest(unittest.TestCase):
+
+    def test_pickle(self):
+        transaction = MockTransaction(amount='10.123', currency='NZD', enable_avs_data=True)
+        restored = pickle.loads(pickle.dumps(transaction, pickle.HIGHEST_PROTOCOL))
+        self.assertIsInstance(restored, MockTransaction)
+        self.assertDictEqual(dict(restored), dict(transaction))
+        self.assertEqual(restored._values(), transaction._values())
+
+    def test_pickle_frozen(self):
+        frozen = MockTransaction(amount='10.123', currency='NZD').freeze()
+        frozen.to_xml('Txn')
+        restored = pickle.loads(pickle.dumps(frozen, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(restored, frozen)
+        self.assertEqual(hash(restored), hash(frozen))
+
+    def test_pack_transaction(self):
+        transaction = MockTransaction(amount='10.123', currency='NZD')
+        data = txn.pack_transaction(transaction)
+        self.assertIsInstance(data, bytes)
+        self.assertDictEqual(dict(txn.unpack_transaction(data)), dict(transaction))
+        self.assertEqual(txn.unpack_transaction(data, frozen=True), transaction.freeze())
+
+    def test_pack_transactions(self):
+        transactions = [MockTransaction(amount='10.123', currency='NZD'),
+                        MockSubTransaction(amount='1', currency='AUD', enable_avs_data=True).freeze()]
+        restored = list(txn.unpack_transactions(txn.pack_transactions(transactions), frozen=True))
+        self.assertEqual(restored, [transaction.freeze() for transaction in transactions])
+
+    def test_unpack_unknown_class(self):
+        data = txn.pack_transaction(MockTransaction(amount='10.123', currency='NZD'))
+        with self.assertRaises(ValueError):
+            txn.unpack_transaction(data.replace(b'MockTransaction', b'MockUnknownTxn!'))
+
+    def test_pack_integer_out_of_range(self):
+        class MockIntegerTransaction(txn.BaseTransaction):
+            quantity = txn.IntegerField()
+
+        data = txn.pack_transaction(MockIntegerTransaction(quantity=2 ** 63 - 1))
+        self.assertEqual(txn.unpack_transaction(data).quantity, 2 ** 63 - 1)
+        with self.assertRaises(ValueError):
+            txn.pack_transaction(MockIntegerTransaction(quantity=2 ** 63))
+        with self.assertRaises(ValueError):
+            txn.pack_transaction(MockIntegerTransaction(quantity=-2 ** 63 - 1))
+
+    def test_pack_classes_with_same_name(self):
+        def make_transaction_class(field_class):
+            class MockNamedTransaction(txn.BaseTransaction):
+                value = field_class()
+            return MockNamedTransaction
+
+        class Outer(object):
+            class MockNamedTransaction(txn.BaseTransaction):
+                quantity = txn.IntegerField()
+
+        text_class = make_transaction_class(txn.StringField)
+        data = txn.pack_transaction(Outer.MockNamedTransaction(quantity=1))
+        self.assertIsInstance(txn.unpack_transaction(data), Outer.MockNamedTransaction)
+        self.assertIsInstance(txn.unpack_transaction(txn.pack_transaction(text_class(value='a'))), text_class)
+
+
 class DecoratorsTest(unittest.TestCase):
 
     def setUp(self):
         class Client(object):
             @txn.accept_txn(MockTransaction)
-            def test(self, **kwargs):
-                return kwargs
+            def test(self, transaction):
+                return dict(transaction)
         self.client = Client()
 
     def test_call_with_transaction(self):
         self.assertDictEqual({"amount": decimal.Decimal("10.01"), "currency": "NZD", "enable_avs_data": False},
                              self.client.test(MockTransaction(amount=decimal.Decimal("10.01"), currency="NZD")))
 
+    def test_call_with_frozen_transaction(self):
+        self.assertDictEqual({"amount": decimal.Decimal("10.01"), "currency": "NZD", "enable_avs_data": False},
+                             self.client.test(MockTransaction(amount=decimal.Decimal("10.01"), currency="NZD").freeze()))
+
     def test_call_with_invalid_transaction(self):
         class InvalidTransaction(txn.BaseTransaction):
             pass
@@ -236,5 +432,29 @@ class DecoratorsTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.client.test()
 
+    def test_call_with_kwargs_unknown_field(self):
+        with self.assertRaises(ValueError):
+            self.client.test(amount=decimal.Decimal("10.01"), currency="NZD", unknown="value")
+
+    def test_call_with_kwargs_picks_most_specific_transaction(self):
+        class Client(object):
+            @txn.accept_txn(MockTransaction, MockSubTransaction)
+            def test(self, transaction):
+                return dict(transaction)
+        index = Client.test.index
+        self.assertIs(index.lookup(["amount", "currency"]), MockTransaction)
+        self.assertIs(index.lookup(["amount", "currency", "enable_avs_data"]), MockSubTransaction)
+        self.assertIsNone(index.lookup(["amount"]))
+        self.assertDictEqual({"amount": decimal.Decimal("10.01"), "currency": "NZD", "enable_avs_data": True},
+                             Client().test(amount="10.011", currency="NZD", enable_avs_data=True))
+
+    def test_index_cache_is_bounded(self):
+        from dps.transactions.decorators import INDEX_CACHE_SIZE
+        index = txn.decorators.TransactionIndex((MockTransaction,))
+        for i in range(INDEX_CACHE_SIZE * 3):
+            self.assertIsNone(index.lookup(["amount", "unknown_{}".format(i)]))
+        self.assertLessEqual(len(index.cache), INDEX_CACHE_SIZE)
+        self.assertIs(index.lookup(["amount", "currency"]), MockTransaction)
+
 if __name__ == "__main__":
     unittest.main()
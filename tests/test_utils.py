@@ -3,7 +3,8 @@
 from __future__ import unicode_literals
 
 import unittest
-from dps import utils
+from dps import utils, inflect
+from dps.vendors import inflection
 
 
 class UtilsTest(unittest.TestCase):
@@ -14,10 +15,54 @@ class UtilsTest(unittest.TestCase):
         expected = {'test_key_a': True, 'test_key1': True, 'test_dict_key': {'test_inner_key': True}}
         self.assertEquals(utils.underscore_keys(initial), expected)
 
+    def test_underscore_keys_with_lists(self):
+
+        initial = {'TestList': [{'TestKeyA': 1}, {'TestKeyA': 2}, 'value'], 'TestNested': [[{'TestKeyB': True}]]}
+        expected = {'test_list': [{'test_key_a': 1}, {'test_key_a': 2}, 'value'], 'test_nested': [[{'test_key_b': True}]]}
+        self.assertEquals(utils.underscore_keys(initial), expected)
+        self.assertEquals(initial['TestList'][0], {'TestKeyA': 1})
+
+    def test_underscore_keys_inplace(self):
+
+        initial = {'TestKeyA': {'TestInnerKey': [{'TestKeyB': True}]}}
+        inner = initial['TestKeyA']
+        result = utils.underscore_keys(initial, inplace=True)
+        self.assertIs(result, initial)
+        self.assertIs(result['test_key_a'], inner)
+        self.assertEquals(result, {'test_key_a': {'test_inner_key': [{'test_key_b': True}]}})
+
+    def test_underscore_keys_suds_objects(self):
+
+        class SudsObject(object):
+            def __init__(self, **kwargs):
+                self.__keylist__ = list(kwargs)
+                for k, v in kwargs.items():
+                    setattr(self, k, v)
+
+        initial = SudsObject(TestKeyA=1, TestInner=SudsObject(TestKeyB=[SudsObject(TestKeyC=True)]))
+        expected = {'test_key_a': 1, 'test_inner': {'test_key_b': [{'test_key_c': True}]}}
+        self.assertEquals(utils.underscore_keys(initial), expected)
+
     def test_underscore_key_post_proc(self):
 
         self.assertEquals(utils.underscore_keys_postproc(None, 'TestKey', 'value'), ('test_key', 'value'))
         self.assertEquals(utils.underscore_keys_postproc(None, 'TestKey', {'TestInnerKey': True}), ('test_key', {'test_inner_key': True}))
+        self.assertEquals(utils.underscore_keys_postproc(None, 'TestKey', [{'TestInnerKey': True}]), ('test_key', [{'test_inner_key': True}]))
+
+
+class InflectTest(unittest.TestCase):
+
+    KEYS = ['txn_type', 'post_username', 'cvc2', 'txn_data1', 'pax_carrier_2', 'dps_txn_ref', 'a']
+    WORDS = ['TxnType', 'DpsTxnRef', 'ReCo', 'Cvc2ResultCode', 'IOError', 'txnData1', 'pax-carrier', 'HTTPStatus', 'x']
+
+    def test_camelize(self):
+        for key in self.KEYS:
+            self.assertEqual(inflect.camelize(key), inflection.camelize(key))
+            self.assertEqual(inflect.camelize(key, False), inflection.camelize(key, False))
+
+    def test_underscore(self):
+        for word in self.WORDS:
+            self.assertEqual(inflect.underscore(word), inflection.underscore(word))
 
 if __name__ == "__main__":
     unittest.main()
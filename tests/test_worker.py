@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import pickle
+import unittest
+import decimal
+
+from dps.worker import WorkerPool, WorkerResult
+from dps.pxpost import PxPostDpsBillingTransaction, PxPostStatusTransaction, PxPostResponse
+from dps.transactions import FrozenTransaction
+
+
+class FakeClient(object):
+
+    def purchase(self, transaction):
+        if not isinstance(transaction, FrozenTransaction):
+            raise TypeError("expects a frozen transaction")
+        if transaction.dps_billing_id == 'FAIL':
+            raise ValueError("declined")
+        return PxPostResponse({'Success': '1', 'DpsTxnRef': transaction.dps_billing_id, 'Pid': str(os.getpid())})
+
+    def status(self, txn_id):
+        return {'txn_id': txn_id}
+
+    def crash(self, txn_id):
+        os._exit(3)
+
+    def unpicklable(self, txn_id):
+        return {'callback': lambda: txn_id}
+
+
+def failing_factory():
+    raise IOError("cannot load WSDL")
+
+
+def transaction(billing_id):
+    return PxPostDpsBillingTransaction(amount=decimal.Decimal('10.01'), input_currency='NZD', dps_billing_id=billing_id)
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(FakeClient, processes=2, concurrency=2)
+
+    def tearDown(self):
+        self.pool.terminate()
+
+    def test_map(self):
+        ids = ['ID{}'.format(i) for i in range(20)] + ['FAIL']
+        results = sorted(self.pool.map('purchase', (transaction(i) for i in ids)))
+        self.assertEqual([r.job_id for r in results], list(range(len(ids))))
+        for billing_id, result in zip(ids[:-1], results):
+            self.assertIsNone(result.error)
+            self.assertIsInstance(result.response, PxPostResponse)
+            self.assertIs(result.response.success, True)
+            self.assertEqual(result.response.dps_txn_ref, billing_id)
+            self.assertNotEqual(result.response['pid'], str(os.getpid()))
+        self.assertEqual(results[-1].error, 'ValueError: declined')
+
+    def test_submit_and_close(self):
+        job_id = self.pool.submit('status', txn_id='TXNID')
+        self.assertEqual(self.pool.close(timeout=10), [WorkerResult(job_id, {'txn_id': 'TXNID'}, None)])
+        for worker in self.pool.workers:
+            self.assertFalse(worker.is_alive())
+        with self.assertRaises(ValueError):
+            self.pool.submit('status', txn_id='TXNID')
+
+    def test_client_factory_error(self):
+        pool = WorkerPool(failing_factory, processes=1)
+        try:
+            job_id = pool.submit('status', txn_id='TXNID')
+            result = pool.get_result(timeout=10)
+            self.assertEqual(result.job_id, job_id)
+            self.assertTrue(result.error.endswith('Error: cannot load WSDL'))
+        finally:
+            pool.terminate()
+
+    def test_worker_lost(self):
+        pool = WorkerPool(FakeClient, processes=1, concurrency=1)
+        try:
+            crash = pool.submit('crash', txn_id='TXNID')
+            pending = pool.submit('status', txn_id='TXNID')
+            results = sorted([pool.get_result(timeout=10), pool.get_result(timeout=10)])
+            self.assertEqual([result.job_id for result in results], [crash, pending])
+            for result in results:
+                self.assertTrue(result.error.startswith('WorkerLost: '))
+                self.assertTrue(result.error.endswith('exited with code 3'))
+            with self.assertRaises(RuntimeError):
+                pool.submit('status', txn_id='TXNID')
+        finally:
+            pool.terminate()
+
+    def test_unpicklable_response(self):
+        job_id = self.pool.submit('unpicklable', txn_id='TXNID')
+        result = self.pool.get_result(timeout=10)
+        self.assertEqual(result.job_id, job_id)
+        self.assertIsNone(result.response)
+        self.assertIsNotNone(result.error)
+
+    def test_response_pickle(self):
+        response = PxPostResponse({'Success': '1'})
+        self.assertIs(pickle.loads(pickle.dumps(response)).success, True)
+
+    def test_response_pickle_nested_suds_objects(self):
+        from suds.sudsobject import Factory
+        nested = Factory.object('Detail', {'value': '1'})
+        response = PxPostResponse(Factory.object('Response', {'Success': '1', 'Detail': nested, 'Items': [nested]}))
+        restored = pickle.loads(pickle.dumps(response))
+        self.assertEqual(restored.raw, {'Success': '1', 'Detail': {'value': '1'}, 'Items': [{'value': '1'}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import unittest
+from dps import xmlbackend
+
+
+DOCUMENTS = [
+    '<?xml version="1.0" ?><Txn><TestKey>value</TestKey></Txn>',
+    '<Txn><Transaction success="1" reco="00"><Authorized>1</Authorized><Amount>10.01</Amount></Transaction>'
+    '<ReCo>00</ReCo><TxnRef/><ResponseText>APPROVED</ResponseText></Txn>',
+    '<Txn><Item>1</Item><Item>2</Item><Other>  spaced  </Other><Item>3</Item></Txn>',
+    '<Txn><Mixed attr="a">text<Child>value</Child> tail</Mixed><!-- comment --></Txn>',
+    '<?xml version="1.0" encoding="utf-8"?><Txn><Name>José &amp; Co</Name></Txn>',
+    '<!DOCTYPE Txn [<!ENTITY z "zz"><!ENTITY ext SYSTEM "file:///etc/hostname">]>'
+    '<Txn code="&z;"><Name>a&z;b&ext;</Name><Other>&z;</Other></Txn>',
+    '<Txn xmlns="urn:a" xmlns:p="urn:p"><p:Name p:attr="1" xml:lang="en">v</p:Name><Plain xmlns:q="urn:q">x</Plain></Txn>',
+]
+
+
+class StdlibBackendTest(unittest.TestCase):
+
+    backend_class = xmlbackend.StdlibBackend
+
+    def setUp(self):
+        self.backend = self.backend_class()
+
+    def test_build(self):
+        self.assertEqual(self.backend.build('RootTag', [('TestKey', 'value'), ('Escaped', '<&>')]),
+                         '<?xml version="1.0" ?><RootTag><TestKey>value</TestKey><Escaped>&lt;&amp;&gt;</Escaped></RootTag>')
+
+    def test_parse(self):
+        self.assertEqual(self.backend.parse(DOCUMENTS[0]), {'Txn': {'TestKey': 'value'}})
+        result = self.backend.parse(DOCUMENTS[2])
+        self.assertEqual(result['Txn']['Item'], ['1', '2', '3'])
+        self.assertEqual(result['Txn']['Other'], 'spaced')
+
+    def test_parse_bytes(self):
+        self.assertEqual(self.backend.parse(DOCUMENTS[4].encode('utf-8')), {'Txn': {'Name': 'José & Co'}})
+
+    def test_parse_entities(self):
+        self.assertEqual(self.backend.parse(DOCUMENTS[5]), {'Txn': {'@code': 'zz', 'Name': 'azzb', 'Other': 'zz'}})
+
+    def test_parse_namespaces(self):
+        self.assertEqual(self.backend.parse(DOCUMENTS[6]), {'Txn': {
+            '@xmlns': 'urn:a', '@xmlns:p': 'urn:p',
+            'p:Name': {'@p:attr': '1', '@xml:lang': 'en', '#text': 'v'},
+            'Plain': {'@xmlns:q': 'urn:q', '#text': 'x'},
+        }})
+
+
+@unittest.skipUnless(xmlbackend.etree, "lxml is not installed")
+class LxmlBackendTest(StdlibBackendTest):
+
+    backend_class = xmlbackend.LxmlBackend
+
+    def test_same_results_as_stdlib(self):
+        stdlib = xmlbackend.StdlibBackend()
+        for document in DOCUMENTS:
+            self.assertEqual(self.backend.parse(document), stdlib.parse(document))
+        items = [('TestKey', 'value'), ('Amount', '10.01'), ('Quoted', '"a" & \'b\'')]
+        self.assertEqual(self.backend.build('Txn', items), stdlib.build('Txn', items))
+
+
+class SelectBackendTest(unittest.TestCase):
+
+    def tearDown(self):
+        xmlbackend.set_backend(None)
+
+    def test_default_backend(self):
+        expected = xmlbackend.LxmlBackend if xmlbackend.etree else xmlbackend.StdlibBackend
+        self.assertIsInstance(xmlbackend.get_backend(), expected)
+
+    def test_set_backend(self):
+        self.assertIsInstance(xmlbackend.set_backend('stdlib'), xmlbackend.StdlibBackend)
+        self.assertIsInstance(xmlbackend.get_backend(), xmlbackend.StdlibBackend)
+
+    def test_set_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            xmlbackend.set_backend('unknown')
+
+
+if __name__ == "__main__":
+    unittest.main()